@@ -0,0 +1,132 @@
+"""Time grep over stored markdown against reading and searching each file.
+
+Usage:
+    uv run python benchmarks/grep.py --documents 200 --size 1000000
+
+Writes *documents* markdown files of about *size* bytes each, with a
+heading every 20 paragraphs and a rare term near the end of every tenth
+file.
+Indexes are built up front, as conversion does. Then times, per search:
+
+- reading every file as text and running ``re.finditer`` over it, as an
+  agent paging through read_document_content effectively does;
+- ``FileStorage.map_markdown`` plus ``scan``, one file at a time; the
+  ``ranges`` expression is matched on bytes, ``regex`` on decoded text;
+- DocumentService.grep across all documents, which adds the listing
+  queries, the worker threads and heading lookups.
+"""
+
+import argparse
+import asyncio
+import re
+import statistics
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from docfabric.conversion.converter import MarkdownConverter
+from docfabric.db.engine import create_engine, init_db
+from docfabric.db.repository import DocumentRepository
+from docfabric.db.tables import documents
+from docfabric.service.document import DocumentService
+from docfabric.service.grep import compile_pattern, scan
+from docfabric.storage import FileStorage
+
+_PARAGRAPH = (
+    "The supplier delivers the goods within thirty days of the order date,"
+    " unless both parties agree otherwise in writing.\n\n"
+)
+_SECTION = "## Terms\n" + _PARAGRAPH * 20
+
+
+def timed(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = FileStorage(Path(tmp))
+        engine = create_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        await init_db(engine)
+        body = _SECTION * (args.size // len(_SECTION))
+        ids = [uuid4() for _ in range(args.documents)]
+        start = datetime(2024, 1, 1, tzinfo=UTC)
+        rows = []
+        for n, doc_id in enumerate(ids):
+            tail = f"Error E-1042 in clause {n}.\n" if n % 10 == 0 else ""
+            storage.save_markdown(doc_id, body + tail)
+            rows.append(
+                {
+                    "id": str(doc_id),
+                    "filename": f"{n}.md",
+                    "content_type": "text/markdown",
+                    "size_bytes": args.size,
+                    "status": "ready",
+                    "created_at": start + timedelta(seconds=n),
+                    "updated_at": start + timedelta(seconds=n),
+                }
+            )
+        async with engine.begin() as conn:
+            await conn.execute(documents.insert(), rows)
+        service = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=MarkdownConverter(),
+        )
+        for doc_id in ids:
+            await service._load_index(doc_id)
+        total_mb = args.documents * args.size / 1e6
+        print(f"{args.documents} documents, {total_mb:.0f} MB")
+
+        for name, pattern, regex in (
+            ("literal", "E-1042", False),
+            ("ranges", r"E-[0-9]{4}", True),
+            ("regex", r"E-\d{4}", True),
+        ):
+            text_re = re.compile(re.escape(pattern) if not regex else pattern)
+            compiled = compile_pattern(pattern, regex=regex)
+
+            def read_all(text_re=text_re):
+                for doc_id in ids:
+                    list(text_re.finditer(storage.read_markdown(doc_id)))
+
+            def map_all(compiled=compiled):
+                for doc_id in ids:
+                    with storage.map_markdown(doc_id) as data:
+                        scan(data, compiled, limit=1000)
+
+            before = timed(read_all, args.repeat)
+            after = timed(map_all, args.repeat)
+            print(
+                f"{name:<8} read + finditer {before:9.1f} ms"
+                f"   map + scan {after:9.1f} ms"
+            )
+
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = await service.grep(pattern, regex=regex, limit=1000)
+                samples.append(time.perf_counter() - started)
+            ms = statistics.median(samples) * 1000
+            print(
+                f"{name:<8} DocumentService.grep {ms:9.1f} ms"
+                f"  ({len(result.matches)} matches)"
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Time building and serializing document listings over REST and MCP.
+
+Usage:
+    uv run python benchmarks/list_serialization.py --limit 100
+
+Seeds a temporary database, then times, per page of *limit* documents:
+
+- turning rows into models: one ``model_validate`` per row, as listing did
+  before, against the single validation call DocumentService.list makes;
+- encoding the page: FastAPI's default ``jsonable_encoder`` plus
+  ``json.dumps``, against ``model_dump_json``;
+- ``GET /api/documents`` end to end through the ASGI app, next to a route
+  returning the same model the default way;
+- a ``list_documents`` MCP tool call.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+from docfabric.api.router import router
+from docfabric.conversion.converter import MarkdownConverter
+from docfabric.db.engine import create_engine, init_db
+from docfabric.db.repository import DocumentRepository
+from docfabric.db.tables import documents
+from docfabric.mcp.server import create_mcp_server
+from docfabric.models.document import DocumentList, DocumentMetadata
+from docfabric.service.document import DocumentService
+from docfabric.storage import FileStorage
+
+
+async def seed(engine, count: int) -> None:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    rows = [
+        {
+            "id": str(uuid4()),
+            "filename": f"report-{n}.pdf",
+            "content_type": "application/pdf",
+            "size_bytes": 100_000 + n,
+            "metadata": {"project": f"p{n % 10}", "lang": "en", "ref": str(n)},
+            "status": "ready",
+            "conversion_profile": "fast",
+            "content_sha256": "0" * 64,
+            "created_at": start + timedelta(seconds=n),
+            "updated_at": start + timedelta(seconds=n),
+        }
+        for n in range(count)
+    ]
+    async with engine.begin() as conn:
+        await conn.execute(documents.insert(), rows)
+
+
+def timed(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def timed_async(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def report(name: str, before: float, after: float) -> None:
+    print(f"{name:<28} {before:8.3f} ms -> {after:8.3f} ms  ({before / after:.1f}x)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        await init_db(engine)
+        await seed(engine, args.documents)
+        repo = DocumentRepository(engine)
+        service = DocumentService(
+            repository=repo,
+            storage=FileStorage(Path(tmp)),
+            converter=MarkdownConverter(),
+        )
+        rows, total = await repo.list(limit=args.limit)
+        page = {"total": total, "limit": args.limit, "offset": 0}
+
+        def per_row():
+            items = [DocumentMetadata.model_validate(r) for r in rows]
+            return DocumentList(items=items, **page)
+
+        def per_page():
+            return DocumentList.model_validate({"items": rows, **page})
+
+        report(
+            "rows to models",
+            timed(per_row, args.repeat),
+            timed(per_page, args.repeat),
+        )
+        result = per_page()
+        report(
+            "encode page",
+            timed(lambda: json.dumps(jsonable_encoder(result)).encode(), args.repeat),
+            timed(result.model_dump_json, args.repeat),
+        )
+
+        app = FastAPI()
+        app.state.document_service = service
+        app.include_router(router, prefix="/api")
+
+        @app.get("/default/documents")
+        async def default_list(limit: int):
+            return await service.list(limit=limit)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://b") as c:
+            query = {"limit": args.limit}
+            before = await timed_async(
+                lambda: c.get("/default/documents", params=query), args.repeat
+            )
+            after = await timed_async(
+                lambda: c.get("/api/documents", params=query), args.repeat
+            )
+            report("GET /api/documents", before, after)
+
+        mcp = create_mcp_server(lambda: service)
+        ms = await timed_async(
+            lambda: mcp.call_tool("list_documents", {"limit": args.limit}),
+            args.repeat,
+        )
+        print(f"{'MCP list_documents':<28} {ms:8.3f} ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Time metadata-filtered listing and facet counts on a large catalogue.
+
+Usage:
+    uv run python benchmarks/metadata_filter.py --documents 1000000
+
+Seeds a temporary SQLite database with documents carrying a ``project``
+(100 values), ``lang`` (5 values) and unique ``ref`` key, builds the metadata
+lookup table the way an upgrade does, then times the first page of filtered
+listings and facet counts through DocumentRepository.
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from docfabric.db.engine import create_engine, init_db
+from docfabric.db.repository import DocumentRepository
+from docfabric.db.tables import documents
+
+_LANGS = ["en", "de", "fr", "es", "it"]
+_BATCH = 10_000
+
+
+async def seed(engine, count: int) -> None:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    for first in range(0, count, _BATCH):
+        docs = []
+        for n in range(first, min(first + _BATCH, count)):
+            doc_id = str(uuid4())
+            created_at = start + timedelta(seconds=n)
+            meta = {
+                "project": f"p{n % 100}",
+                "lang": _LANGS[n % len(_LANGS)],
+                "ref": str(n),
+            }
+            docs.append(
+                {
+                    "id": doc_id,
+                    "filename": f"{n}.pdf",
+                    "content_type": "application/pdf",
+                    "size_bytes": 1,
+                    "metadata": meta,
+                    "status": "ready",
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+        async with engine.begin() as conn:
+            await conn.execute(documents.insert(), docs)
+
+
+async def timed(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(documents.create)
+        await seed(engine, args.documents)
+        start = time.perf_counter()
+        await init_db(engine)
+        elapsed = time.perf_counter() - start
+        print(f"indexed {args.documents} documents in {elapsed:.1f} s")
+
+        repo = DocumentRepository(engine)
+        cases = {
+            "unique value": {"ref": str(args.documents // 2)},
+            "1% of documents": {"project": "p7"},
+            "20% of documents": {"lang": "de"},
+            "two filters": {"lang": "fr", "project": "p7"},
+        }
+        for name, filters in cases.items():
+            ms = await timed(lambda f=filters: repo.list(metadata=f), args.repeat)
+            print(f"list {name:<18} {ms:8.2f} ms")
+        ms = await timed(lambda: repo.facets(["project", "lang"]), args.repeat)
+        print(f"facets project, lang    {ms:8.2f} ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
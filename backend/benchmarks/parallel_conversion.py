@@ -0,0 +1,91 @@
+"""Compare serial and page-range-parallel PDF conversion.
+
+Usage:
+    uv run python benchmarks/parallel_conversion.py report.pdf --workers 4
+    uv run python benchmarks/parallel_conversion.py --pages 400 --simulate 0.05
+
+With ``--simulate SECONDS`` docling is replaced by a stand-in that spends
+SECONDS per page outside the GIL, as model inference does. This measures the
+splitting and scheduling overhead on machines without the docling models.
+"""
+
+import argparse
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pypdfium2 as pdfium
+
+from docfabric.conversion.converter import MarkdownConverter
+
+
+def blank_pdf(path: Path, pages: int) -> None:
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(612, 792)
+    pdf.save(path)
+    pdf.close()
+
+
+def simulated_docling(seconds_per_page: float):
+    def convert(source, page_range):
+        first, last = page_range
+        time.sleep(seconds_per_page * (last - first + 1))
+        result = MagicMock()
+        result.document.export_to_markdown.side_effect = lambda page_no: (
+            f"## Page {page_no}"
+        )
+        return result
+
+    docling = MagicMock()
+    docling.return_value.convert.side_effect = convert
+    return patch("docfabric.conversion.converter.DocumentConverter", docling)
+
+
+def run(path: Path, **options) -> tuple[float, str]:
+    converter = MarkdownConverter(**options)
+    try:
+        start = time.perf_counter()
+        markdown = converter.convert_document(path).markdown
+        return time.perf_counter() - start, markdown
+    finally:
+        converter.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", type=Path, nargs="?", help="PDF to convert")
+    parser.add_argument("--pages", type=int, default=200, help="blank PDF size")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--range-pages", type=int, default=16)
+    parser.add_argument("--simulate", type=float, metavar="SECONDS")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = Path(tmp) / "blank.pdf"
+            blank_pdf(path, args.pages)
+
+        with simulated_docling(args.simulate) if args.simulate else nullcontext():
+            serial, expected = run(path, workers=1)
+            parallel, markdown = run(
+                path,
+                workers=args.workers,
+                split_pages=0,
+                range_pages=args.range_pages,
+            )
+
+    assert markdown == expected, "parallel output differs from serial output"
+    print(f"serial:   {serial:8.2f} s")
+    print(
+        f"parallel: {parallel:8.2f} s  ({args.workers} workers, "
+        f"{args.range_pages}-page ranges)"
+    )
+    print(f"speedup:  {serial / parallel:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,144 @@
+import hashlib
 import json
+import re
+from collections.abc import AsyncIterator, Iterator
 from uuid import UUID
 
 from fastapi import APIRouter, Query, Request, Response, UploadFile
 from fastapi import Form as FormField
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
 
-from docfabric.models.document import OutlineMode
+from docfabric.models.document import (
+    BulkDocumentDelete,
+    BulkDocumentPatch,
+    ConversionProfile,
+    DocumentPatch,
+    DocumentStatus,
+    OutlineMode,
+    UploadCreate,
+)
 from docfabric.service.document import DocumentService
 
 router = APIRouter()
 
+# Representations only change on update or reconversion, so caches may store
+# them but must revalidate; revalidation is answered from the metadata row.
+_CACHE_CONTROL = "no-cache"
+
+_JSON = "application/json"
+_MARKDOWN = "text/markdown"
+_NDJSON = "application/x-ndjson"
+
 
 def get_document_service(request: Request) -> DocumentService:
     return request.app.state.document_service
 
 
+def _etag(*parts: object) -> str:
+    digest = hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """Set caching headers and return a 304 response if *etag* matches."""
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def _json_response(body: BaseModel | str, response: Response | None = None) -> Response:
+    """Serialize a model once with pydantic-core and skip FastAPI's
+    ``jsonable_encoder``, which walks the model in Python.
+
+    Headers already set on *response* are carried over.
+    """
+    if isinstance(body, BaseModel):
+        body = body.model_dump_json()
+    headers = dict(response.headers) if response is not None else None
+    return Response(body, media_type=_JSON, headers=headers)
+
+
+def _metadata_filters(meta: list[str]) -> dict[str, str]:
+    """Parse ``key:value`` query parameters into metadata filters."""
+    filters = {}
+    for item in meta:
+        key, sep, value = item.partition(":")
+        if not key or not sep:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid metadata filter: {item!r}"
+            )
+        filters[key] = value
+    return filters
+
+
+def _negotiate(request: Request, offered: list[str]) -> str:
+    """Return the offered media type with the highest Accept quality.
+
+    Falls back to the first offered type; wildcards never select a
+    streaming type.
+    """
+    best, best_q = offered[0], 0.0
+    for entry in request.headers.get("accept", "").split(","):
+        media_type, *params = [p.strip() for p in entry.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in offered and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _ndjson_lines(chunks: Iterator[str], offset: int) -> Iterator[str]:
+    for chunk in chunks:
+        yield json.dumps({"offset": offset, "content": chunk}) + "\n"
+        offset += len(chunk)
+
+
+async def _ndjson_models(items: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    async for item in items:
+        yield item.model_dump_json() + "\n"
+
+
+@router.get("/changes")
+async def list_changes(
+    request: Request,
+    response: Response,
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=10_000),
+):
+    service = get_document_service(request)
+    media_type = _negotiate(request, [_JSON, _NDJSON])
+    response.headers["Vary"] = "Accept"
+    if media_type == _NDJSON:
+        changes = await service.stream_changes(since=since, batch_size=limit)
+        return StreamingResponse(
+            _ndjson_models(changes),
+            media_type=_NDJSON,
+            headers=dict(response.headers),
+        )
+    result = await service.list_changes(since=since, limit=limit)
+    return _json_response(result, response)
+
+
 @router.post("/documents", status_code=201)
 async def create_document(
     request: Request,
     file: UploadFile,
     metadata: str | None = FormField(default=None),
+    profile: ConversionProfile | None = FormField(default=None),
 ):
     service = get_document_service(request)
 
@@ -39,6 +158,7 @@ async def create_document(
         content_type=content_type,
         data=data,
         metadata=parsed_metadata,
+        profile=profile,
     )
     return doc
 
@@ -48,15 +168,81 @@ async def list_documents(
     request: Request,
     limit: int = Query(default=20, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
+    meta: list[str] = Query(default=[]),
+):
+    service = get_document_service(request)
+    result = await service.list(
+        limit=limit, offset=offset, metadata=_metadata_filters(meta)
+    )
+    return _json_response(result)
+
+
+@router.get("/documents/facets")
+async def document_facets(request: Request, key: list[str] = Query(default=[])):
+    service = get_document_service(request)
+    return _json_response(await service.facets(key))
+
+
+@router.get("/documents/grep")
+async def grep_documents(
+    request: Request,
+    pattern: str = Query(min_length=1),
+    document_id: UUID | None = Query(default=None),
+    meta: list[str] = Query(default=[]),
+    regex: bool = Query(default=False),
+    ignore_case: bool = Query(default=False),
+    context: int = Query(default=0, ge=0, le=10),
+    limit: int = Query(default=100, ge=1, le=1000),
+    timeout: float = Query(default=10.0, gt=0, le=60),
 ):
     service = get_document_service(request)
-    return await service.list(limit=limit, offset=offset)
+    try:
+        result = await service.grep(
+            pattern,
+            document_id=document_id,
+            metadata=_metadata_filters(meta),
+            regex=regex,
+            ignore_case=ignore_case,
+            context=context,
+            limit=limit,
+            timeout=timeout,
+        )
+    except re.error as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid pattern: {exc}")
+    return _json_response(result)
+
+
+@router.patch("/documents")
+async def patch_documents(request: Request, body: BulkDocumentPatch):
+    service = get_document_service(request)
+    return await service.patch_many(
+        body.ids, metadata=body.metadata, metadata_mode=body.metadata_mode
+    )
+
+
+@router.post("/documents/delete", status_code=202)
+async def delete_documents(request: Request, body: BulkDocumentDelete):
+    service = get_document_service(request)
+    return await service.delete_many(body.ids, metadata=body.metadata)
 
 
 @router.get("/documents/{document_id}")
-async def get_document(request: Request, document_id: UUID):
+async def get_document(
+    request: Request,
+    response: Response,
+    document_id: UUID,
+    wait: float | None = Query(default=None, gt=0, le=60),
+):
     service = get_document_service(request)
-    return await service.get(document_id)
+    if wait is not None:
+        doc = await service.wait_for_status(document_id, timeout=wait)
+    else:
+        doc = await service.get(document_id)
+    body = doc.model_dump_json()
+    not_modified = _not_modified(request, response, _etag(body))
+    if not_modified is not None:
+        return not_modified
+    return _json_response(body, response)
 
 
 @router.put("/documents/{document_id}")
@@ -64,6 +250,7 @@ async def update_document(
     request: Request,
     document_id: UUID,
     file: UploadFile,
+    profile: ConversionProfile | None = FormField(default=None),
 ):
     service = get_document_service(request)
 
@@ -76,6 +263,18 @@ async def update_document(
         filename=filename,
         content_type=content_type,
         data=data,
+        profile=profile,
+    )
+
+
+@router.patch("/documents/{document_id}")
+async def patch_document(request: Request, document_id: UUID, body: DocumentPatch):
+    service = get_document_service(request)
+    return await service.patch(
+        document_id,
+        filename=body.filename,
+        metadata=body.metadata,
+        metadata_mode=body.metadata_mode,
     )
 
 
@@ -88,22 +287,114 @@ async def delete_document(request: Request, document_id: UUID):
 @router.get("/documents/{document_id}/content")
 async def get_document_content(
     request: Request,
+    response: Response,
     document_id: UUID,
     offset: int | None = Query(default=None, ge=0),
     limit: int | None = Query(default=None, ge=1),
+    max_tokens: int | None = Query(default=None, ge=1),
 ):
     service = get_document_service(request)
-    return await service.get_content(document_id, offset=offset, limit=limit)
+    media_type = _JSON
+    if max_tokens is None:
+        media_type = _negotiate(request, [_JSON, _MARKDOWN, _NDJSON])
+    response.headers["Vary"] = "Accept"
+
+    doc = await service.get(document_id)
+    if doc.status is DocumentStatus.ready:
+        etag = _etag(
+            doc.id, doc.updated_at.isoformat(), offset, limit, max_tokens, media_type
+        )
+        not_modified = _not_modified(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+
+    if media_type == _JSON:
+        return await service.get_content(
+            document_id, offset=offset, limit=limit, max_tokens=max_tokens
+        )
+
+    chunks = await service.stream_content(document_id, offset=offset, limit=limit)
+    if media_type == _NDJSON:
+        chunks = _ndjson_lines(chunks, offset or 0)
+    else:
+        media_type = f"{_MARKDOWN}; charset=utf-8"
+    return StreamingResponse(
+        chunks, media_type=media_type, headers=dict(response.headers)
+    )
 
 
 @router.get("/documents/{document_id}/outline")
 async def get_document_outline(
     request: Request,
+    response: Response,
     document_id: UUID,
     mode: OutlineMode = Query(default=OutlineMode.flat),
+    max_depth: int | None = Query(default=None, ge=1),
+    subtree: str | None = Query(default=None, min_length=1),
+    limit: int | None = Query(default=None, ge=1),
+    offset: int = Query(default=0, ge=0),
+):
+    service = get_document_service(request)
+    doc = await service.get(document_id)
+    if doc.status is DocumentStatus.ready:
+        etag = _etag(
+            doc.id,
+            doc.updated_at.isoformat(),
+            mode.value,
+            max_depth,
+            subtree,
+            limit,
+            offset,
+        )
+        not_modified = _not_modified(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+    result = await service.get_outline(
+        document_id,
+        mode=mode,
+        max_depth=max_depth,
+        subtree=subtree,
+        limit=limit,
+        offset=offset,
+    )
+    return _json_response(result, response)
+
+
+@router.get("/documents/{document_id}/section")
+async def get_document_section(
+    request: Request,
+    response: Response,
+    document_id: UUID,
+    heading_path: str | None = Query(default=None, min_length=1),
+    index: int | None = Query(default=None, ge=0),
+    mode: OutlineMode = Query(default=OutlineMode.nested),
+    max_tokens: int | None = Query(default=None, ge=1),
 ):
+    if (heading_path is None) == (index is None):
+        raise HTTPException(
+            status_code=422, detail="Give exactly one of heading_path or index"
+        )
     service = get_document_service(request)
-    return await service.get_outline(document_id, mode=mode)
+    doc = await service.get(document_id)
+    if doc.status is DocumentStatus.ready:
+        etag = _etag(
+            doc.id,
+            doc.updated_at.isoformat(),
+            heading_path,
+            index,
+            mode.value,
+            max_tokens,
+        )
+        not_modified = _not_modified(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+    return await service.read_section(
+        document_id,
+        heading_path=heading_path,
+        index=index,
+        mode=mode,
+        max_tokens=max_tokens,
+    )
 
 
 @router.get("/documents/{document_id}/original")
@@ -116,3 +407,47 @@ async def get_document_original(request: Request, document_id: UUID):
         media_type=meta.content_type,
         headers={"Content-Disposition": f'attachment; filename="{meta.filename}"'},
     )
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: Request, body: UploadCreate):
+    service = get_document_service(request)
+    return await service.create_upload(
+        filename=body.filename,
+        content_type=body.content_type,
+        size_bytes=body.size_bytes,
+        metadata=body.metadata,
+        profile=body.profile,
+    )
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(request: Request, upload_id: UUID):
+    service = get_document_service(request)
+    return await service.get_upload(upload_id)
+
+
+@router.put("/uploads/{upload_id}")
+async def append_upload(
+    request: Request,
+    upload_id: UUID,
+    offset: int = Query(ge=0),
+):
+    service = get_document_service(request)
+    try:
+        return await service.append_upload(upload_id, offset, request.stream())
+    except ClientDisconnect:
+        # Whatever arrived is committed; the client resumes from GET.
+        return Response(status_code=400)
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=201)
+async def complete_upload(request: Request, upload_id: UUID):
+    service = get_document_service(request)
+    return await service.complete_upload(upload_id)
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(request: Request, upload_id: UUID):
+    service = get_document_service(request)
+    await service.abort_upload(upload_id)
@@ -0,0 +1,156 @@
+"""Maintenance commands for a DocFabric store: ``docfabric <command>``."""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+
+from docfabric.config import Settings
+from docfabric.storage import FileStorage
+
+
+def _migrate_storage(args: argparse.Namespace, settings: Settings) -> int:
+    storage = FileStorage(args.storage_path, shard_depth=args.shard_depth)
+    moved = storage.migrate_layout()
+    print(f"Moved {moved} entries to shard depth {args.shard_depth}")
+    return 0
+
+
+async def _run_service(args: argparse.Namespace, settings: Settings, call):
+    """Await ``call(service)`` against the configured database and storage."""
+    # Imported here so storage migration does not load docling.
+    from docfabric.conversion.converter import MarkdownConverter
+    from docfabric.db.engine import create_engine, init_db
+    from docfabric.db.repository import DocumentRepository
+    from docfabric.service.document import DocumentService
+
+    engine = create_engine(settings.database_url)
+    try:
+        await init_db(engine)
+        service = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=FileStorage(
+                args.storage_path,
+                shard_depth=settings.storage_shard_depth,
+                durability=settings.storage_durability,
+            ),
+            converter=MarkdownConverter(),
+        )
+        return await call(service)
+    finally:
+        await engine.dispose()
+
+
+async def _verify_storage(args: argparse.Namespace, settings: Settings) -> int:
+    report = await _run_service(
+        args, settings, lambda service: service.verify_storage(repair=args.repair)
+    )
+    print(f"Checked {report.checked} ready documents")
+    for document_id in report.torn:
+        print(f"Torn or missing markdown: {document_id}")
+    if args.repair:
+        print(
+            f"Repaired {report.repaired}, recorded {report.hashed} hashes, "
+            f"removed {report.temp_files_removed} temp files"
+        )
+    return 1 if report.torn and not args.repair else 0
+
+
+async def _reconcile(args: argparse.Namespace, settings: Settings) -> int:
+    report = await _run_service(
+        args,
+        settings,
+        # Conversions run in the server, which restarts stuck ones itself.
+        lambda service: service.reconcile(
+            repair=args.repair,
+            grace=args.grace,
+            rate=args.rate,
+            restart_stuck=False,
+        ),
+    )
+    print(
+        f"Checked {report.rows_checked} documents "
+        f"and {report.entries_checked} stored entries"
+    )
+    for label, ids in (
+        ("Orphaned files", report.orphans),
+        ("Missing files", report.missing),
+        ("Stuck in processing", report.stuck),
+    ):
+        for document_id in ids:
+            print(f"{label}: {document_id}")
+    if args.repair:
+        print(f"Repaired {report.repaired}")
+    found = report.orphans or report.missing or report.stuck
+    return 1 if found and not args.repair else 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    settings = Settings()
+    parser = argparse.ArgumentParser(prog="docfabric")
+    parser.add_argument(
+        "--storage-path",
+        type=Path,
+        default=settings.storage_path,
+        help="storage directory (default: STORAGE_PATH)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser(
+        "migrate-storage",
+        help="move stored files to the configured shard depth; safe while serving",
+    )
+    migrate.add_argument(
+        "--shard-depth",
+        type=int,
+        default=settings.storage_shard_depth,
+        help="directory levels to shard into (default: STORAGE_SHARD_DEPTH)",
+    )
+    migrate.set_defaults(run=_migrate_storage)
+
+    verify = commands.add_parser(
+        "verify",
+        help="check stored markdown against recorded hashes",
+    )
+    verify.add_argument(
+        "--repair",
+        action="store_true",
+        help="rewrite or reconvert torn files and remove stale temp files",
+    )
+    verify.set_defaults(
+        run=lambda args, settings: asyncio.run(_verify_storage(args, settings))
+    )
+
+    reconcile = commands.add_parser(
+        "reconcile",
+        help="find orphaned files, missing files and stuck conversions",
+    )
+    reconcile.add_argument(
+        "--repair",
+        action="store_true",
+        help="delete orphans, reconvert or fail broken documents; "
+        "stuck conversions are only reported",
+    )
+    reconcile.add_argument(
+        "--grace",
+        type=float,
+        default=settings.reconcile_grace,
+        help="skip anything changed in the last N seconds (default: RECONCILE_GRACE)",
+    )
+    reconcile.add_argument(
+        "--rate",
+        type=float,
+        default=settings.reconcile_rate,
+        help="rows and entries per second, 0 for no limit (default: RECONCILE_RATE)",
+    )
+    reconcile.set_defaults(
+        run=lambda args, settings: asyncio.run(_reconcile(args, settings))
+    )
+
+    args = parser.parse_args(argv)
+    return args.run(args, settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
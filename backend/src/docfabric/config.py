@@ -1,10 +1,43 @@
 from pathlib import Path
+from typing import Literal
 
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
+from docfabric.models.document import ConversionProfile
+from docfabric.storage import MAX_SHARD_DEPTH, Durability
+
 
 class Settings(BaseSettings):
     database_url: str = "sqlite+aiosqlite:///docfabric.db"
     storage_path: Path = Path("storage")
+    storage_shard_depth: int = Field(default=2, ge=0, le=MAX_SHARD_DEPTH)
+    storage_durability: Durability = "group"
+    tokenizer: str = "approximate"
+    gzip_minimum_size: int = 1024
+    metrics_enabled: bool = True
+    sync_path: Path | None = None
+    sync_interval: float = 60.0
+    conversion_workers: int = 4
+    conversion_split_pages: int = 64
+    conversion_range_pages: int = 16
+    conversion_profile: ConversionProfile = ConversionProfile.auto
+    conversion_concurrency: int = 2
+    conversion_size_weight: float = 1.0
+    conversion_policy: Literal["eager", "deferred"] = "eager"
+    conversion_idle_interval: float = 30.0
+    shutdown_drain_timeout: float = 30.0
+    reconcile_interval: float = 3600.0
+    reconcile_rate: float = 500.0
+    reconcile_grace: float = 3600.0
+    sweep_interval: float = 60.0
+    sweep_rate: float = 200.0
+    changes_retention: float = 30 * 24 * 3600.0
+    upload_ttl: float = 7 * 24 * 3600.0
+    ready_max_queued: int = 50
+    ready_max_backlog_seconds: float = 600.0
+    ready_max_db_latency: float = 0.5
+    ready_min_free_bytes: int = 1024**3
+    ready_max_loop_lag: float = 0.5
 
     model_config = {"env_file": ".env"}
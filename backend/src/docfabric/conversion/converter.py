@@ -1,19 +1,285 @@
+import hashlib
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
-from docling.document_converter import DocumentConverter
+import pypdfium2 as pdfium
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+from docling.document_converter import (
+    DocumentConverter,
+    ImageFormatOption,
+    PdfFormatOption,
+)
+
+from docfabric.models.document import ConversionProfile
+
+# Pages are joined with a blank line, so every page starts a new paragraph.
+PAGE_SEPARATOR = "\n\n"
+
+# Renders used for page hashes only need to catch visual changes that leave
+# the text layer alone, such as replaced figures.
+_HASH_RENDER_SCALE = 0.25
+
+# A page has text if its text layer holds this many non-space characters; a
+# PDF is treated as born-digital if this share of its pages do.
+_TEXT_PAGE_CHARS = 32
+_TEXT_LAYER_SHARE = 0.9
+
+# Assumed page size of formats whose page count is unknown before conversion.
+_BYTES_PER_PAGE = 50_000
 
 
 class ConversionError(RuntimeError):
     pass
 
 
+@dataclass
+class PageFragment:
+    hash: str
+    markdown: str
+
+
+@dataclass
+class ConvertedDocument:
+    markdown: str
+    page_count: int
+    profile: ConversionProfile = ConversionProfile.balanced
+    pages: list[PageFragment] = field(default_factory=list)
+    reused_pages: int = 0
+
+
+@dataclass
+class PdfInspection:
+    page_hashes: list[str]
+    text_pages: int
+
+    @property
+    def has_text_layer(self) -> bool:
+        pages = len(self.page_hashes)
+        return pages > 0 and self.text_pages >= _TEXT_LAYER_SHARE * pages
+
+
+def inspect_pdf(file_path: Path) -> PdfInspection | None:
+    """Hash every page and count the pages with a usable text layer.
+
+    A page hash covers the text layer and a low-resolution render. Returns
+    None if the file is not a PDF that pdfium can open.
+    """
+    try:
+        pdf = pdfium.PdfDocument(file_path)
+    except pdfium.PdfiumError:
+        return None
+    try:
+        hashes = []
+        text_pages = 0
+        for page in pdf:
+            text = page.get_textpage().get_text_bounded()
+            if len("".join(text.split())) >= _TEXT_PAGE_CHARS:
+                text_pages += 1
+            digest = hashlib.sha256(text.encode())
+            bitmap = page.render(scale=_HASH_RENDER_SCALE, grayscale=True)
+            digest.update(bytes(bitmap.buffer))
+            hashes.append(digest.hexdigest())
+        return PdfInspection(page_hashes=hashes, text_pages=text_pages)
+    finally:
+        pdf.close()
+
+
+def estimate_pages(file_path: Path, content_type: str) -> int:
+    """Estimate the page count of an original without converting it.
+
+    PDFs report their page count; other formats are estimated from size.
+    The estimate only orders the queue, so a missing or unreadable file
+    counts as one page and is left for the conversion to report.
+    """
+    if content_type.startswith("image/"):
+        return 1
+    try:
+        pdf = pdfium.PdfDocument(file_path)
+    except pdfium.PdfiumError:
+        pass
+    except OSError:
+        return 1
+    else:
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    try:
+        return max(1, file_path.stat().st_size // _BYTES_PER_PAGE)
+    except OSError:
+        return 1
+
+
+def _pipeline_options(profile: ConversionProfile) -> PdfPipelineOptions:
+    """Docling options per profile; ``balanced`` is docling's default."""
+    options = PdfPipelineOptions()
+    if profile is ConversionProfile.fast:
+        options.do_ocr = False
+        options.table_structure_options.mode = TableFormerMode.FAST
+    elif profile is ConversionProfile.accurate:
+        options.ocr_options.force_full_page_ocr = True
+    return options
+
+
+def _create_converter(profile: ConversionProfile) -> DocumentConverter:
+    options = _pipeline_options(profile)
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=options),
+            InputFormat.IMAGE: ImageFormatOption(pipeline_options=options),
+        }
+    )
+
+
+def _runs(indexes: Iterable[int]) -> Iterator[tuple[int, int]]:
+    """Group sorted indexes into inclusive ``(first, last)`` runs."""
+    first = last = None
+    for i in indexes:
+        if last is not None and i == last + 1:
+            last = i
+            continue
+        if first is not None:
+            yield first, last
+        first = last = i
+    if first is not None:
+        yield first, last
+
+
+def _page_ranges(
+    missing: list[int], split_pages: int, range_pages: int
+) -> list[tuple[int, int]]:
+    """Split the pages to convert into ranges that can run concurrently.
+
+    Contiguous runs are kept whole unless more than *split_pages* pages are
+    missing, in which case each run is cut into *range_pages*-sized ranges.
+    """
+    runs = list(_runs(missing))
+    if len(missing) <= split_pages:
+        return runs
+    return [
+        (start, min(start + range_pages - 1, last))
+        for first, last in runs
+        for start in range(first, last + 1, range_pages)
+    ]
+
+
 class MarkdownConverter:
-    def __init__(self) -> None:
-        self._converter = DocumentConverter()
+    def __init__(
+        self,
+        *,
+        workers: int = 1,
+        split_pages: int = 64,
+        range_pages: int = 16,
+        default_profile: ConversionProfile = ConversionProfile.auto,
+    ) -> None:
+        # Docling builds pipelines lazily, so unused profiles load no models.
+        self._converters = {
+            profile: _create_converter(profile)
+            for profile in ConversionProfile
+            if profile is not ConversionProfile.auto
+        }
+        self._default_profile = default_profile
+        self._split_pages = split_pages
+        self._range_pages = range_pages
+        # Shared by all documents, so it also caps concurrent docling calls
+        # from split conversions.
+        self._executor = (
+            ThreadPoolExecutor(workers, thread_name_prefix="docling")
+            if workers > 1
+            else None
+        )
+
+    @property
+    def default_profile(self) -> ConversionProfile:
+        return self._default_profile
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
 
     def convert(self, file_path: Path) -> str:
+        return self.convert_document(file_path).markdown
+
+    def convert_document(
+        self,
+        file_path: Path,
+        *,
+        profile: ConversionProfile | None = None,
+        previous: dict[str, str] | None = None,
+    ) -> ConvertedDocument:
+        """Convert *file_path* to markdown.
+
+        ``auto`` (the default unless configured otherwise) picks ``fast`` for
+        PDFs with a usable text layer, skipping OCR, and ``balanced`` for
+        everything else.
+
+        PDFs are converted page by page. A page whose hash is a key of
+        *previous* reuses that markdown fragment; only the remaining pages are
+        run through docling, in page ranges converted concurrently on the
+        worker pool. Fragments are joined in page order, so headings and
+        offsets do not depend on how the pages were split.
+        """
+        inspection = inspect_pdf(file_path)
+        profile = profile or self._default_profile
+        if profile is ConversionProfile.auto:
+            if inspection is not None and inspection.has_text_layer:
+                profile = ConversionProfile.fast
+            else:
+                profile = ConversionProfile.balanced
+        converter = self._converters[profile]
+
+        if inspection is None:
+            document = self._convert(converter, file_path).document
+            return ConvertedDocument(
+                markdown=document.export_to_markdown(),
+                page_count=len(document.pages),
+                profile=profile,
+            )
+
+        # Fragments are only reused from a conversion with the same profile.
+        hashes = [
+            hashlib.sha256(f"{profile.value}:{h}".encode()).hexdigest()
+            for h in inspection.page_hashes
+        ]
+        previous = previous or {}
+        fragments = [previous.get(h) for h in hashes]
+        missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+        ranges = _page_ranges(missing, self._split_pages, self._range_pages)
+        if self._executor is not None and len(ranges) > 1:
+            results = self._executor.map(
+                lambda r: self._convert_range(converter, file_path, *r), ranges
+            )
+        else:
+            results = (self._convert_range(converter, file_path, *r) for r in ranges)
+        for (first, last), converted in zip(ranges, results):
+            fragments[first : last + 1] = converted
+
+        pages = [PageFragment(h, f) for h, f in zip(hashes, fragments)]
+        return ConvertedDocument(
+            markdown=PAGE_SEPARATOR.join(p.markdown for p in pages),
+            page_count=len(pages),
+            profile=profile,
+            pages=pages,
+            reused_pages=len(pages) - len(missing),
+        )
+
+    def _convert_range(
+        self, converter: DocumentConverter, file_path: Path, first: int, last: int
+    ) -> list[str]:
+        """Convert pages *first* to *last* (0-based, inclusive) to fragments."""
+        document = self._convert(
+            converter, file_path, page_range=(first + 1, last + 1)
+        ).document
+        return [
+            document.export_to_markdown(page_no=i + 1).strip()
+            for i in range(first, last + 1)
+        ]
+
+    def _convert(self, converter: DocumentConverter, file_path: Path, **kwargs):
         try:
-            result = self._converter.convert(str(file_path))
+            return converter.convert(str(file_path), **kwargs)
         except Exception as exc:
             raise ConversionError(str(exc)) from exc
-        return result.document.export_to_markdown()
@@ -0,0 +1,206 @@
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from docfabric.conversion.tokenizer import Tokenizer
+
+INDEX_VERSION = 2
+
+_HEADING_LINE_RE = re.compile(r"#{1,6}\s+\S")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$", re.MULTILINE)
+
+HEADING_PATH_SEPARATOR = " > "
+
+
+@dataclass
+class MarkdownIndex:
+    """Token counts per paragraph block of a markdown document, and its
+    headings.
+
+    A block starts at a heading line or at the first line after a blank line
+    and runs up to the start of the next block. Headings are
+    ``(offset, level, title)`` in document order.
+    """
+
+    tokenizer: str
+    total_length: int
+    offsets: list[int]
+    tokens: list[int]
+    sections: list[bool]
+    headings: list[tuple[int, int, str]]
+
+    @classmethod
+    def build(cls, text: str, tokenizer: Tokenizer) -> "MarkdownIndex":
+        offsets: list[int] = []
+        sections: list[bool] = []
+        pos = 0
+        after_blank = True
+        for line in text.splitlines(keepends=True):
+            if line.strip():
+                is_heading = _HEADING_LINE_RE.match(line) is not None
+                if after_blank or is_heading:
+                    offsets.append(pos)
+                    sections.append(is_heading)
+                after_blank = False
+            else:
+                after_blank = True
+            pos += len(line)
+
+        if offsets:
+            offsets[0] = 0
+        else:
+            offsets, sections = [0], [False]
+
+        bounds = offsets[1:] + [len(text)]
+        tokens = [
+            tokenizer.count(text[start:end]) for start, end in zip(offsets, bounds)
+        ]
+        headings = [
+            (m.start(), len(m.group(1)), m.group(2).strip())
+            for m in _HEADING_RE.finditer(text)
+        ]
+        return cls(
+            tokenizer=tokenizer.name,
+            total_length=len(text),
+            offsets=offsets,
+            tokens=tokens,
+            sections=sections,
+            headings=headings,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MarkdownIndex | None":
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(
+            tokenizer=data["tokenizer"],
+            total_length=data["total_length"],
+            offsets=data["offsets"],
+            tokens=data["tokens"],
+            sections=[bool(s) for s in data["sections"]],
+            headings=[tuple(h) for h in data["headings"]],
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "tokenizer": self.tokenizer,
+            "total_length": self.total_length,
+            "offsets": self.offsets,
+            "tokens": self.tokens,
+            "sections": [int(s) for s in self.sections],
+            "headings": self.headings,
+        }
+
+    def heading_paths(self) -> list[str]:
+        """Titles of each heading and its ancestors, joined outermost first."""
+        paths = []
+        stack: list[tuple[int, str]] = []
+        for _, level, title in self.headings:
+            stack = [(lv, t) for lv, t in stack if lv < level]
+            stack.append((level, title))
+            paths.append(HEADING_PATH_SEPARATOR.join(t for _, t in stack))
+        return paths
+
+    def tree(self) -> tuple[list[int | None], list[int]]:
+        """Parent of each heading and the end of its nested section, found in
+        one pass."""
+        parents: list[int | None] = []
+        ends = [self.total_length] * len(self.headings)
+        open_: list[int] = []
+        for i, (start, level, _) in enumerate(self.headings):
+            while open_ and self.headings[open_[-1]][1] >= level:
+                ends[open_.pop()] = start
+            parents.append(open_[-1] if open_ else None)
+            open_.append(i)
+        return parents, ends
+
+    def heading_path(self, i: int) -> str:
+        """Path of heading *i* alone, walking back only to its ancestors."""
+        _, level, title = self.headings[i]
+        titles = [title]
+        for j in range(i - 1, -1, -1):
+            if level == 1:
+                break
+            _, other_level, other_title = self.headings[j]
+            if other_level < level:
+                titles.append(other_title)
+                level = other_level
+        return HEADING_PATH_SEPARATOR.join(reversed(titles))
+
+    def heading_at(self, offset: int) -> int | None:
+        """Index of the last heading at or before *offset*."""
+        i = bisect_right(self.headings, offset, key=lambda h: h[0]) - 1
+        return i if i >= 0 else None
+
+    def section_end(self, i: int, *, nested: bool = False) -> int:
+        """End offset of heading *i*'s section: the next heading, or with
+        *nested* the next heading at the same or a higher level."""
+        level = self.headings[i][1]
+        for start, other_level, _ in self.headings[i + 1 :]:
+            if not nested or other_level <= level:
+                return start
+        return self.total_length
+
+    def find_heading(self, heading_path: str) -> int | None:
+        """Index of the first heading whose path is *heading_path*, or else
+        ends with it, e.g. ``Methods`` for ``Introduction > Methods``."""
+        paths = self.heading_paths()
+        if heading_path in paths:
+            return paths.index(heading_path)
+        suffix = HEADING_PATH_SEPARATOR + heading_path
+        for i, path in enumerate(paths):
+            if path.endswith(suffix):
+                return i
+        return None
+
+    def _block_end(self, i: int) -> int:
+        if i + 1 < len(self.offsets):
+            return self.offsets[i + 1]
+        return self.total_length
+
+    def slice(
+        self, text: str, offset: int, max_tokens: int, tokenizer: Tokenizer
+    ) -> tuple[int, int]:
+        """Return ``(end, tokens)`` of the largest slice starting at *offset*
+        that fits in *max_tokens*.
+
+        The slice ends on a block boundary, preferring the last section start
+        if that still uses at least half the budget. Only a block that alone
+        exceeds the budget is cut, at the last whitespace that fits.
+        """
+        if offset >= self.total_length:
+            return offset, 0
+
+        i = bisect_right(self.offsets, offset) - 1
+        end = self._block_end(i)
+        if offset == self.offsets[i]:
+            used = self.tokens[i]
+        else:
+            used = tokenizer.count(text[offset:end])
+
+        if used > max_tokens:
+            while used > max_tokens and end - offset > 1:
+                end = offset + max(1, (end - offset) * max_tokens // used)
+                cut = max(
+                    text.rfind(" ", offset + 1, end), text.rfind("\n", offset + 1, end)
+                )
+                if cut > offset:
+                    end = cut + 1
+                used = tokenizer.count(text[offset:end])
+            return end, used
+
+        last_section: tuple[int, int] | None = None
+        j = i + 1
+        while j < len(self.offsets) and used + self.tokens[j] <= max_tokens:
+            if self.sections[j]:
+                last_section = (self.offsets[j], used)
+            used += self.tokens[j]
+            j += 1
+
+        end = self._block_end(j - 1)
+        if j < len(self.offsets) and not self.sections[j] and last_section:
+            section_end, section_used = last_section
+            if section_used * 2 >= max_tokens:
+                return section_end, section_used
+        return end, used
@@ -0,0 +1,42 @@
+import re
+from typing import Protocol
+
+
+class Tokenizer(Protocol):
+    name: str
+
+    def count(self, text: str) -> int: ...
+
+
+class ApproximateTokenizer:
+    """Counts word pieces of up to four characters and punctuation marks.
+
+    Tracks BPE tokenizers closely enough for budgeting without a vocabulary.
+    """
+
+    name = "approximate"
+    _TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+    def count(self, text: str) -> int:
+        return sum(1 for _ in self._TOKEN_RE.finditer(text))
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        import tiktoken
+
+        self.name = f"tiktoken:{encoding}"
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+def create_tokenizer(name: str) -> Tokenizer:
+    if name == ApproximateTokenizer.name:
+        return ApproximateTokenizer()
+    if name == "tiktoken":
+        return TiktokenTokenizer()
+    if name.startswith("tiktoken:"):
+        return TiktokenTokenizer(name.removeprefix("tiktoken:"))
+    raise ValueError(f"Unknown tokenizer: {name}")
@@ -1,12 +1,104 @@
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
-from docfabric.db.tables import metadata
+from docfabric.db.tables import (
+    document_metadata,
+    documents,
+    metadata,
+    metadata_facets,
+)
+
+# Documents read per batch when building the metadata lookup table.
+_BACKFILL_BATCH = 10_000
 
 
 def create_engine(database_url: str) -> AsyncEngine:
     return create_async_engine(database_url)
 
 
+def _add_missing_columns(conn: Connection) -> None:
+    """Add columns introduced after a table was created.
+
+    ``create_all`` only creates missing tables. New columns are nullable or
+    have a server default, so adding them is enough to upgrade in place.
+    """
+    inspector = sa.inspect(conn)
+    for table in metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+            default = column.server_default
+            if default is not None:
+                arg = default.arg
+                if isinstance(arg, str):
+                    arg = "'" + arg.replace("'", "''") + "'"
+                else:
+                    arg = arg.compile(dialect=conn.dialect)
+                ddl += f" DEFAULT {arg}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(sa.text(ddl))
+
+
+def _add_missing_indexes(conn: Connection) -> None:
+    """Create indexes added to tables that already existed."""
+    inspector = sa.inspect(conn)
+    for table in metadata.sorted_tables:
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+
+
+def _index_document_metadata(conn: Connection) -> None:
+    """Fill the metadata lookup table from documents stored before it existed."""
+    query = (
+        sa.select(documents.c.id, documents.c.metadata, documents.c.created_at)
+        .where(documents.c.deleted_at.is_(None))
+        .order_by(documents.c.id)
+        .limit(_BACKFILL_BATCH)
+    )
+    last = None
+    while True:
+        page = query if last is None else query.where(documents.c.id > last)
+        rows = conn.execute(page).all()
+        if not rows:
+            return
+        last = rows[-1].id
+        values = [
+            {"document_id": id, "key": key, "value": value, "created_at": created_at}
+            for id, meta, created_at in rows
+            for key, value in (meta or {}).items()
+        ]
+        if values:
+            conn.execute(document_metadata.insert(), values)
+
+
+def _count_metadata_facets(conn: Connection) -> None:
+    lookup = document_metadata
+    conn.execute(
+        metadata_facets.insert().from_select(
+            ["key", "value", "document_count"],
+            sa.select(lookup.c.key, lookup.c.value, sa.func.count()).group_by(
+                lookup.c.key, lookup.c.value
+            ),
+        )
+    )
+
+
 async def init_db(engine: AsyncEngine) -> None:
     async with engine.begin() as conn:
+        existing = await conn.run_sync(
+            lambda sync_conn: sa.inspect(sync_conn).get_table_names()
+        )
         await conn.run_sync(metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_add_missing_indexes)
+        if "documents" in existing and document_metadata.name not in existing:
+            await conn.run_sync(_index_document_metadata)
+        if "documents" in existing and metadata_facets.name not in existing:
+            await conn.run_sync(_count_metadata_facets)
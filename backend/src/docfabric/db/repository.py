@@ -1,16 +1,155 @@
+import json
+from collections import Counter
+from collections.abc import Mapping, Sequence
 from datetime import UTC, datetime
 from uuid import UUID
 
 import sqlalchemy as sa
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
-from docfabric.db.tables import documents
+from docfabric.db.tables import (
+    changes,
+    document_metadata,
+    documents,
+    metadata_facets,
+    sync_entries,
+    uploads,
+)
+from docfabric.metrics import DB_QUERY_SECONDS, timed
+
+# Ids per UPDATE in a bulk patch, well below SQLite's bound-parameter limit.
+_PATCH_CHUNK = 1000
+
+# Rows not tombstoned by a bulk delete; every read and write is limited to them.
+_LIVE = documents.c.deleted_at.is_(None)
+
+
+def _metadata_rows(id: str, metadata: Mapping[str, str], created_at) -> list[dict]:
+    return [
+        {"document_id": id, "key": key, "value": value, "created_at": created_at}
+        for key, value in metadata.items()
+    ]
+
+
+async def _index_metadata(
+    conn: AsyncConnection, removed_ids: Sequence[str], entries: Sequence[dict]
+) -> None:
+    """Replace lookup rows and adjust the facet counters to match.
+
+    Lookup rows of *removed_ids* are dropped before *entries* are added.
+    """
+    counts: Counter[tuple[str, str]] = Counter()
+    if removed_ids:
+        removed = await conn.execute(
+            document_metadata.delete()
+            .where(document_metadata.c.document_id.in_(removed_ids))
+            .returning(document_metadata.c.key, document_metadata.c.value)
+        )
+        counts.subtract((key, value) for key, value in removed)
+    if entries:
+        await conn.execute(document_metadata.insert(), list(entries))
+        counts.update((e["key"], e["value"]) for e in entries)
+    changes = [
+        {"k": key, "v": value, "delta": delta}
+        for (key, value), delta in counts.items()
+        if delta
+    ]
+    if not changes:
+        return
+    facets = metadata_facets
+    key = sa.bindparam("k", type_=sa.Text)
+    value = sa.bindparam("v", type_=sa.Text)
+    this = (facets.c.key == key, facets.c.value == value)
+    # Portable upsert: create missing counters at zero, then add the deltas.
+    await conn.execute(
+        facets.insert().from_select(
+            ["key", "value", "document_count"],
+            sa.select(key, value, sa.literal(0)).where(~sa.exists().where(*this)),
+        ),
+        changes,
+    )
+    await conn.execute(
+        facets.update()
+        .where(*this)
+        .values(document_count=facets.c.document_count + sa.bindparam("delta")),
+        changes,
+    )
+    await conn.execute(
+        facets.delete().where(*this, facets.c.document_count <= 0), changes
+    )
+
+
+async def _log_changes(
+    conn: AsyncConnection,
+    operation: str,
+    entries: Sequence[tuple[str, str | None]],
+    changed_at: datetime,
+) -> None:
+    """Append one change per ``(document_id, status)`` entry."""
+    if entries:
+        await conn.execute(
+            changes.insert(),
+            [
+                {
+                    "document_id": id,
+                    "operation": operation,
+                    "status": status,
+                    "changed_at": changed_at,
+                }
+                for id, status in entries
+            ],
+        )
+
+
+async def _facet_counts(
+    conn: AsyncConnection, pairs: Mapping[str, str]
+) -> dict[tuple[str, str], int]:
+    """Document count of each key/value pair that any document has."""
+    facets = metadata_facets
+    result = await conn.execute(
+        sa.select(facets.c.key, facets.c.value, facets.c.document_count).where(
+            sa.or_(
+                *(
+                    sa.and_(facets.c.key == key, facets.c.value == value)
+                    for key, value in pairs.items()
+                )
+            )
+        )
+    )
+    return {(key, value): n for key, value, n in result}
+
+
+def _matching(filters: Mapping[str, str]):
+    """Lookup rows of documents matching every filter.
+
+    The first filter is read from the lookup index in ``created_at`` order;
+    each further filter is a primary key probe per candidate.
+    """
+    (key, value), *rest = filters.items()
+    lookup = document_metadata
+    conditions = [lookup.c.key == key, lookup.c.value == value]
+    for i, (key, value) in enumerate(rest):
+        other = document_metadata.alias(f"filter_{i}")
+        conditions.append(
+            sa.exists().where(
+                other.c.document_id == lookup.c.document_id,
+                other.c.key == key,
+                other.c.value == value,
+            )
+        )
+    return lookup, sa.and_(*conditions)
 
 
 class DocumentRepository:
     def __init__(self, engine: AsyncEngine) -> None:
         self._engine = engine
 
+    @timed(DB_QUERY_SECONDS, operation="ping")
+    async def ping(self) -> None:
+        async with self._engine.connect() as conn:
+            await conn.execute(sa.select(1))
+
+    @timed(DB_QUERY_SECONDS, operation="insert")
     async def insert(
         self,
         *,
@@ -20,6 +159,8 @@ class DocumentRepository:
         size_bytes: int,
         metadata: dict[str, str],
         status: str = "ready",
+        conversion_profile: str | None = None,
+        content_sha256: str | None = None,
     ) -> dict:
         now = datetime.now(UTC)
         values = {
@@ -30,40 +171,99 @@ class DocumentRepository:
             "metadata": metadata,
             "status": status,
             "error": None,
+            "conversion_profile": conversion_profile,
+            "content_sha256": content_sha256,
             "created_at": now,
             "updated_at": now,
         }
         async with self._engine.begin() as conn:
             await conn.execute(documents.insert().values(**values))
+            await _index_metadata(conn, [], _metadata_rows(str(id), metadata, now))
+            await _log_changes(conn, "created", [(str(id), status)], now)
         return values
 
+    @timed(DB_QUERY_SECONDS, operation="get")
     async def get(self, id: UUID) -> dict | None:
         async with self._engine.connect() as conn:
             row = (
                 await conn.execute(
-                    documents.select().where(documents.c.id == str(id))
+                    documents.select().where(documents.c.id == str(id), _LIVE)
                 )
             ).first()
         if row is None:
             return None
         return dict(row._mapping)
 
-    async def list(self, *, limit: int = 20, offset: int = 0) -> tuple[list[dict], int]:
-        async with self._engine.connect() as conn:
-            total_row = await conn.execute(
-                sa.select(sa.func.count()).select_from(documents)
-            )
-            total = total_row.scalar_one()
+    @timed(DB_QUERY_SECONDS, operation="list")
+    async def list(
+        self,
+        *,
+        limit: int = 20,
+        offset: int = 0,
+        metadata: Mapping[str, str] | None = None,
+    ) -> tuple[list[dict], int]:
+        """List documents newest first.
 
-            rows = await conn.execute(
-                documents.select()
-                .order_by(documents.c.created_at.desc())
-                .limit(limit)
-                .offset(offset)
-            )
+        With *metadata*, only documents having every one of its key/value
+        pairs are listed. The filter matching the fewest documents drives the
+        lookup; the others are probed per match.
+        """
+        async with self._engine.connect() as conn:
+            if metadata:
+                counts = await _facet_counts(conn, metadata)
+                if len(counts) < len(metadata):
+                    return [], 0
+                filters = dict(sorted(metadata.items(), key=counts.__getitem__))
+                lookup, matches = _matching(filters)
+                if len(filters) == 1:
+                    (total,) = counts.values()
+                else:
+                    count = sa.select(sa.func.count()).select_from(lookup)
+                    total = (await conn.execute(count.where(matches))).scalar_one()
+                page = (
+                    documents.select()
+                    .join(lookup, documents.c.id == lookup.c.document_id)
+                    .where(matches)
+                    .order_by(lookup.c.created_at.desc())
+                )
+            else:
+                count = sa.select(sa.func.count()).where(_LIVE)
+                total = (await conn.execute(count)).scalar_one()
+                page = (
+                    documents.select()
+                    .where(_LIVE)
+                    .order_by(documents.c.created_at.desc())
+                )
+            rows = await conn.execute(page.limit(limit).offset(offset))
             items = [dict(r._mapping) for r in rows]
         return items, total
 
+    @timed(DB_QUERY_SECONDS, operation="facets")
+    async def facets(
+        self, keys: Sequence[str] | None = None
+    ) -> dict[str, dict[str, int]]:
+        """Document count per metadata value, most common first, per key.
+
+        Read from the maintained ``metadata_facets`` counters, so the cost
+        depends on the number of distinct values, not of documents.
+        """
+        facets_table = metadata_facets
+        query = sa.select(
+            facets_table.c.key, facets_table.c.value, facets_table.c.document_count
+        ).order_by(
+            facets_table.c.key,
+            facets_table.c.document_count.desc(),
+            facets_table.c.value,
+        )
+        if keys:
+            query = query.where(facets_table.c.key.in_(keys))
+        facets: dict[str, dict[str, int]] = {}
+        async with self._engine.connect() as conn:
+            for key, value, n in await conn.execute(query):
+                facets.setdefault(key, {})[value] = n
+        return facets
+
+    @timed(DB_QUERY_SECONDS, operation="update")
     async def update(
         self,
         id: UUID,
@@ -72,39 +272,359 @@ class DocumentRepository:
         content_type: str,
         size_bytes: int,
         status: str = "ready",
+        conversion_profile: str | None = None,
+        content_sha256: str | None = None,
     ) -> dict | None:
         now = datetime.now(UTC)
         async with self._engine.begin() as conn:
             result = await conn.execute(
                 documents.update()
-                .where(documents.c.id == str(id))
+                .where(documents.c.id == str(id), _LIVE)
                 .values(
                     filename=filename,
                     content_type=content_type,
                     size_bytes=size_bytes,
                     status=status,
                     error=None,
+                    conversion_profile=conversion_profile,
+                    content_sha256=content_sha256,
                     updated_at=now,
                 )
             )
             if result.rowcount == 0:
                 return None
+            await _log_changes(conn, "updated", [(str(id), status)], now)
         return await self.get(id)
 
+    @timed(DB_QUERY_SECONDS, operation="patch")
+    async def patch(
+        self,
+        ids: Sequence[UUID],
+        *,
+        filename: str | None = None,
+        metadata: dict[str, str | None] | None = None,
+        replace_metadata: bool = False,
+    ) -> Sequence[dict]:
+        """Update filename and metadata in place and return the updated rows.
+
+        Metadata is merged in SQL with ``json_patch`` (a null value removes
+        the key), so rows are never read first. One statement per
+        ``_PATCH_CHUNK`` ids, all in one transaction.
+        """
+        now = datetime.now(UTC)
+        values: dict = {"updated_at": now}
+        if filename is not None:
+            values["filename"] = filename
+        if metadata is not None:
+            values["metadata"] = (
+                metadata
+                if replace_metadata
+                else sa.func.json_patch(
+                    documents.c.metadata, json.dumps(metadata), type_=sa.JSON
+                )
+            )
+        rows = []
+        async with self._engine.begin() as conn:
+            for start in range(0, len(ids), _PATCH_CHUNK):
+                chunk = [str(i) for i in ids[start : start + _PATCH_CHUNK]]
+                result = await conn.execute(
+                    documents.update()
+                    .where(documents.c.id.in_(chunk), _LIVE)
+                    .values(**values)
+                    .returning(*documents.c)
+                )
+                updated = [dict(r._mapping) for r in result]
+                rows.extend(updated)
+                await _log_changes(
+                    conn, "updated", [(r["id"], r["status"]) for r in updated], now
+                )
+                if metadata is not None and updated:
+                    await _index_metadata(
+                        conn,
+                        [r["id"] for r in updated],
+                        [
+                            entry
+                            for r in updated
+                            for entry in _metadata_rows(
+                                r["id"], r["metadata"], r["created_at"]
+                            )
+                        ],
+                    )
+        return rows
+
+    @timed(DB_QUERY_SECONDS, operation="update_status")
     async def update_status(
-        self, id: UUID, *, status: str, error: str | None = None
+        self,
+        id: UUID,
+        *,
+        status: str,
+        error: str | None = None,
+        conversion_profile: str | None = None,
+        content_sha256: str | None = None,
     ) -> None:
         now = datetime.now(UTC)
+        values = {"status": status, "error": error, "updated_at": now}
+        if conversion_profile is not None:
+            values["conversion_profile"] = conversion_profile
+        if content_sha256 is not None:
+            values["content_sha256"] = content_sha256
         async with self._engine.begin() as conn:
-            await conn.execute(
+            result = await conn.execute(
                 documents.update()
-                .where(documents.c.id == str(id))
-                .values(status=status, error=error, updated_at=now)
+                .where(documents.c.id == str(id), _LIVE)
+                .values(**values)
             )
+            if result.rowcount:
+                await _log_changes(conn, "status", [(str(id), status)], now)
+
+    @timed(DB_QUERY_SECONDS, operation="claim_status")
+    async def claim_status(self, id: UUID, *, expected: str, status: str) -> bool:
+        """Set *status* only if the row still has *expected*.
 
+        Of several callers racing to move a document on, exactly one wins.
+        """
+        now = datetime.now(UTC)
+        async with self._engine.begin() as conn:
+            result = await conn.execute(
+                documents.update()
+                .where(
+                    documents.c.id == str(id),
+                    documents.c.status == expected,
+                    _LIVE,
+                )
+                .values(status=status, updated_at=now)
+            )
+            if result.rowcount:
+                await _log_changes(conn, "status", [(str(id), status)], now)
+        return result.rowcount > 0
+
+    @timed(DB_QUERY_SECONDS, operation="list_by_status")
+    async def list_by_status(
+        self, status: str, *, limit: int | None = None
+    ) -> Sequence[dict]:
+        """Documents with *status*, oldest first."""
+        async with self._engine.connect() as conn:
+            result = await conn.execute(
+                documents.select()
+                .where(documents.c.status == status, _LIVE)
+                .order_by(documents.c.created_at)
+                .limit(limit)
+            )
+            return [dict(r._mapping) for r in result]
+
+    @timed(DB_QUERY_SECONDS, operation="scan")
+    async def scan(
+        self, *, after: str | None = None, limit: int = 1000
+    ) -> Sequence[dict]:
+        """The next *limit* documents by id after *after*, for batched passes
+        over the whole table."""
+        query = documents.select().where(_LIVE).order_by(documents.c.id).limit(limit)
+        if after is not None:
+            query = query.where(documents.c.id > after)
+        async with self._engine.connect() as conn:
+            return [dict(r._mapping) for r in await conn.execute(query)]
+
+    @timed(DB_QUERY_SECONDS, operation="known_ids")
+    async def known_ids(self, ids: Sequence[str]) -> set[str]:
+        """Those of *ids* that name a document or an upload session."""
+        found: set[str] = set()
+        async with self._engine.connect() as conn:
+            for start in range(0, len(ids), _PATCH_CHUNK):
+                chunk = ids[start : start + _PATCH_CHUNK]
+                for table in (documents, uploads):
+                    result = await conn.execute(
+                        sa.select(table.c.id).where(table.c.id.in_(chunk))
+                    )
+                    found.update(result.scalars())
+        return found
+
+    @timed(DB_QUERY_SECONDS, operation="delete")
     async def delete(self, id: UUID) -> bool:
         async with self._engine.begin() as conn:
+            await _index_metadata(conn, [str(id)], [])
             result = await conn.execute(
-                documents.delete().where(documents.c.id == str(id))
+                documents.delete().where(documents.c.id == str(id), _LIVE)
             )
+            if result.rowcount:
+                await _log_changes(
+                    conn, "deleted", [(str(id), None)], datetime.now(UTC)
+                )
         return result.rowcount > 0
+
+    @timed(DB_QUERY_SECONDS, operation="tombstone")
+    async def tombstone(
+        self,
+        ids: Sequence[UUID] | None = None,
+        *,
+        metadata: Mapping[str, str] | None = None,
+    ) -> Sequence[str]:
+        """Hide the documents with *ids*, or matching every *metadata* pair,
+        and return the ids of those hidden.
+
+        One UPDATE per ``_PATCH_CHUNK`` ids, or a single one for a filter.
+        Their metadata leaves the lookup table and facet counts in the same
+        transaction; rows and files are left for :meth:`purge`.
+        """
+        now = datetime.now(UTC)
+        if metadata is not None:
+            lookup, matches = _matching(metadata)
+            selections = [
+                documents.c.id.in_(sa.select(lookup.c.document_id).where(matches))
+            ]
+        else:
+            keys = [str(i) for i in dict.fromkeys(ids or ())]
+            selections = [
+                documents.c.id.in_(keys[start : start + _PATCH_CHUNK])
+                for start in range(0, len(keys), _PATCH_CHUNK)
+            ]
+        deleted: list[str] = []
+        async with self._engine.begin() as conn:
+            for selection in selections:
+                result = await conn.execute(
+                    documents.update()
+                    .where(selection, _LIVE)
+                    .values(deleted_at=now)
+                    .returning(documents.c.id)
+                )
+                deleted.extend(result.scalars())
+            for start in range(0, len(deleted), _PATCH_CHUNK):
+                await _index_metadata(conn, deleted[start : start + _PATCH_CHUNK], [])
+            await _log_changes(conn, "deleted", [(id, None) for id in deleted], now)
+        return deleted
+
+    @timed(DB_QUERY_SECONDS, operation="list_tombstoned")
+    async def list_tombstoned(self, *, limit: int = 1000) -> Sequence[str]:
+        """Ids of tombstoned documents, earliest deleted first."""
+        async with self._engine.connect() as conn:
+            result = await conn.execute(
+                sa.select(documents.c.id)
+                .where(documents.c.deleted_at.is_not(None))
+                .order_by(documents.c.deleted_at)
+                .limit(limit)
+            )
+            return result.scalars().all()
+
+    @timed(DB_QUERY_SECONDS, operation="purge")
+    async def purge(self, ids: Sequence[str]) -> None:
+        """Drop the rows of tombstoned documents."""
+        async with self._engine.begin() as conn:
+            for start in range(0, len(ids), _PATCH_CHUNK):
+                await conn.execute(
+                    documents.delete().where(
+                        documents.c.id.in_(ids[start : start + _PATCH_CHUNK]),
+                        documents.c.deleted_at.is_not(None),
+                    )
+                )
+
+    @timed(DB_QUERY_SECONDS, operation="list_changes")
+    async def list_changes(
+        self, *, since: int = 0, limit: int = 1000
+    ) -> tuple[Sequence[dict], int | None, int | None]:
+        """Changes with a sequence number above *since*, oldest first, and the
+        oldest and newest sequence numbers still logged."""
+        async with self._engine.connect() as conn:
+            result = await conn.execute(
+                changes.select()
+                .where(changes.c.seq > since)
+                .order_by(changes.c.seq)
+                .limit(limit)
+            )
+            rows = [dict(r._mapping) for r in result]
+            # Separate subqueries, so each is a single rowid lookup in SQLite.
+            oldest, newest = (
+                await conn.execute(
+                    sa.select(
+                        sa.select(sa.func.min(changes.c.seq)).scalar_subquery(),
+                        sa.select(sa.func.max(changes.c.seq)).scalar_subquery(),
+                    )
+                )
+            ).one()
+        return rows, oldest, newest
+
+    @timed(DB_QUERY_SECONDS, operation="prune_changes")
+    async def prune_changes(self, before: datetime) -> int:
+        """Drop changes logged before *before*, always keeping the newest so
+        that expired cursors can be told apart from an empty log."""
+        newest = sa.select(sa.func.max(changes.c.seq)).scalar_subquery()
+        async with self._engine.begin() as conn:
+            result = await conn.execute(
+                changes.delete().where(
+                    changes.c.changed_at < before, changes.c.seq < newest
+                )
+            )
+        return result.rowcount
+
+    @timed(DB_QUERY_SECONDS, operation="insert_upload")
+    async def insert_upload(
+        self,
+        *,
+        id: UUID,
+        filename: str,
+        content_type: str,
+        size_bytes: int | None,
+        metadata: dict[str, str],
+        profile: str | None = None,
+    ) -> dict:
+        values = {
+            "id": str(id),
+            "filename": filename,
+            "content_type": content_type,
+            "size_bytes": size_bytes,
+            "metadata": metadata,
+            "profile": profile,
+            "created_at": datetime.now(UTC),
+        }
+        async with self._engine.begin() as conn:
+            await conn.execute(uploads.insert().values(**values))
+        return values
+
+    @timed(DB_QUERY_SECONDS, operation="get_upload")
+    async def get_upload(self, id: UUID) -> dict | None:
+        async with self._engine.connect() as conn:
+            row = (
+                await conn.execute(uploads.select().where(uploads.c.id == str(id)))
+            ).first()
+        if row is None:
+            return None
+        return dict(row._mapping)
+
+    @timed(DB_QUERY_SECONDS, operation="list_uploads")
+    async def list_uploads(self, *, created_before: datetime) -> Sequence[str]:
+        async with self._engine.connect() as conn:
+            result = await conn.execute(
+                sa.select(uploads.c.id).where(uploads.c.created_at < created_before)
+            )
+            return list(result.scalars())
+
+    @timed(DB_QUERY_SECONDS, operation="delete_upload")
+    async def delete_upload(self, id: UUID) -> bool:
+        async with self._engine.begin() as conn:
+            result = await conn.execute(uploads.delete().where(uploads.c.id == str(id)))
+        return result.rowcount > 0
+
+    @timed(DB_QUERY_SECONDS, operation="list_sync_entries")
+    async def list_sync_entries(self) -> dict[str, dict]:
+        async with self._engine.connect() as conn:
+            rows = await conn.execute(sync_entries.select())
+            return {r.path: dict(r._mapping) for r in rows}
+
+    @timed(DB_QUERY_SECONDS, operation="write_sync_entries")
+    async def write_sync_entries(
+        self, upserts: Sequence[dict], deletes: Sequence[str]
+    ) -> None:
+        """Apply a batch of manifest changes in one transaction.
+
+        Upserts are a delete plus insert so the batch stays portable across
+        dialects.
+        """
+        paths = [*deletes, *(row["path"] for row in upserts)]
+        async with self._engine.begin() as conn:
+            if paths:
+                await conn.execute(
+                    sync_entries.delete().where(
+                        sync_entries.c.path == sa.bindparam("p")
+                    ),
+                    [{"p": path} for path in paths],
+                )
+            if upserts:
+                await conn.execute(sync_entries.insert(), list(upserts))
@@ -12,6 +12,9 @@ documents = sa.Table(
     sa.Column("metadata", sa.JSON, nullable=False, server_default="{}"),
     sa.Column("status", sa.Text, nullable=False, server_default="ready"),
     sa.Column("error", sa.Text, nullable=True),
+    sa.Column("conversion_profile", sa.Text, nullable=True),
+    # Hex SHA-256 of the markdown file, recorded when it is written.
+    sa.Column("content_sha256", sa.Text, nullable=True),
     sa.Column(
         "created_at",
         sa.DateTime(timezone=True),
@@ -25,4 +28,81 @@ documents = sa.Table(
         server_default=sa.func.now(),
         onupdate=sa.func.now(),
     ),
+    # Set by a bulk delete; the row is hidden until the sweeper purges it.
+    sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+)
+
+sa.Index("ix_documents_created_at", documents.c.created_at)
+sa.Index("ix_documents_deleted_at", documents.c.deleted_at)
+
+# Metadata of each document as one row per key, so filters and facet counts
+# are index lookups instead of JSON parsing. created_at is copied from the
+# document so a filtered listing reads the lookup index in display order.
+document_metadata = sa.Table(
+    "document_metadata",
+    metadata,
+    sa.Column("document_id", sa.Text, primary_key=True),
+    sa.Column("key", sa.Text, primary_key=True),
+    sa.Column("value", sa.Text, nullable=False),
+    sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Index("ix_document_metadata_lookup", "key", "value", "created_at"),
+    # Clustered on the primary key, so probing a further filter reads the
+    # value without a second lookup.
+    sqlite_with_rowid=False,
+)
+
+# Number of documents per metadata key/value, kept current by every write to
+# document_metadata so facet counts never scan it.
+metadata_facets = sa.Table(
+    "metadata_facets",
+    metadata,
+    sa.Column("key", sa.Text, primary_key=True),
+    sa.Column("value", sa.Text, primary_key=True),
+    sa.Column("document_count", sa.Integer, nullable=False),
+)
+
+# Append-only log of document changes, written in the transaction of each
+# change. AUTOINCREMENT keeps sequence numbers increasing and never reused,
+# even after old entries are pruned.
+changes = sa.Table(
+    "changes",
+    metadata,
+    sa.Column("seq", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("document_id", sa.Text, nullable=False),
+    # created, updated, status or deleted
+    sa.Column("operation", sa.Text, nullable=False),
+    # Status after the change; null once deleted.
+    sa.Column("status", sa.Text, nullable=True),
+    sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Index("ix_changes_changed_at", "changed_at"),
+    sqlite_autoincrement=True,
+)
+
+uploads = sa.Table(
+    "uploads",
+    metadata,
+    sa.Column("id", sa.Text, primary_key=True),
+    sa.Column("filename", sa.Text, nullable=False),
+    sa.Column("content_type", sa.Text, nullable=False),
+    sa.Column("size_bytes", sa.Integer, nullable=True),
+    sa.Column("metadata", sa.JSON, nullable=False, server_default="{}"),
+    sa.Column("profile", sa.Text, nullable=True),
+    sa.Column(
+        "created_at",
+        sa.DateTime(timezone=True),
+        nullable=False,
+        server_default=sa.func.now(),
+    ),
+)
+
+# Manifest of the watched folder: what each file looked like when it was last
+# synced and which document it became.
+sync_entries = sa.Table(
+    "sync_entries",
+    metadata,
+    sa.Column("path", sa.Text, primary_key=True),
+    sa.Column("size_bytes", sa.BigInteger, nullable=False),
+    sa.Column("mtime_ns", sa.BigInteger, nullable=False),
+    sa.Column("sha256", sa.Text, nullable=False),
+    sa.Column("document_id", sa.Text, nullable=False),
 )
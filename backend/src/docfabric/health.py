@@ -0,0 +1,97 @@
+"""Readiness checks that let a load balancer shed traffic from busy replicas."""
+
+import asyncio
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from docfabric.db.repository import DocumentRepository
+from docfabric.metrics import EVENT_LOOP_LAG
+from docfabric.service.document import DocumentService
+from docfabric.service.scheduler import ConversionScheduler
+
+
+@dataclass
+class ReadinessLimits:
+    max_queued: int = 50
+    max_backlog_seconds: float = 600.0
+    max_db_latency: float = 0.5
+    min_free_bytes: int = 1024**3
+    max_loop_lag: float = 0.5
+
+
+def _check(value: float | None, limit: float, *, minimum: bool = False) -> dict:
+    if value is None:
+        ok = False
+    else:
+        ok = value >= limit if minimum else value <= limit
+    return {"ok": ok, "value": value, "limit": limit}
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        service: DocumentService,
+        scheduler: ConversionScheduler,
+        repository: DocumentRepository,
+        storage_path: Path,
+        limits: ReadinessLimits | None = None,
+    ) -> None:
+        self._service = service
+        self._scheduler = scheduler
+        self._repo = repository
+        self._storage_path = storage_path
+        self._limits = limits or ReadinessLimits()
+        self.loop_lag = 0.0
+
+    async def readiness(self) -> tuple[bool, dict]:
+        """Return whether to take traffic, with the value of every check."""
+        limits = self._limits
+        try:
+            free_bytes = shutil.disk_usage(self._storage_path).free
+        except OSError:
+            free_bytes = None
+        checks = {
+            "conversion_queue": _check(self._scheduler.queued(), limits.max_queued),
+            "conversion_backlog_seconds": _check(
+                round(self._scheduler.backlog_seconds(), 3),
+                limits.max_backlog_seconds,
+            ),
+            "db_latency_seconds": _check(
+                await self._db_latency(), limits.max_db_latency
+            ),
+            "storage_free_bytes": _check(
+                free_bytes, limits.min_free_bytes, minimum=True
+            ),
+            "event_loop_lag_seconds": _check(
+                round(self.loop_lag, 4), limits.max_loop_lag
+            ),
+        }
+        if self._service.draining:
+            status = "draining"
+        elif all(c["ok"] for c in checks.values()):
+            status = "ok"
+        else:
+            status = "overloaded"
+        return status == "ok", {"status": status, "checks": checks}
+
+    async def run(self, interval: float = 0.5) -> None:
+        """Measure event loop lag every *interval* seconds until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(loop.time() - start - interval, 0.0)
+            EVENT_LOOP_LAG.set(self.loop_lag)
+
+    async def _db_latency(self) -> float | None:
+        """Round-trip time of a trivial query, or None past the limit."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._repo.ping(), self._limits.max_db_latency)
+        except (TimeoutError, SQLAlchemyError, OSError):
+            return None
+        return round(time.perf_counter() - start, 4)
@@ -1,22 +1,33 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from starlette.types import Receive, Scope, Send
 
 from docfabric.api.router import router
 from docfabric.config import Settings
 from docfabric.conversion.converter import MarkdownConverter
+from docfabric.conversion.tokenizer import create_tokenizer
 from docfabric.db.engine import create_engine, init_db
 from docfabric.db.repository import DocumentRepository
+from docfabric.health import HealthMonitor, ReadinessLimits
 from docfabric.mcp.server import create_mcp_server
+from docfabric.metrics import REGISTRY, MetricsMiddleware
 from docfabric.service.document import (
+    ChangesExpiredError,
     DocumentNotFoundError,
     DocumentNotReadyError,
     DocumentService,
+    SectionNotFoundError,
+    UploadConflictError,
+    UploadNotFoundError,
 )
+from docfabric.service.scheduler import ConversionScheduler
+from docfabric.service.sync import FolderSync
 from docfabric.storage import FileStorage
 
 
@@ -33,6 +44,7 @@ def _ensure_session_manager(mcp_instance) -> None:
 
 def create_app() -> FastAPI:
     settings = Settings()
+    REGISTRY.enabled = settings.metrics_enabled
 
     mcp = create_mcp_server(lambda: app.state.document_service)
     _ensure_session_manager(mcp)
@@ -42,23 +54,104 @@ def create_app() -> FastAPI:
         engine = create_engine(settings.database_url)
         await init_db(engine)
         repository = DocumentRepository(engine)
-        storage = FileStorage(settings.storage_path)
-        converter = MarkdownConverter()
+        storage = FileStorage(
+            settings.storage_path,
+            shard_depth=settings.storage_shard_depth,
+            durability=settings.storage_durability,
+        )
+        converter = MarkdownConverter(
+            workers=settings.conversion_workers,
+            split_pages=settings.conversion_split_pages,
+            range_pages=settings.conversion_range_pages,
+            default_profile=settings.conversion_profile,
+        )
+        scheduler = ConversionScheduler(
+            slots=settings.conversion_concurrency,
+            size_weight=settings.conversion_size_weight,
+        )
         app.state.document_service = DocumentService(
-            repository=repository, storage=storage, converter=converter
+            repository=repository,
+            storage=storage,
+            converter=converter,
+            tokenizer=create_tokenizer(settings.tokenizer),
+            scheduler=scheduler,
+            defer_conversion=settings.conversion_policy == "deferred",
+        )
+        app.state.health = HealthMonitor(
+            app.state.document_service,
+            scheduler,
+            repository,
+            settings.storage_path,
+            ReadinessLimits(
+                max_queued=settings.ready_max_queued,
+                max_backlog_seconds=settings.ready_max_backlog_seconds,
+                max_db_latency=settings.ready_max_db_latency,
+                min_free_bytes=settings.ready_min_free_bytes,
+                max_loop_lag=settings.ready_max_loop_lag,
+            ),
         )
+        await app.state.document_service.resume()
+        background = [asyncio.create_task(app.state.health.run())]
+        if settings.sync_path is not None:
+            folder_sync = FolderSync(
+                settings.sync_path, app.state.document_service, repository
+            )
+            background.append(
+                asyncio.create_task(folder_sync.run(settings.sync_interval))
+            )
+        if (
+            settings.conversion_policy == "deferred"
+            and settings.conversion_idle_interval > 0
+        ):
+            background.append(
+                asyncio.create_task(
+                    app.state.document_service.convert_idle(
+                        settings.conversion_idle_interval
+                    )
+                )
+            )
+        background.append(
+            asyncio.create_task(
+                app.state.document_service.run_sweeper(
+                    settings.sweep_interval,
+                    rate=settings.sweep_rate,
+                    changes_retention=settings.changes_retention,
+                    upload_ttl=settings.upload_ttl,
+                )
+            )
+        )
+        if settings.reconcile_interval > 0:
+            background.append(
+                asyncio.create_task(
+                    app.state.document_service.run_reconciler(
+                        settings.reconcile_interval,
+                        grace=settings.reconcile_grace,
+                        rate=settings.reconcile_rate,
+                    )
+                )
+            )
         async with mcp.session_manager.run():
             yield
+        for task in background:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await app.state.document_service.drain(settings.shutdown_drain_timeout)
+        converter.close()
         await engine.dispose()
 
     app = FastAPI(lifespan=lifespan)
 
+    if settings.metrics_enabled:
+        app.add_middleware(MetricsMiddleware)
+    app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_methods=["*"],
         allow_headers=["*"],
         allow_credentials=True,
+        expose_headers=["ETag"],
     )
 
     @app.exception_handler(DocumentNotFoundError)
@@ -80,10 +173,63 @@ def create_app() -> FastAPI:
             content={"detail": detail, "status": exc.status},
         )
 
+    @app.exception_handler(SectionNotFoundError)
+    async def section_not_found_handler(
+        request: Request, exc: SectionNotFoundError
+    ) -> JSONResponse:
+        return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+    @app.exception_handler(ChangesExpiredError)
+    async def changes_expired_handler(
+        request: Request, exc: ChangesExpiredError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=410,
+            content={
+                "detail": str(exc),
+                "oldest_seq": exc.oldest,
+                "last_seq": exc.last_seq,
+            },
+        )
+
+    @app.exception_handler(UploadNotFoundError)
+    async def upload_not_found_handler(
+        request: Request, exc: UploadNotFoundError
+    ) -> JSONResponse:
+        return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+    @app.exception_handler(UploadConflictError)
+    async def upload_conflict_handler(
+        request: Request, exc: UploadConflictError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": str(exc), "offset": exc.offset},
+        )
+
     @app.get("/health")
     async def health():
+        if app.state.document_service.draining:
+            return JSONResponse(status_code=503, content={"status": "draining"})
+        return {"status": "ok"}
+
+    @app.get("/health/live")
+    async def health_live():
         return {"status": "ok"}
 
+    @app.get("/health/ready")
+    async def health_ready():
+        ready, body = await app.state.health.readiness()
+        return JSONResponse(status_code=200 if ready else 503, content=body)
+
+    if settings.metrics_enabled:
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            return PlainTextResponse(
+                REGISTRY.render(), media_type="text/plain; version=0.0.4"
+            )
+
     app.include_router(router, prefix="/api")
 
     async def mcp_asgi_app(scope: Scope, receive: Receive, send: Send) -> None:
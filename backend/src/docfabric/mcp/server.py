@@ -1,10 +1,17 @@
+import re
 from collections.abc import Callable
 from uuid import UUID
 
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.exceptions import ToolError
 
+from docfabric.metrics import MCP_TOOL_SECONDS, timed
 from docfabric.models.document import OutlineMode
-from docfabric.service.document import DocumentNotReadyError, DocumentService
+from docfabric.service.document import (
+    DocumentNotReadyError,
+    DocumentService,
+    SectionNotFoundError,
+)
 
 
 def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
@@ -18,14 +25,19 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
     mcp.settings.streamable_http_path = "/"
 
     @mcp.tool()
-    async def list_documents(limit: int = 20, offset: int = 0) -> dict:
+    @timed(MCP_TOOL_SECONDS, tool="list_documents")
+    async def list_documents(
+        limit: int = 20, offset: int = 0, metadata: dict[str, str] | None = None
+    ) -> dict:
         """List documents with pagination.
 
         Args:
             limit: Maximum number of documents to return (default 20).
             offset: Number of documents to skip (default 0).
+            metadata: Only list documents with all of these metadata
+                      key/value pairs.
         """
-        result = await get_service().list(limit=limit, offset=offset)
+        result = await get_service().list(limit=limit, offset=offset, metadata=metadata)
         return {
             "items": [
                 {"id": str(item.id), "filename": item.filename}
@@ -37,6 +49,7 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
         }
 
     @mcp.tool()
+    @timed(MCP_TOOL_SECONDS, tool="get_document_info")
     async def get_document_info(document_id: str) -> dict:
         """Get full metadata for a single document.
 
@@ -47,10 +60,12 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
         return result.model_dump(mode="json")
 
     @mcp.tool()
+    @timed(MCP_TOOL_SECONDS, tool="read_document_content")
     async def read_document_content(
         document_id: str,
         offset: int | None = None,
         limit: int | None = None,
+        max_tokens: int | None = None,
     ) -> str:
         """Read the markdown content of a document.
 
@@ -58,10 +73,13 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
             document_id: UUID of the document.
             offset: Character offset to start reading from.
             limit: Maximum number of characters to return.
+            max_tokens: Token budget. Returns the largest slice that fits,
+                        ending on a paragraph or section boundary. Continue
+                        reading from the next_offset given in the footer.
         """
         try:
             result = await get_service().get_content(
-                UUID(document_id), offset=offset, limit=limit
+                UUID(document_id), offset=offset, limit=limit, max_tokens=max_tokens
             )
         except DocumentNotReadyError as exc:
             if exc.status == "error":
@@ -75,30 +93,52 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
             )
         text = result.content
         if result.length < result.total_length:
-            text += (
-                f"\n\n---\n[offset={result.offset} length={result.length}"
-                f" total={result.total_length}]"
+            footer = (
+                f"offset={result.offset} length={result.length}"
+                f" total={result.total_length}"
             )
+            if result.tokens is not None:
+                footer += f" tokens={result.tokens} next_offset={result.next_offset}"
+            text += f"\n\n---\n[{footer}]"
         return text
 
     @mcp.tool()
+    @timed(MCP_TOOL_SECONDS, tool="get_document_outline")
     async def get_document_outline(
-        document_id: str, mode: str = "flat"
+        document_id: str,
+        mode: str = "flat",
+        max_depth: int | None = None,
+        subtree: str | None = None,
+        limit: int = 200,
+        offset: int = 0,
     ) -> dict:
         """Get the heading outline of a document.
 
-        Returns all headings with their offset and length so that
+        Returns headings with their offset and length so that
         read_document_content can be called directly with those values
-        to retrieve a specific section.
+        to retrieve a specific section. For long documents, start with
+        max_depth=1 and drill into sections with many children (child_count)
+        using subtree.
 
         Args:
             document_id: UUID of the document.
             mode: 'flat' (default) — each section covers only its own text.
                   'nested' — each section's length includes its sub-headings.
+            max_depth: Only headings this many levels below the top, or
+                       below the subtree root (1 = top level or children).
+            subtree: Heading path of a section; only it and its descendants.
+            limit: Maximum number of sections to return (default 200).
+                   Continue from next_offset if it is set.
+            offset: Number of sections to skip.
         """
         try:
             result = await get_service().get_outline(
-                UUID(document_id), mode=OutlineMode(mode)
+                UUID(document_id),
+                mode=OutlineMode(mode),
+                max_depth=max_depth,
+                subtree=subtree,
+                limit=max(limit, 1),
+                offset=max(offset, 0),
             )
         except DocumentNotReadyError as exc:
             if exc.status == "error":
@@ -110,6 +150,119 @@ def create_mcp_server(get_service: Callable[[], DocumentService]) -> FastMCP:
                 "error": "Document is still being processed. Try again later. "
                 "Use get_document_info to check status."
             }
+        except SectionNotFoundError as exc:
+            return {"error": f"{exc}. Leave out subtree to list the sections."}
         return result.model_dump()
 
+    @mcp.tool()
+    @timed(MCP_TOOL_SECONDS, tool="read_section")
+    async def read_section(
+        document_id: str,
+        heading_path: str | None = None,
+        index: int | None = None,
+        mode: str = "nested",
+        max_tokens: int | None = None,
+    ) -> str:
+        """Read one section of a document by its heading.
+
+        Give either heading_path or index. Saves a get_document_outline call
+        when the heading is already known.
+
+        Args:
+            document_id: UUID of the document.
+            heading_path: Heading path as shown in the outline, e.g.
+                          'Intro > Background'. A trailing part of the path,
+                          such as 'Background', also matches.
+            index: Position of the section in the outline, starting at 0.
+            mode: 'nested' (default) — include sub-headings.
+                  'flat' — stop at the next heading.
+            max_tokens: Token budget. If the section does not fit, continue
+                        with read_document_content from the next_offset
+                        given in the footer.
+        """
+        if (heading_path is None) == (index is None):
+            return "Give exactly one of heading_path or index."
+        try:
+            result = await get_service().read_section(
+                UUID(document_id),
+                heading_path=heading_path,
+                index=index,
+                mode=OutlineMode(mode),
+                max_tokens=max_tokens,
+            )
+        except DocumentNotReadyError as exc:
+            if exc.status == "error":
+                return (
+                    "Document processing failed. Content is not available. "
+                    "Use get_document_info to check the error."
+                )
+            return (
+                "Document is still being processed. Try again later. "
+                "Use get_document_info to check status."
+            )
+        except SectionNotFoundError as exc:
+            return f"{exc}. Use get_document_outline to list the sections."
+        text = result.content
+        if result.next_offset is not None:
+            footer = (
+                f"offset={result.offset} length={result.length}"
+                f" section_length={result.section_length}"
+                f" tokens={result.tokens} next_offset={result.next_offset}"
+            )
+            text += f"\n\n---\n[{footer}]"
+        return text
+
+    @mcp.tool()
+    @timed(MCP_TOOL_SECONDS, tool="grep_documents")
+    async def grep_documents(
+        pattern: str,
+        document_id: str | None = None,
+        metadata: dict[str, str] | None = None,
+        regex: bool = False,
+        ignore_case: bool = False,
+        context: int = 0,
+        limit: int = 20,
+    ) -> dict:
+        """Search document content for an exact term or regular expression.
+
+        Returns matches with document_id, offset, length, line number and
+        heading_path. Pass the offset to read_document_content, or the
+        heading_path to read_section, to read around a match.
+
+        Args:
+            pattern: Text to find; a regular expression if regex is true.
+            document_id: Search only this document.
+            metadata: Otherwise search the ready documents with all of these
+                      metadata key/value pairs (all documents if omitted).
+            regex: Treat pattern as a Python regular expression.
+            ignore_case: Match regardless of case.
+            context: Lines to include before and after each matching line.
+            limit: Maximum number of matches to return (default 20).
+        """
+        if not pattern:
+            raise ToolError("pattern must not be empty")
+        try:
+            result = await get_service().grep(
+                pattern,
+                document_id=UUID(document_id) if document_id else None,
+                metadata=metadata,
+                regex=regex,
+                ignore_case=ignore_case,
+                context=max(0, min(context, 10)),
+                limit=max(1, min(limit, 1000)),
+            )
+        except re.error as exc:
+            return {"error": f"Invalid pattern: {exc}"}
+        except DocumentNotReadyError as exc:
+            if exc.status == "error":
+                return {
+                    "error": "Document processing failed. Content is not available. "
+                    "Use get_document_info to check the error."
+                }
+            return {
+                "error": "Document is still being processed. Try again later. "
+                "Use get_document_info to check status."
+            }
+        return result.model_dump(mode="json")
+
     return mcp
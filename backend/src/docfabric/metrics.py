@@ -0,0 +1,367 @@
+"""In-process metrics rendered in the Prometheus text exposition format."""
+
+import functools
+import inspect
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+_CONVERSION_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+_SIZE_BUCKETS = tuple(4**i * 1024 for i in range(10))
+_RATE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+
+# Content types used as label values; anything else a client sends is
+# recorded as "other" so it cannot grow the registry.
+_CONTENT_TYPE_LABELS = frozenset(
+    {
+        "application/pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "text/html",
+        "text/csv",
+        "text/markdown",
+        "text/x-markdown",
+        "image/png",
+        "image/jpeg",
+        "image/tiff",
+        "image/bmp",
+        "image/webp",
+    }
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> Iterator[tuple[str, tuple, tuple, float]]:
+        """Yield ``(suffix, label names, label values, value)`` per sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, names, values, value in self._samples():
+            labels = _format_labels(names, values)
+            lines.append(f"{self.name}{suffix}{labels} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not REGISTRY.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "_total", self.labelnames, key, value
+
+
+class Gauge(_Metric):
+    """A gauge, either set explicitly or read from a callback at render time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def value(self, **labels: str) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        if self._function is not None:
+            yield "", (), (), self._function()
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", self.labelnames, key, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # Per label set: one count per bucket, then sum and count.
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not REGISTRY.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels: str) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0.0
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                yield "_bucket", names, key + (f"{bound:g}",), count
+            yield "_bucket", names, key + ("+Inf",), state[-1]
+            yield "_sum", self.labelnames, key, state[-2]
+            yield "_count", self.labelnames, key, state[-1]
+
+
+class MetricsMiddleware:
+    """Observe REST request latency, labelled by route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route or scope.get("root_path") or "unmatched",
+                status=str(status),
+            )
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.enabled = True
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def content_type_label(content_type: str) -> str:
+    """Label value for a client-supplied *content_type*."""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type if media_type in _CONTENT_TYPE_LABELS else "other"
+
+
+def timed(histogram: Histogram, **labels: str) -> Callable:
+    """Decorate a sync or async function to observe its duration."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "docfabric_http_request_seconds",
+    "REST request latency by route template.",
+    ("method", "route", "status"),
+)
+CONVERSION_SECONDS = Histogram(
+    "docfabric_conversion_seconds",
+    "Time spent converting an original to markdown.",
+    ("content_type", "profile"),
+    buckets=_CONVERSION_BUCKETS,
+)
+CONVERSION_PAGES_PER_SECOND = Histogram(
+    "docfabric_conversion_pages_per_second",
+    "Conversion throughput per document.",
+    ("content_type", "profile"),
+    buckets=_RATE_BUCKETS,
+)
+CONVERSION_PAGES = Counter(
+    "docfabric_conversion_pages",
+    "Pages converted.",
+    ("content_type", "profile"),
+)
+CONVERSION_PAGES_REUSED = Counter(
+    "docfabric_conversion_pages_reused",
+    "Unchanged pages spliced in from the previous version instead of converted.",
+    ("content_type",),
+)
+CONVERSIONS = Counter(
+    "docfabric_conversions",
+    "Finished conversions by outcome.",
+    ("content_type", "status"),
+)
+CONVERSION_QUEUED = Gauge(
+    "docfabric_conversion_queued",
+    "Conversions waiting for a free conversion slot.",
+)
+CONVERSION_QUEUE_SECONDS = Histogram(
+    "docfabric_conversion_queue_seconds",
+    "Time a conversion waited for a slot.",
+    buckets=_CONVERSION_BUCKETS,
+)
+CONVERSION_TASKS = Gauge(
+    "docfabric_conversion_tasks",
+    "Conversion tasks that have been started and not yet finished.",
+)
+EVENT_LOOP_LAG = Gauge(
+    "docfabric_event_loop_lag_seconds",
+    "How late the event loop last woke a timer.",
+)
+STATUS_WAITERS = Gauge(
+    "docfabric_status_waiters",
+    "Requests long-polling for a document status change.",
+)
+DB_QUERY_SECONDS = Histogram(
+    "docfabric_db_query_seconds",
+    "Database round-trip time by repository operation.",
+    ("operation",),
+)
+STORAGE_SECONDS = Histogram(
+    "docfabric_storage_seconds",
+    "File storage operation time.",
+    ("operation",),
+)
+STORAGE_READ_BYTES = Histogram(
+    "docfabric_storage_read_bytes",
+    "Size of files read from storage.",
+    ("kind",),
+    buckets=_SIZE_BUCKETS,
+)
+STORAGE_WRITE_BYTES = Histogram(
+    "docfabric_storage_write_bytes",
+    "Size of files written to storage.",
+    ("kind",),
+    buckets=_SIZE_BUCKETS,
+)
+MCP_TOOL_SECONDS = Histogram(
+    "docfabric_mcp_tool_seconds",
+    "MCP tool call latency.",
+    ("tool",),
+)
+SYNC_FILES = Counter(
+    "docfabric_sync_files",
+    "Files handled by folder sync, by action.",
+    ("action",),
+)
+RECONCILE_ISSUES = Counter(
+    "docfabric_reconcile_issues",
+    "Inconsistencies between database and storage found by the reconciler.",
+    ("kind",),
+)
@@ -2,15 +2,23 @@ from datetime import datetime
 from enum import Enum
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class DocumentStatus(str, Enum):
+    pending = "pending"
     processing = "processing"
     ready = "ready"
     error = "error"
 
 
+class ConversionProfile(str, Enum):
+    auto = "auto"
+    fast = "fast"
+    balanced = "balanced"
+    accurate = "accurate"
+
+
 class DocumentMetadata(BaseModel):
     id: UUID
     filename: str
@@ -19,6 +27,9 @@ class DocumentMetadata(BaseModel):
     status: DocumentStatus
     metadata: dict[str, str]
     error: str | None = None
+    conversion_profile: ConversionProfile | None = None
+    content_sha256: str | None = None
+    estimated_completion_at: datetime | None = None
     created_at: datetime
     updated_at: datetime
 
@@ -30,11 +41,17 @@ class DocumentList(BaseModel):
     offset: int
 
 
+class MetadataFacets(BaseModel):
+    facets: dict[str, dict[str, int]]
+
+
 class DocumentContent(BaseModel):
     content: str
     total_length: int
     offset: int
     length: int
+    tokens: int | None = None
+    next_offset: int | None = None
 
 
 class OutlineMode(str, Enum):
@@ -48,8 +65,150 @@ class OutlineSection(BaseModel):
     heading_path: str
     offset: int
     length: int
+    # Direct sub-headings, whether or not max_depth lists them.
+    child_count: int = 0
+    # Length including all sub-headings, as in nested mode.
+    subtree_length: int = 0
 
 
 class DocumentOutline(BaseModel):
     sections: list[OutlineSection]
     total_length: int
+    # Sections matching subtree and max_depth, before pagination.
+    total_sections: int = 0
+    next_offset: int | None = None
+
+
+class DocumentSection(BaseModel):
+    index: int
+    level: int
+    title: str
+    heading_path: str
+    content: str
+    offset: int
+    length: int
+    section_length: int
+    tokens: int | None = None
+    # Set when max_tokens cut the section; read on with this offset.
+    next_offset: int | None = None
+
+
+class GrepMatch(BaseModel):
+    document_id: UUID
+    offset: int
+    length: int
+    line: int
+    heading_path: str | None = None
+    text: str
+
+
+class GrepResult(BaseModel):
+    matches: list[GrepMatch]
+    documents_scanned: int
+    # The match limit was reached; later matches were not looked for.
+    truncated: bool = False
+    timed_out: bool = False
+
+
+class MetadataMode(str, Enum):
+    merge = "merge"
+    replace = "replace"
+
+
+class _MetadataPatch(BaseModel):
+    # With ``merge``, a null value removes the key (JSON merge patch).
+    metadata: dict[str, str | None] | None = None
+    metadata_mode: MetadataMode = MetadataMode.merge
+
+    @model_validator(mode="after")
+    def _no_nulls_on_replace(self):
+        if (
+            self.metadata_mode is MetadataMode.replace
+            and self.metadata
+            and None in self.metadata.values()
+        ):
+            raise ValueError("null metadata values require metadata_mode=merge")
+        return self
+
+
+def _plain_filename(value: str | None) -> str | None:
+    if value is not None and ("/" in value or "\\" in value or value in {".", ".."}):
+        raise ValueError("filename must not contain path separators")
+    return value
+
+
+class DocumentPatch(_MetadataPatch):
+    filename: str | None = Field(default=None, min_length=1, max_length=255)
+
+    _check_filename = field_validator("filename")(_plain_filename)
+
+
+class BulkDocumentPatch(_MetadataPatch):
+    ids: list[UUID] = Field(min_length=1, max_length=10_000)
+    metadata: dict[str, str | None]
+
+
+class BulkPatchResult(BaseModel):
+    updated: int
+    not_found: list[UUID]
+
+
+class BulkDocumentDelete(BaseModel):
+    # Exactly one of: the documents to delete, or metadata they all have.
+    ids: list[UUID] | None = Field(default=None, min_length=1, max_length=10_000)
+    metadata: dict[str, str] | None = Field(default=None, min_length=1)
+
+    @model_validator(mode="after")
+    def _one_selector(self):
+        if (self.ids is None) == (self.metadata is None):
+            raise ValueError("give either ids or metadata")
+        return self
+
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+    not_found: list[UUID]
+
+
+class UploadCreate(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str = "application/octet-stream"
+    size_bytes: int | None = Field(default=None, ge=0)
+    metadata: dict[str, str] = {}
+    profile: ConversionProfile | None = None
+
+    _check_filename = field_validator("filename")(_plain_filename)
+
+
+class UploadSession(BaseModel):
+    id: UUID
+    filename: str
+    content_type: str
+    size_bytes: int | None
+    offset: int
+    metadata: dict[str, str]
+    profile: ConversionProfile | None = None
+    created_at: datetime
+
+
+class ChangeOperation(str, Enum):
+    created = "created"
+    updated = "updated"
+    status = "status"
+    deleted = "deleted"
+
+
+class DocumentChange(BaseModel):
+    seq: int
+    document_id: UUID
+    operation: ChangeOperation
+    status: DocumentStatus | None = None
+    changed_at: datetime
+
+
+class ChangeList(BaseModel):
+    changes: list[DocumentChange]
+    # Pass as ``since`` to read on; equal to ``since`` when nothing is new.
+    next_since: int
+    # Newest sequence number when the page was read.
+    last_seq: int
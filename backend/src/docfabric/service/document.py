@@ -1,25 +1,74 @@
 import asyncio
-import re
+import bisect
+import hashlib
+import logging
+import time
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 from uuid import UUID, uuid4
 
-from docfabric.conversion.converter import MarkdownConverter
+from docfabric.conversion.converter import (
+    PAGE_SEPARATOR,
+    MarkdownConverter,
+    PageFragment,
+    estimate_pages,
+)
+from docfabric.conversion.index import HEADING_PATH_SEPARATOR, MarkdownIndex
+from docfabric.conversion.tokenizer import ApproximateTokenizer, Tokenizer
 from docfabric.db.repository import DocumentRepository
+from docfabric.metrics import (
+    CONVERSION_PAGES,
+    CONVERSION_PAGES_PER_SECOND,
+    CONVERSION_PAGES_REUSED,
+    CONVERSION_QUEUE_SECONDS,
+    CONVERSION_QUEUED,
+    CONVERSION_SECONDS,
+    CONVERSION_TASKS,
+    CONVERSIONS,
+    RECONCILE_ISSUES,
+    STATUS_WAITERS,
+    content_type_label,
+)
 from docfabric.models.document import (
+    BulkDeleteResult,
+    BulkPatchResult,
+    ChangeList,
+    ConversionProfile,
+    DocumentChange,
     DocumentContent,
     DocumentList,
     DocumentMetadata,
     DocumentOutline,
+    DocumentSection,
     DocumentStatus,
+    GrepMatch,
+    GrepResult,
+    MetadataFacets,
+    MetadataMode,
     OutlineMode,
     OutlineSection,
+    UploadSession,
 )
+from docfabric.service.events import StatusEvents
+from docfabric.service.grep import GrepHit, compile_pattern, scan
+from docfabric.service.scheduler import ConversionJob, ConversionScheduler
 from docfabric.storage import FileStorage
 
-_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$", re.MULTILINE)
+logger = logging.getLogger(__name__)
 
 _NO_CONVERSION_TYPES = frozenset({"text/markdown", "text/x-markdown"})
 _NO_CONVERSION_EXTENSIONS = frozenset({".md", ".markdown"})
+# Documents fetched per listing query when grepping a filtered set.
+_GREP_PAGE = 500
 
 
 class DocumentNotFoundError(Exception):
@@ -35,10 +84,71 @@ class DocumentNotReadyError(Exception):
         super().__init__(f"Document {document_id} is not ready (status={status})")
 
 
+class SectionNotFoundError(Exception):
+    def __init__(self, document_id: UUID, section: str | int) -> None:
+        self.document_id = document_id
+        self.section = section
+        super().__init__(f"Section {section!r} not found in document {document_id}")
+
+
+class ChangesExpiredError(Exception):
+    """Changes after a cursor have been pruned from the change log."""
+
+    def __init__(self, since: int, oldest: int, last_seq: int) -> None:
+        self.since = since
+        self.oldest = oldest
+        self.last_seq = last_seq
+        super().__init__(
+            f"Changes after {since} have been pruned; the log starts at {oldest}"
+        )
+
+
+class UploadNotFoundError(Exception):
+    def __init__(self, upload_id: UUID) -> None:
+        self.upload_id = upload_id
+        super().__init__(f"Upload {upload_id} not found")
+
+
+class UploadConflictError(Exception):
+    """A chunk or completion request does not match the committed offset."""
+
+    def __init__(self, upload_id: UUID, offset: int, message: str) -> None:
+        self.upload_id = upload_id
+        self.offset = offset
+        super().__init__(message)
+
+
+@dataclass
+class StorageReport:
+    checked: int = 0
+    torn: list[UUID] = field(default_factory=list)
+    repaired: int = 0
+    # Ready documents written before hashes were recorded, hashed now.
+    hashed: int = 0
+    temp_files_removed: int = 0
+
+
+@dataclass
+class ReconcileReport:
+    rows_checked: int = 0
+    entries_checked: int = 0
+    # Stored files of documents that have no row.
+    orphans: list[UUID] = field(default_factory=list)
+    # Rows whose original, or markdown while ready, is missing.
+    missing: list[UUID] = field(default_factory=list)
+    # Rows left ``processing`` with no conversion running.
+    stuck: list[UUID] = field(default_factory=list)
+    repaired: int = 0
+
+
 def _row_to_metadata(row: dict) -> DocumentMetadata:
     return DocumentMetadata.model_validate(row)
 
 
+def _row_to_upload(row: dict, offset: int) -> UploadSession:
+    return UploadSession.model_validate({**row, "offset": offset})
+
+
 def _needs_conversion(filename: str, content_type: str) -> bool:
     if content_type in _NO_CONVERSION_TYPES:
         return False
@@ -47,17 +157,53 @@ def _needs_conversion(filename: str, content_type: str) -> bool:
     return True
 
 
+async def _throttle(started: float, count: int, rate: float | None) -> None:
+    """Sleep so that *count* items since *started* take 1 / *rate* s each."""
+    if rate:
+        await asyncio.sleep(max(started + count / rate - time.monotonic(), 0.0))
+
+
+async def _one(document_id: UUID) -> AsyncIterator[UUID]:
+    yield document_id
+
+
+async def _windows(ids: AsyncIterator[UUID], size: int) -> AsyncIterator[list[UUID]]:
+    window = []
+    async for doc_id in ids:
+        window.append(doc_id)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
 class DocumentService:
     def __init__(
         self,
         repository: DocumentRepository,
         storage: FileStorage,
         converter: MarkdownConverter,
+        tokenizer: Tokenizer | None = None,
+        scheduler: ConversionScheduler | None = None,
+        defer_conversion: bool = False,
     ) -> None:
         self._repo = repository
         self._storage = storage
         self._converter = converter
+        self._tokenizer = tokenizer or ApproximateTokenizer()
+        self._scheduler = scheduler or ConversionScheduler()
+        # Deferred documents stay ``pending`` until first read or idle time.
+        self._defer_conversion = defer_conversion
+        self.draining = False
         self._tasks: dict[UUID, asyncio.Task] = {}
+        self._events = StatusEvents()
+        self._upload_locks: dict[UUID, asyncio.Lock] = {}
+        # Set by a bulk delete so the sweeper need not wait out its interval.
+        self._tombstoned = asyncio.Event()
+        CONVERSION_TASKS.set_function(lambda: len(self._tasks))
+        STATUS_WAITERS.set_function(self._events.waiting)
+        CONVERSION_QUEUED.set_function(self._scheduler.queued)
 
     async def create(
         self,
@@ -66,46 +212,66 @@ class DocumentService:
         content_type: str,
         data: bytes,
         metadata: dict[str, str] | None = None,
+        profile: ConversionProfile | None = None,
     ) -> DocumentMetadata:
         doc_id = uuid4()
-        meta = metadata or {}
-
-        original_path = self._storage.save_original(doc_id, filename, data)
-
-        if _needs_conversion(filename, content_type):
-            status = "processing"
-        else:
-            self._storage.save_markdown(doc_id, data.decode("utf-8"))
-            status = "ready"
-
-        row = await self._repo.insert(
-            id=doc_id,
+        original_path = await asyncio.to_thread(
+            self._storage.save_original, doc_id, filename, data
+        )
+        return await self._create_from_original(
+            doc_id,
             filename=filename,
             content_type=content_type,
+            original_path=original_path,
             size_bytes=len(data),
-            metadata=meta,
-            status=status,
+            metadata=metadata or {},
+            profile=profile,
         )
 
-        if status == "processing":
-            self._start_processing(doc_id, original_path)
-
-        return _row_to_metadata(row)
-
     async def get(self, document_id: UUID) -> DocumentMetadata:
         row = await self._repo.get(document_id)
         if row is None:
             raise DocumentNotFoundError(document_id)
-        return _row_to_metadata(row)
-
-    async def list(self, *, limit: int = 20, offset: int = 0) -> DocumentList:
-        items, total = await self._repo.list(limit=limit, offset=offset)
-        return DocumentList(
-            items=[_row_to_metadata(r) for r in items],
-            total=total,
-            limit=limit,
-            offset=offset,
+        return self._to_metadata(row)
+
+    async def wait_for_status(
+        self, document_id: UUID, *, timeout: float
+    ) -> DocumentMetadata:
+        """Return the document once it has left ``processing``, or as it is
+        when *timeout* seconds pass.
+
+        The wait is fed by conversion events, not by polling the database.
+        """
+        with self._events.subscribe(document_id) as changed:
+            doc = await self.get(document_id)
+            if doc.status != DocumentStatus.processing:
+                return doc
+            try:
+                await asyncio.wait_for(changed, timeout)
+            except TimeoutError:
+                return doc
+        return await self.get(document_id)
+
+    async def list(
+        self,
+        *,
+        limit: int = 20,
+        offset: int = 0,
+        metadata: dict[str, str] | None = None,
+    ) -> DocumentList:
+        items, total = await self._repo.list(
+            limit=limit, offset=offset, metadata=metadata
         )
+        # One validation call for the page instead of one per row.
+        result = DocumentList.model_validate(
+            {"items": items, "total": total, "limit": limit, "offset": offset}
+        )
+        for doc in result.items:
+            self._add_estimate(doc)
+        return result
+
+    async def facets(self, keys: Sequence[str] | None = None) -> MetadataFacets:
+        return MetadataFacets(facets=await self._repo.facets(keys))
 
     async def update(
         self,
@@ -114,6 +280,7 @@ class DocumentService:
         filename: str,
         content_type: str,
         data: bytes,
+        profile: ConversionProfile | None = None,
     ) -> DocumentMetadata:
         existing = await self._repo.get(document_id)
         if existing is None:
@@ -123,14 +290,23 @@ class DocumentService:
         if old_task and not old_task.done():
             old_task.cancel()
 
+        # Pages that did not change are spliced back instead of reconverted.
+        previous_pages = self._storage.read_page_fragments(document_id)
         self._storage.delete(document_id)
-        original_path = self._storage.save_original(document_id, filename, data)
+        original_path = await asyncio.to_thread(
+            self._storage.save_original, document_id, filename, data
+        )
 
-        if _needs_conversion(filename, content_type):
-            status = "processing"
-        else:
-            self._storage.save_markdown(document_id, data.decode("utf-8"))
+        content_sha256 = None
+        if not _needs_conversion(filename, content_type):
+            content_sha256 = await self._save_markdown(
+                document_id, data.decode("utf-8")
+            )
             status = "ready"
+        elif self._defer_conversion and existing["status"] == "pending":
+            status = "pending"
+        else:
+            status = "processing"
 
         row = await self._repo.update(
             document_id,
@@ -138,12 +314,53 @@ class DocumentService:
             content_type=content_type,
             size_bytes=len(data),
             status=status,
+            conversion_profile=profile.value if profile else None,
+            content_sha256=content_sha256,
         )
 
         if status == "processing":
-            self._start_processing(document_id, original_path)
+            await self._start_processing(
+                document_id, original_path, content_type, profile, previous_pages
+            )
 
-        return _row_to_metadata(row)
+        return self._to_metadata(row)
+
+    async def patch(
+        self,
+        document_id: UUID,
+        *,
+        filename: str | None = None,
+        metadata: dict[str, str | None] | None = None,
+        metadata_mode: MetadataMode = MetadataMode.merge,
+    ) -> DocumentMetadata:
+        """Change filename or metadata without touching storage or conversion."""
+        rows = await self._repo.patch(
+            [document_id],
+            filename=filename,
+            metadata=metadata,
+            replace_metadata=metadata_mode is MetadataMode.replace,
+        )
+        if not rows:
+            raise DocumentNotFoundError(document_id)
+        return self._to_metadata(rows[0])
+
+    async def patch_many(
+        self,
+        document_ids: Sequence[UUID],
+        *,
+        metadata: dict[str, str | None],
+        metadata_mode: MetadataMode = MetadataMode.merge,
+    ) -> BulkPatchResult:
+        rows = await self._repo.patch(
+            document_ids,
+            metadata=metadata,
+            replace_metadata=metadata_mode is MetadataMode.replace,
+        )
+        found = {row["id"] for row in rows}
+        return BulkPatchResult(
+            updated=len(rows),
+            not_found=[i for i in dict.fromkeys(document_ids) if str(i) not in found],
+        )
 
     async def delete(self, document_id: UUID) -> None:
         old_task = self._tasks.pop(document_id, None)
@@ -153,7 +370,84 @@ class DocumentService:
         existed = await self._repo.delete(document_id)
         if not existed:
             raise DocumentNotFoundError(document_id)
-        self._storage.delete(document_id)
+        await asyncio.to_thread(self._storage.delete, document_id)
+        self._events.publish(document_id, "deleted")
+
+    async def delete_many(
+        self,
+        document_ids: Sequence[UUID] | None = None,
+        *,
+        metadata: dict[str, str] | None = None,
+    ) -> BulkDeleteResult:
+        """Tombstone documents by id or metadata filter.
+
+        They disappear from every read at once; their rows and files are
+        removed later by :meth:`sweep`.
+        """
+        deleted = await self._repo.tombstone(document_ids, metadata=metadata)
+        for doc_id in map(UUID, deleted):
+            task = self._tasks.pop(doc_id, None)
+            if task and not task.done():
+                task.cancel()
+            self._events.publish(doc_id, "deleted")
+        if deleted:
+            self._tombstoned.set()
+        found = set(deleted)
+        return BulkDeleteResult(
+            deleted=len(deleted),
+            not_found=[
+                i for i in dict.fromkeys(document_ids or ()) if str(i) not in found
+            ],
+        )
+
+    async def sweep(self, *, rate: float | None = None, batch_size: int = 100) -> int:
+        """Remove the files and rows of tombstoned documents.
+
+        At most *rate* documents per second; returns the number removed.
+        """
+        removed = 0
+        while True:
+            started = time.monotonic()
+            ids = await self._repo.list_tombstoned(limit=batch_size)
+            if not ids:
+                return removed
+            await asyncio.to_thread(self._delete_files, ids)
+            await self._repo.purge(ids)
+            removed += len(ids)
+            await _throttle(started, len(ids), rate)
+
+    async def run_sweeper(
+        self,
+        interval: float,
+        *,
+        rate: float | None = None,
+        changes_retention: float | None = None,
+        upload_ttl: float | None = None,
+    ) -> None:
+        """Sweep after every bulk delete, and every *interval* seconds, until
+        cancelled.
+
+        Each pass also prunes changes older than *changes_retention* seconds
+        and upload sessions idle for *upload_ttl* seconds.
+        """
+        while True:
+            try:
+                await self.sweep(rate=rate)
+                if changes_retention:
+                    await self._repo.prune_changes(
+                        datetime.now(UTC) - timedelta(seconds=changes_retention)
+                    )
+                if upload_ttl:
+                    await self.expire_uploads(upload_ttl)
+            except Exception:
+                logger.exception("Sweeping deleted documents failed")
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._tombstoned.wait(), interval)
+            self._tombstoned.clear()
+
+    def _delete_files(self, ids: Sequence[str]) -> None:
+        for doc_id in ids:
+            self._storage.delete(UUID(doc_id))
 
     async def get_content(
         self,
@@ -161,97 +455,930 @@ class DocumentService:
         *,
         offset: int | None = None,
         limit: int | None = None,
+        max_tokens: int | None = None,
     ) -> DocumentContent:
-        doc = await self.get(document_id)
-        if doc.status != DocumentStatus.ready:
-            raise DocumentNotReadyError(document_id, doc.status.value)
+        await self._require_ready(document_id)
 
         full = self._storage.read_markdown(document_id)
         total_length = len(full)
 
         start = offset or 0
-        if limit is not None:
+        tokens = None
+        if max_tokens is not None:
+            index = await self._load_index(document_id, full)
+            end, tokens = index.slice(full, start, max_tokens, self._tokenizer)
+            if limit is not None and end > start + limit:
+                end = start + limit
+                tokens = self._tokenizer.count(full[start:end])
+        elif limit is not None:
             end = start + limit
         else:
             end = total_length
 
         sliced = full[start:end]
+        next_offset = start + len(sliced)
         return DocumentContent(
             content=sliced,
             total_length=total_length,
             offset=start,
             length=len(sliced),
+            tokens=tokens,
+            next_offset=next_offset if next_offset < total_length else None,
+        )
+
+    async def list_changes(self, *, since: int = 0, limit: int = 1000) -> ChangeList:
+        """Changes with a sequence number above *since*, oldest first.
+
+        Raises :class:`ChangesExpiredError` if some of them have been pruned.
+        """
+        rows, oldest, newest = await self._repo.list_changes(since=since, limit=limit)
+        if oldest is not None and since < oldest - 1:
+            raise ChangesExpiredError(since, oldest, newest)
+        return ChangeList.model_validate(
+            {
+                "changes": rows,
+                "next_since": rows[-1]["seq"] if rows else since,
+                "last_seq": newest or 0,
+            }
         )
 
+    async def stream_changes(
+        self, *, since: int = 0, batch_size: int = 1000
+    ) -> AsyncIterator[DocumentChange]:
+        """Iterate over every change after *since* until caught up.
+
+        The first batch is read here, so an expired cursor raises before
+        anything is streamed.
+        """
+        first = await self.list_changes(since=since, limit=batch_size)
+        return self._follow_changes(first, batch_size)
+
+    async def _follow_changes(
+        self, page: ChangeList, batch_size: int
+    ) -> AsyncIterator[DocumentChange]:
+        while True:
+            for change in page.changes:
+                yield change
+            if len(page.changes) < batch_size:
+                return
+            page = await self.list_changes(since=page.next_since, limit=batch_size)
+
+    async def stream_content(
+        self,
+        document_id: UUID,
+        *,
+        offset: int | None = None,
+        limit: int | None = None,
+    ) -> Iterator[str]:
+        await self._require_ready(document_id)
+        return self._storage.iter_markdown(document_id, offset=offset or 0, limit=limit)
+
     async def get_outline(
         self,
         document_id: UUID,
         *,
         mode: OutlineMode = OutlineMode.flat,
+        max_depth: int | None = None,
+        subtree: str | None = None,
+        limit: int | None = None,
+        offset: int = 0,
     ) -> DocumentOutline:
-        doc = await self.get(document_id)
-        if doc.status != DocumentStatus.ready:
-            raise DocumentNotReadyError(document_id, doc.status.value)
+        """Return the document's headings in order.
 
-        text = self._storage.read_markdown(document_id)
-        total = len(text)
+        *subtree* keeps one section, found like a heading path in
+        :meth:`read_section`, and its descendants. *max_depth* keeps headings
+        at most that many levels below the top, or below the subtree root.
+        *limit* and *offset* page through what is left.
+        """
+        await self._require_ready(document_id)
 
-        headings = [
-            (m.start(), len(m.group(1)), m.group(2).strip())
-            for m in _HEADING_RE.finditer(text)
-        ]
+        # Headings come from the persisted index; the markdown is only read
+        # if the index has to be rebuilt.
+        index = await self._load_index(document_id)
+        headings = index.headings
+        parents, ends = index.tree()
+        depths: list[int] = []
+        children = [0] * len(headings)
+        for parent in parents:
+            depths.append(1 if parent is None else depths[parent] + 1)
+            if parent is not None:
+                children[parent] += 1
+
+        selected = range(len(headings))
+        top = 0
+        if subtree is not None:
+            root = index.find_heading(subtree)
+            if root is None:
+                raise SectionNotFoundError(document_id, subtree)
+            stop = bisect.bisect_left(headings, ends[root], key=lambda h: h[0])
+            selected = range(root, stop)
+            top = depths[root]
+        if max_depth is not None:
+            selected = [i for i in selected if depths[i] - top <= max_depth]
+        total = len(selected)
+        page = selected[offset : None if limit is None else offset + limit]
 
         sections = []
-        path_stack: list[tuple[int, str]] = []
-        for i, (start, level, title) in enumerate(headings):
-            path_stack = [(l, t) for l, t in path_stack if l < level]
-            path_stack.append((level, title))
-            heading_path = " > ".join(t for _, t in path_stack)
-
-            if mode is OutlineMode.nested:
-                end = total
-                for future_start, future_level, _ in headings[i + 1 :]:
-                    if future_level <= level:
-                        end = future_start
-                        break
-            else:
-                if i + 1 < len(headings):
-                    end = headings[i + 1][0]
-                else:
-                    end = total
+        for i in page:
+            start, level, title = headings[i]
+            titles = [title]
+            parent = parents[i]
+            while parent is not None:
+                titles.append(headings[parent][2])
+                parent = parents[parent]
+            end = ends[i]
+            if mode is OutlineMode.flat and i + 1 < len(headings):
+                end = headings[i + 1][0]
             sections.append(
                 OutlineSection(
-                    level=level, title=title, heading_path=heading_path,
-                    offset=start, length=end - start,
+                    level=level,
+                    title=title,
+                    heading_path=HEADING_PATH_SEPARATOR.join(reversed(titles)),
+                    offset=start,
+                    length=end - start,
+                    child_count=children[i],
+                    subtree_length=ends[i] - start,
                 )
             )
+        next_offset = offset + len(sections)
+        return DocumentOutline(
+            sections=sections,
+            total_length=index.total_length,
+            total_sections=total,
+            next_offset=next_offset if next_offset < total else None,
+        )
+
+    async def read_section(
+        self,
+        document_id: UUID,
+        *,
+        heading_path: str | None = None,
+        index: int | None = None,
+        mode: OutlineMode = OutlineMode.nested,
+        max_tokens: int | None = None,
+    ) -> DocumentSection:
+        """Return one section, found by heading path or outline position.
 
-        return DocumentOutline(sections=sections, total_length=total)
+        A *heading_path* matches the full path, or failing that the end of
+        one. With *max_tokens* the section is cut on a block boundary and
+        ``next_offset`` says where :meth:`get_content` can read on.
+        """
+        await self._require_ready(document_id)
+
+        text = self._storage.read_markdown(document_id)
+        md_index = await self._load_index(document_id, text)
+        if heading_path is not None:
+            i = md_index.find_heading(heading_path)
+        elif index is not None and 0 <= index < len(md_index.headings):
+            i = index
+        else:
+            i = None
+        if i is None:
+            raise SectionNotFoundError(
+                document_id, heading_path if heading_path is not None else index
+            )
+
+        start, level, title = md_index.headings[i]
+        section_end = md_index.section_end(i, nested=mode is OutlineMode.nested)
+        end, tokens = section_end, None
+        if max_tokens is not None:
+            end, tokens = md_index.slice(text, start, max_tokens, self._tokenizer)
+            if end > section_end:
+                end = section_end
+                tokens = self._tokenizer.count(text[start:end])
+        return DocumentSection(
+            index=i,
+            level=level,
+            title=title,
+            heading_path=md_index.heading_paths()[i],
+            content=text[start:end],
+            offset=start,
+            length=end - start,
+            section_length=section_end - start,
+            tokens=tokens,
+            next_offset=end if end < section_end else None,
+        )
+
+    async def grep(
+        self,
+        pattern: str,
+        *,
+        document_id: UUID | None = None,
+        metadata: Mapping[str, str] | None = None,
+        regex: bool = False,
+        ignore_case: bool = False,
+        context: int = 0,
+        limit: int = 100,
+        timeout: float = 10.0,
+        workers: int = 4,
+    ) -> GrepResult:
+        """Find *pattern* in one document, or in every ready document matching
+        *metadata*, newest first.
+
+        Files are memory-mapped and scanned *workers* at a time in threads.
+        The scan stops at *limit* matches or after *timeout* seconds.
+        Raises :class:`re.error` for an invalid regular expression.
+        """
+        compiled = compile_pattern(pattern, regex=regex, ignore_case=ignore_case)
+        deadline = time.monotonic() + timeout
+        if document_id is not None:
+            await self._require_ready(document_id)
+            candidates = _one(document_id)
+        else:
+            candidates = self._ready_ids(metadata)
+
+        result = GrepResult(matches=[], documents_scanned=0)
+        async for window in _windows(candidates, workers):
+            if time.monotonic() > deadline:
+                result.timed_out = True
+                break
+            remaining = limit - len(result.matches)
+            scans = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        self._grep_file, doc_id, compiled, remaining, deadline, context
+                    )
+                    for doc_id in window
+                )
+            )
+            for doc_id, (hits, timed_out) in zip(window, scans):
+                result.documents_scanned += 1
+                result.timed_out |= timed_out
+                hits = hits[: limit - len(result.matches)]
+                if hits:
+                    result.matches.extend(await self._grep_matches(doc_id, hits))
+            if len(result.matches) >= limit:
+                result.truncated = True
+                break
+            if result.timed_out:
+                break
+        return result
+
+    def _grep_file(
+        self,
+        doc_id: UUID,
+        pattern,
+        limit: int,
+        deadline: float,
+        context: int,
+    ) -> tuple[Sequence[GrepHit], bool]:
+        try:
+            with self._storage.map_markdown(doc_id) as data:
+                return scan(
+                    data, pattern, limit=limit, deadline=deadline, context=context
+                )
+        except FileNotFoundError:
+            # Deleted or being repaired since it was listed.
+            return [], False
+
+    async def _grep_matches(
+        self, doc_id: UUID, hits: Sequence[GrepHit]
+    ) -> Sequence[GrepMatch]:
+        index = await self._load_index(doc_id)
+        matches = []
+        for hit in hits:
+            i = index.heading_at(hit.offset)
+            matches.append(
+                GrepMatch(
+                    document_id=doc_id,
+                    offset=hit.offset,
+                    length=hit.length,
+                    line=hit.line,
+                    heading_path=index.heading_path(i) if i is not None else None,
+                    text=hit.text,
+                )
+            )
+        return matches
+
+    async def _ready_ids(
+        self, metadata: Mapping[str, str] | None
+    ) -> AsyncIterator[UUID]:
+        offset = 0
+        while True:
+            rows, _ = await self._repo.list(
+                limit=_GREP_PAGE, offset=offset, metadata=metadata
+            )
+            for row in rows:
+                if row["status"] == DocumentStatus.ready.value:
+                    yield UUID(row["id"])
+            if len(rows) < _GREP_PAGE:
+                return
+            offset += len(rows)
 
     def get_original(self, document_id: UUID, filename: str) -> bytes:
         return self._storage.read_original(document_id, filename)
 
-    def _start_processing(self, doc_id: UUID, original_path: Path) -> None:
+    async def convert_idle(self, interval: float) -> None:
+        """Convert pending documents, oldest first, while slots are idle.
+
+        Looks for new pending documents every *interval* seconds once none
+        are left, or after an error. Runs until cancelled.
+        """
+        while True:
+            await self._scheduler.wait_idle()
+            try:
+                rows = await self._repo.list_by_status("pending", limit=1)
+                if rows:
+                    await self._convert_pending(rows[0], urgent=False)
+                    continue
+            except Exception:
+                logger.exception("Converting pending documents failed")
+            await asyncio.sleep(interval)
+
+    async def resume(self) -> int:
+        """Restart conversions left ``processing`` by a previous run.
+
+        Returns how many were restarted. A document whose original is gone is
+        marked ``error``, and one that fails to restart is logged and skipped,
+        so a single bad row does not stop the server from starting.
+        """
+        rows = await self._repo.list_by_status("processing")
+        resumed = 0
+        for row in rows:
+            doc_id = UUID(row["id"])
+            original_path = self._storage.original_path(doc_id, row["filename"])
+            try:
+                if not await asyncio.to_thread(original_path.is_file):
+                    logger.warning("Original of %s is missing; not resuming", doc_id)
+                    await self._repo.update_status(
+                        doc_id, status="error", error="Original file is missing"
+                    )
+                    self._events.publish(doc_id, "error")
+                    continue
+                await self._convert_row(row)
+            except Exception:
+                logger.exception("Resuming conversion of %s failed", doc_id)
+                continue
+            resumed += 1
+        return resumed
+
+    async def drain(self, timeout: float) -> None:
+        """Stop converting, giving running conversions *timeout* seconds.
+
+        Queued conversions are dropped at once and running ones that do not
+        finish in time are cancelled. Either way the document stays
+        ``processing``, so its markdown is never served, and :meth:`resume`
+        restarts it on the next start.
+        """
+        self.draining = True
+        self._scheduler.cancel_queued()
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        if not tasks:
+            return
+        _, unfinished = await asyncio.wait(tasks, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if unfinished:
+            logger.warning(
+                "Shutdown interrupted %d conversions; they resume on restart",
+                len(unfinished),
+            )
+
+    async def verify_storage(
+        self, *, repair: bool = False, batch_size: int = 1000
+    ) -> StorageReport:
+        """Find ready documents whose markdown is missing or torn.
+
+        Markdown is checked against the SHA-256 recorded when it was written;
+        files from before hashes were recorded only need to decode. With
+        *repair*, markdown uploads are rewritten from their original, other
+        documents go back to ``pending`` to be reconverted on their next
+        read, unrecorded hashes are recorded and stale temp files removed.
+        """
+        report = StorageReport()
+        if repair:
+            report.temp_files_removed = await asyncio.to_thread(
+                self._storage.remove_temp_files
+            )
+        after = None
+        while rows := await self._repo.scan(after=after, limit=batch_size):
+            after = rows[-1]["id"]
+            for row in rows:
+                if row["status"] != DocumentStatus.ready:
+                    continue
+                report.checked += 1
+                doc_id = UUID(row["id"])
+                digest = await asyncio.to_thread(self._storage.markdown_sha256, doc_id)
+                if digest is not None and digest == row["content_sha256"]:
+                    continue
+                if (
+                    digest is not None
+                    and row["content_sha256"] is None
+                    and await self._markdown_decodes(doc_id)
+                ):
+                    if repair:
+                        await self._repo.update_status(
+                            doc_id, status="ready", content_sha256=digest
+                        )
+                        report.hashed += 1
+                    continue
+                report.torn.append(doc_id)
+                if repair:
+                    await self._repair_markdown(row)
+                    report.repaired += 1
+        return report
+
+    async def _markdown_decodes(self, doc_id: UUID) -> bool:
+        try:
+            await asyncio.to_thread(self._storage.read_markdown, doc_id)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    async def _repair_markdown(self, row: dict) -> None:
+        doc_id = UUID(row["id"])
+        if _needs_conversion(row["filename"], row["content_type"]):
+            await self._repo.update_status(doc_id, status="pending")
+            return
+        try:
+            data = await asyncio.to_thread(
+                self._storage.read_original, doc_id, row["filename"]
+            )
+        except FileNotFoundError:
+            await self._repo.update_status(
+                doc_id, status="error", error="Original file is missing"
+            )
+            return
+        digest = await self._save_markdown(doc_id, data.decode("utf-8"))
+        await self._repo.update_status(doc_id, status="ready", content_sha256=digest)
+
+    async def reconcile(
+        self,
+        *,
+        repair: bool = False,
+        grace: float = 3600.0,
+        rate: float | None = None,
+        batch_size: int = 1000,
+        restart_stuck: bool = True,
+    ) -> ReconcileReport:
+        """Find where the database and storage disagree.
+
+        Two passes stream through the documents table in id order and the
+        storage tree in directory order, *batch_size* at a time and at most
+        *rate* rows or entries per second. Anything touched in the last
+        *grace* seconds is skipped, as it may belong to a write in progress.
+
+        With *repair*, orphaned files are deleted, documents with missing
+        markdown are repaired as by :meth:`verify_storage`, unconverted
+        documents without an original are marked ``error``, and stuck
+        documents are converted again unless *restart_stuck* is false. Only
+        the process that runs conversions can tell a stuck document from a
+        long conversion, so other processes should only report them.
+        """
+        report = ReconcileReport()
+        cutoff = datetime.now(UTC) - timedelta(seconds=grace)
+        after = None
+        while True:
+            started = time.monotonic()
+            batch = await self._repo.scan(after=after, limit=batch_size)
+            if not batch:
+                break
+            after = batch[-1]["id"]
+            rows = [r for r in batch if r["updated_at"].replace(tzinfo=UTC) < cutoff]
+            report.rows_checked += len(rows)
+            files = await asyncio.to_thread(self._stored_files, rows)
+            for row, (has_original, has_markdown) in zip(rows, files):
+                await self._reconcile_row(
+                    row,
+                    has_original,
+                    has_markdown,
+                    report,
+                    repair,
+                    restart_stuck=restart_stuck,
+                )
+            await _throttle(started, len(batch), rate)
+
+        # A document has an entry per kind, so its id can come up again.
+        seen: set[str] = set()
+        entries = self._storage.scan(batch_size=batch_size)
+        while True:
+            started = time.monotonic()
+            batch = await asyncio.to_thread(next, entries, None)
+            if batch is None:
+                break
+            report.entries_checked += len(batch)
+            ids = {
+                str(doc_id)
+                for doc_id, mtime in batch
+                if mtime < cutoff.timestamp() and str(doc_id) not in seen
+            }
+            seen.update(ids)
+            known = await self._repo.known_ids(sorted(ids))
+            for doc_id in sorted(ids - known):
+                report.orphans.append(UUID(doc_id))
+                RECONCILE_ISSUES.inc(kind="orphan")
+                # Recheck: the upload owning the files may have completed.
+                if repair and not await self._repo.known_ids([doc_id]):
+                    await asyncio.to_thread(self._storage.delete, UUID(doc_id))
+                    report.repaired += 1
+            await _throttle(started, len(batch), rate)
+        return report
+
+    async def run_reconciler(
+        self, interval: float, *, grace: float = 3600.0, rate: float | None = None
+    ) -> None:
+        """Reconcile and repair every *interval* seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = await self.reconcile(repair=True, grace=grace, rate=rate)
+            except Exception:
+                logger.exception("Reconciliation failed")
+                continue
+            if report.orphans or report.missing or report.stuck:
+                logger.warning(
+                    "Reconciled storage: %d orphaned, %d missing files, "
+                    "%d stuck conversions, %d repaired",
+                    len(report.orphans),
+                    len(report.missing),
+                    len(report.stuck),
+                    report.repaired,
+                )
+
+    def _stored_files(self, rows: Sequence[dict]) -> Sequence[tuple[bool, bool]]:
+        return [
+            (
+                self._storage.has_original(UUID(row["id"]), row["filename"]),
+                self._storage.has_markdown(UUID(row["id"])),
+            )
+            for row in rows
+        ]
+
+    async def _reconcile_row(
+        self,
+        row: dict,
+        has_original: bool,
+        has_markdown: bool,
+        report: ReconcileReport,
+        repair: bool,
+        *,
+        restart_stuck: bool = True,
+    ) -> None:
+        doc_id = UUID(row["id"])
+        status = row["status"]
+        if doc_id in self._tasks:
+            # Being converted by this process.
+            return
+        if status == DocumentStatus.ready and not has_markdown:
+            report.missing.append(doc_id)
+            RECONCILE_ISSUES.inc(kind="missing")
+            if repair:
+                await self._repair_markdown(row)
+                report.repaired += 1
+        elif not has_original:
+            # A ready document keeps serving its markdown; only report it.
+            report.missing.append(doc_id)
+            RECONCILE_ISSUES.inc(kind="missing")
+            if repair and status in (DocumentStatus.pending, DocumentStatus.processing):
+                await self._repo.update_status(
+                    doc_id, status="error", error="Original file is missing"
+                )
+                report.repaired += 1
+        elif status == DocumentStatus.processing:
+            report.stuck.append(doc_id)
+            RECONCILE_ISSUES.inc(kind="stuck")
+            # Claimed so a conversion that finished since the scan is left alone.
+            if (
+                repair
+                and restart_stuck
+                and await self._repo.claim_status(
+                    doc_id, expected="processing", status="processing"
+                )
+            ):
+                await self._convert_row(row)
+                report.repaired += 1
+
+    async def create_upload(
+        self,
+        *,
+        filename: str,
+        content_type: str,
+        size_bytes: int | None = None,
+        metadata: dict[str, str] | None = None,
+        profile: ConversionProfile | None = None,
+    ) -> UploadSession:
+        """Start a resumable upload; its id becomes the document id."""
+        upload_id = uuid4()
+        self._storage.create_upload(upload_id)
+        row = await self._repo.insert_upload(
+            id=upload_id,
+            filename=filename,
+            content_type=content_type,
+            size_bytes=size_bytes,
+            metadata=metadata or {},
+            profile=profile.value if profile else None,
+        )
+        return _row_to_upload(row, 0)
+
+    async def get_upload(self, upload_id: UUID) -> UploadSession:
+        row = await self._repo.get_upload(upload_id)
+        if row is None:
+            raise UploadNotFoundError(upload_id)
+        try:
+            offset = self._storage.upload_size(upload_id)
+        except FileNotFoundError:
+            raise UploadNotFoundError(upload_id) from None
+        return _row_to_upload(row, offset)
+
+    async def append_upload(
+        self, upload_id: UUID, offset: int, chunks: AsyncIterable[bytes]
+    ) -> UploadSession:
+        """Append *chunks* to the upload if *offset* is its committed size.
+
+        Chunks go straight to disk, so bytes received before a dropped
+        connection stay committed and the client resumes from there.
+        """
+        async with self._upload_lock(upload_id):
+            upload = await self.get_upload(upload_id)
+            if offset != upload.offset:
+                raise UploadConflictError(
+                    upload_id,
+                    upload.offset,
+                    f"Upload offset is {upload.offset}, not {offset}",
+                )
+            received = offset
+            with self._storage.open_upload(upload_id) as f:
+                async for chunk in chunks:
+                    if (
+                        upload.size_bytes is not None
+                        and received + len(chunk) > upload.size_bytes
+                    ):
+                        raise UploadConflictError(
+                            upload_id,
+                            received,
+                            f"Upload exceeds declared size of "
+                            f"{upload.size_bytes} bytes",
+                        )
+                    f.write(chunk)
+                    received += len(chunk)
+            return upload.model_copy(update={"offset": received})
+
+    async def complete_upload(self, upload_id: UUID) -> DocumentMetadata:
+        async with self._upload_lock(upload_id):
+            upload = await self.get_upload(upload_id)
+            if upload.size_bytes is not None and upload.offset != upload.size_bytes:
+                raise UploadConflictError(
+                    upload_id,
+                    upload.offset,
+                    f"Upload is incomplete: {upload.offset} of "
+                    f"{upload.size_bytes} bytes received",
+                )
+            original_path = await asyncio.to_thread(
+                self._storage.finish_upload, upload_id, upload.filename
+            )
+            doc = await self._create_from_original(
+                upload_id,
+                filename=upload.filename,
+                content_type=upload.content_type,
+                original_path=original_path,
+                size_bytes=upload.offset,
+                metadata=upload.metadata,
+                profile=upload.profile,
+            )
+            await self._repo.delete_upload(upload_id)
+        self._upload_locks.pop(upload_id, None)
+        return doc
+
+    async def abort_upload(self, upload_id: UUID) -> None:
+        async with self._upload_lock(upload_id):
+            if not await self._repo.delete_upload(upload_id):
+                raise UploadNotFoundError(upload_id)
+            self._storage.delete(upload_id)
+        self._upload_locks.pop(upload_id, None)
+
+    async def expire_uploads(self, ttl: float) -> int:
+        """Abort upload sessions that received no bytes for *ttl* seconds."""
+        cutoff = datetime.now(UTC) - timedelta(seconds=ttl)
+        expired = 0
+        for upload_id in await self._repo.list_uploads(created_before=cutoff):
+            upload_id = UUID(upload_id)
+            try:
+                idle = self._storage.upload_mtime(upload_id) < cutoff.timestamp()
+            except FileNotFoundError:
+                idle = True
+            if not idle:
+                continue
+            with suppress(UploadNotFoundError):
+                await self.abort_upload(upload_id)
+                expired += 1
+        if expired:
+            logger.info("Expired %d idle upload sessions", expired)
+        return expired
+
+    async def _create_from_original(
+        self,
+        doc_id: UUID,
+        *,
+        filename: str,
+        content_type: str,
+        original_path: Path,
+        size_bytes: int,
+        metadata: dict[str, str],
+        profile: ConversionProfile | None = None,
+    ) -> DocumentMetadata:
+        content_sha256 = None
+        if not _needs_conversion(filename, content_type):
+            markdown = original_path.read_bytes().decode("utf-8")
+            content_sha256 = await self._save_markdown(doc_id, markdown)
+            status = "ready"
+        elif self._defer_conversion:
+            status = "pending"
+        else:
+            status = "processing"
+
+        row = await self._repo.insert(
+            id=doc_id,
+            filename=filename,
+            content_type=content_type,
+            size_bytes=size_bytes,
+            metadata=metadata,
+            status=status,
+            conversion_profile=profile.value if profile else None,
+            content_sha256=content_sha256,
+        )
+
+        if status == "processing":
+            await self._start_processing(doc_id, original_path, content_type, profile)
+
+        return self._to_metadata(row)
+
+    def _upload_lock(self, upload_id: UUID) -> asyncio.Lock:
+        return self._upload_locks.setdefault(upload_id, asyncio.Lock())
+
+    async def _save_markdown(
+        self, doc_id: UUID, markdown: str, pages: Sequence[PageFragment] = ()
+    ) -> str:
+        """Write the markdown and its sidecars; return the markdown's SHA-256.
+
+        Writes run in worker threads, so concurrent conversions share the
+        storage's group commit instead of blocking the event loop on fsync.
+        """
+        data = markdown.encode("utf-8")
+        await asyncio.to_thread(self._storage.save_markdown, doc_id, markdown)
+        index = await asyncio.to_thread(MarkdownIndex.build, markdown, self._tokenizer)
+        await asyncio.to_thread(self._storage.save_index, doc_id, index.to_dict())
+        if pages:
+            spans = []
+            offset = 0
+            for page in pages:
+                spans.append(
+                    {"hash": page.hash, "offset": offset, "length": len(page.markdown)}
+                )
+                offset += len(page.markdown) + len(PAGE_SEPARATOR)
+            await asyncio.to_thread(self._storage.save_pages, doc_id, spans)
+        return hashlib.sha256(data).hexdigest()
+
+    async def _load_index(
+        self, doc_id: UUID, markdown: str | None = None
+    ) -> MarkdownIndex:
+        data = self._storage.read_index(doc_id)
+        if data is not None:
+            index = MarkdownIndex.from_dict(data)
+            if index is not None and index.tokenizer == self._tokenizer.name:
+                return index
+        if markdown is None:
+            markdown = self._storage.read_markdown(doc_id)
+        index = await asyncio.to_thread(MarkdownIndex.build, markdown, self._tokenizer)
+        self._storage.save_index(doc_id, index.to_dict())
+        return index
+
+    async def _require_ready(self, document_id: UUID) -> None:
+        """Raise unless the document is ready.
+
+        Reading a pending document starts its conversion, and reading one
+        that is queued moves it to the head of the queue.
+        """
+        row = await self._repo.get(document_id)
+        if row is None:
+            raise DocumentNotFoundError(document_id)
+        status = row["status"]
+        if status == "pending":
+            # Either this call or a concurrent one has now started it.
+            await self._convert_pending(row, urgent=True)
+            status = "processing"
+        elif status == "processing":
+            self._scheduler.promote(document_id)
+        if status != "ready":
+            raise DocumentNotReadyError(document_id, status)
+
+    async def _convert_pending(self, row: dict, *, urgent: bool) -> bool:
+        """Start converting a pending document; False if another caller did."""
+        doc_id = UUID(row["id"])
+        claimed = await self._repo.claim_status(
+            doc_id, expected="pending", status="processing"
+        )
+        if claimed:
+            await self._convert_row(row, urgent=urgent)
+        return claimed
+
+    async def _convert_row(self, row: dict, *, urgent: bool = False) -> None:
+        doc_id = UUID(row["id"])
+        profile = row["conversion_profile"]
+        await self._start_processing(
+            doc_id,
+            self._storage.original_path(doc_id, row["filename"]),
+            row["content_type"],
+            ConversionProfile(profile) if profile else None,
+            urgent=urgent,
+        )
+
+    def _to_metadata(self, row: dict) -> DocumentMetadata:
+        return self._add_estimate(_row_to_metadata(row))
+
+    def _add_estimate(self, doc: DocumentMetadata) -> DocumentMetadata:
+        if doc.status is DocumentStatus.processing:
+            doc.estimated_completion_at = self._scheduler.estimated_completion(doc.id)
+        return doc
+
+    async def _start_processing(
+        self,
+        doc_id: UUID,
+        original_path: Path,
+        content_type: str,
+        profile: ConversionProfile | None = None,
+        previous_pages: dict[str, str] | None = None,
+        *,
+        urgent: bool = False,
+    ) -> None:
         old_task = self._tasks.pop(doc_id, None)
         if old_task and not old_task.done():
             old_task.cancel()
-        task = asyncio.create_task(self._process_document(doc_id, original_path))
+        if self.draining:
+            # Left ``processing`` for the next start to resume.
+            return
+        pages = await asyncio.to_thread(estimate_pages, original_path, content_type)
+        job = self._scheduler.submit(
+            doc_id,
+            profile=(profile or self._converter.default_profile).value,
+            pages=pages,
+            urgent=urgent,
+        )
+        task = asyncio.create_task(
+            self._process_document(
+                job, original_path, content_type, profile, previous_pages
+            )
+        )
         self._tasks[doc_id] = task
-        task.add_done_callback(lambda _: self._tasks.pop(doc_id, None))
 
-    async def _process_document(self, doc_id: UUID, original_path: Path) -> None:
+        def finished(_: asyncio.Task) -> None:
+            self._scheduler.release(job)
+            if self._tasks.get(doc_id) is task:
+                del self._tasks[doc_id]
+
+        task.add_done_callback(finished)
+
+    async def _process_document(
+        self,
+        job: ConversionJob,
+        original_path: Path,
+        content_type: str,
+        profile: ConversionProfile | None = None,
+        previous_pages: dict[str, str] | None = None,
+    ) -> None:
+        doc_id = job.document_id
+        type_label = content_type_label(content_type)
+        await job.granted
+        CONVERSION_QUEUE_SECONDS.observe(job.started_at - job.submitted_at)
         try:
-            markdown = await asyncio.to_thread(
-                self._converter.convert, original_path
+            start = time.perf_counter()
+            converted = await asyncio.to_thread(
+                self._converter.convert_document,
+                original_path,
+                profile=profile,
+                previous=previous_pages,
+            )
+            elapsed = time.perf_counter() - start
+            labels = {
+                "content_type": type_label,
+                "profile": converted.profile.value,
+            }
+            CONVERSION_SECONDS.observe(elapsed, **labels)
+            CONVERSION_PAGES_REUSED.inc(converted.reused_pages, content_type=type_label)
+            pages = converted.page_count - converted.reused_pages
+            if pages and elapsed > 0:
+                CONVERSION_PAGES.inc(pages, **labels)
+                CONVERSION_PAGES_PER_SECOND.observe(pages / elapsed, **labels)
+            self._scheduler.record(job.profile, pages, elapsed)
+            content_sha256 = await self._save_markdown(
+                doc_id, converted.markdown, converted.pages
+            )
+            await self._repo.update_status(
+                doc_id,
+                status="ready",
+                conversion_profile=converted.profile.value,
+                content_sha256=content_sha256,
             )
-            self._storage.save_markdown(doc_id, markdown)
-            await self._repo.update_status(doc_id, status="ready")
+            CONVERSIONS.inc(content_type=type_label, status="ready")
+            self._events.publish(doc_id, "ready")
         except asyncio.CancelledError:
             raise
         except Exception as exc:
             await self._repo.update_status(
                 doc_id, status="error", error=str(exc)
             )
+            CONVERSIONS.inc(content_type=type_label, status="error")
+            self._events.publish(doc_id, "error")
 
     async def _wait_pending(self) -> None:
         tasks = list(self._tasks.values())
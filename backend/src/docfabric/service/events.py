@@ -0,0 +1,35 @@
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+from uuid import UUID
+
+
+class StatusEvents:
+    """In-process notifications of document status changes.
+
+    Waiters block on a future instead of polling the database.
+    """
+
+    def __init__(self) -> None:
+        self._waiters: dict[UUID, set[asyncio.Future[str]]] = {}
+
+    def publish(self, document_id: UUID, status: str) -> None:
+        for waiter in self._waiters.pop(document_id, ()):
+            if not waiter.done():
+                waiter.set_result(status)
+
+    @contextmanager
+    def subscribe(self, document_id: UUID) -> Iterator[asyncio.Future[str]]:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(document_id, set()).add(waiter)
+        try:
+            yield waiter
+        finally:
+            waiters = self._waiters.get(document_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[document_id]
+
+    def waiting(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
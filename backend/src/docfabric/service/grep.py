@@ -0,0 +1,173 @@
+import re
+import time
+from contextlib import suppress
+from dataclasses import dataclass
+from re import _parser
+
+# Snippets stop this many bytes or characters either side of the match, so
+# a single-line table does not come back whole.
+_SNIPPET_REACH = 500
+
+MAX_PATTERN_LENGTH = 1000
+
+_REPEATS = (_parser.MAX_REPEAT, _parser.MIN_REPEAT, _parser.POSSESSIVE_REPEAT)
+
+
+@dataclass
+class GrepHit:
+    offset: int
+    length: int
+    line: int
+    text: str
+
+
+def compile_pattern(
+    pattern: str, *, regex: bool = False, ignore_case: bool = False
+) -> re.Pattern:
+    """Compile *pattern* for :func:`scan`.
+
+    Literal patterns, and ASCII regular expressions that only use literals,
+    ranges and anchors, match the raw UTF-8 bytes, so files are searched
+    without being decoded. Anything that needs character semantics, such as
+    ``.``, ``\\w`` or case-insensitive non-ASCII letters, matches the decoded
+    text.
+
+    The scan deadline is only checked between matches, so expressions that
+    can backtrack exponentially within one match are refused: nested
+    variable-length quantifiers, alternation under a variable-length
+    quantifier, backreferences and patterns longer than
+    :data:`MAX_PATTERN_LENGTH`. Raises :class:`re.error` for those and for
+    an invalid expression.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    if not regex:
+        if not ignore_case or pattern.isascii():
+            return re.compile(re.escape(pattern.encode("utf-8")), flags)
+        pattern = re.escape(pattern)
+    else:
+        if len(pattern) > MAX_PATTERN_LENGTH:
+            raise re.error(f"pattern is longer than {MAX_PATTERN_LENGTH} characters")
+        matches_bytes = _check(_parser.parse(pattern, flags), repeat=None)
+        if matches_bytes and pattern.isascii():
+            # Inline flags such as (?u) are refused for bytes patterns.
+            with suppress(re.error):
+                return re.compile(pattern.encode("ascii"), flags | re.MULTILINE)
+    return re.compile(pattern, flags | re.MULTILINE)
+
+
+def _check(items, *, repeat: str | None) -> bool:
+    """Refuse backtracking hazards in parsed *items*; True if byte-safe.
+
+    *repeat* is ``"fixed"`` or ``"variable"`` inside a quantifier that
+    repeats more than once, by its kind.
+    """
+    byte_safe = True
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, sub = av
+            if repeat is not None and low != high:
+                raise re.error("nested quantifiers are not supported")
+            inner = repeat
+            if high > 1:
+                inner = repeat or ("fixed" if low == high else "variable")
+            byte_safe &= _check(sub, repeat=inner)
+        elif op is _parser.SUBPATTERN:
+            byte_safe &= _check(av[3], repeat=repeat)
+        elif op is _parser.ATOMIC_GROUP:
+            byte_safe &= _check(av, repeat=repeat)
+        elif op in (_parser.ASSERT, _parser.ASSERT_NOT):
+            byte_safe &= _check(av[1], repeat=repeat)
+        elif op is _parser.BRANCH:
+            # Alternatives that can match the same text multiply the ways a
+            # repeated group can split its input.
+            if repeat == "variable":
+                raise re.error("alternation under a quantifier is not supported")
+            for branch in av[1]:
+                byte_safe &= _check(branch, repeat=repeat)
+        elif op in (_parser.GROUPREF, _parser.GROUPREF_EXISTS):
+            raise re.error("backreferences are not supported")
+        elif op is _parser.IN:
+            # Categories are Unicode-aware and a negated set can match part
+            # of a multi-byte character.
+            byte_safe &= all(
+                (o is _parser.LITERAL and a < 0x80)
+                or (o is _parser.RANGE and a[1] < 0x80)
+                for o, a in av
+            )
+        elif op is _parser.AT:
+            byte_safe &= av not in (_parser.AT_BOUNDARY, _parser.AT_NON_BOUNDARY)
+        elif op is _parser.LITERAL:
+            # An escape such as \xe9 names a character that is not one byte.
+            byte_safe &= av < 0x80
+        else:
+            # ANY, CATEGORY and NOT_LITERAL need characters, not bytes.
+            byte_safe = False
+    return byte_safe
+
+
+def scan(
+    data,
+    pattern: re.Pattern,
+    *,
+    limit: int,
+    deadline: float | None = None,
+    context: int = 0,
+) -> tuple[list[GrepHit], bool]:
+    """Return up to *limit* matches in *data* and whether *deadline* passed.
+
+    *data* is the UTF-8 markdown as a bytes-like object such as an mmap.
+    Hits carry character offsets and 1-based line numbers; their text is
+    the matching line plus *context* lines either side. The deadline is
+    checked between matches.
+    """
+    if isinstance(pattern.pattern, str):
+        data = str(data, "utf-8")
+        newline = "\n"
+        view = None
+    else:
+        newline = b"\n"
+        view = memoryview(data)
+    size = len(data)
+    hits: list[GrepHit] = []
+    # Line number and character count up to ``pos``, advanced match by match.
+    pos, line, chars = 0, 1, 0
+    try:
+        for match in pattern.finditer(data):
+            if deadline is not None and time.monotonic() > deadline:
+                return hits, True
+            start, end = match.span()
+            if view is not None:
+                # Decoding the gap straight from the mapping gives both counts.
+                gap = str(view[pos:start], "utf-8")
+                line += gap.count("\n")
+                chars += len(gap)
+                length = len(str(view[start:end], "utf-8"))
+            else:
+                line += data.count(newline, pos, start)
+                chars = start
+                length = end - start
+            pos = start
+
+            first = data.rfind(newline, 0, start) + 1
+            last = data.find(newline, end)
+            last = size if last < 0 else last
+            for _ in range(context):
+                if first > 0:
+                    first = data.rfind(newline, 0, first - 1) + 1
+                if last < size:
+                    last = data.find(newline, last + 1)
+                    last = size if last < 0 else last
+            text = data[
+                max(first, start - _SNIPPET_REACH) : min(last, end + _SNIPPET_REACH)
+            ]
+            if view is not None:
+                # A cut at the reach limit may split a character.
+                text = str(text, "utf-8", "ignore")
+            hits.append(GrepHit(offset=chars, length=length, line=line, text=text))
+            if len(hits) >= limit:
+                break
+    finally:
+        # An mmap cannot be closed while a view of it is alive.
+        if view is not None:
+            view.release()
+    return hits, False
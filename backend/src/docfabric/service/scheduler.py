@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from uuid import UUID
+
+# Throughput assumed for a profile until a conversion with it has finished.
+_DEFAULT_PAGES_PER_SECOND = 1.0
+# Weight of the newest conversion in the moving average of throughput.
+_RATE_SMOOTHING = 0.2
+# Completion estimates are recomputed at least this often while jobs overrun.
+_ETA_TTL = 1.0
+
+
+@dataclass(order=True)
+class ConversionJob:
+    key: float
+    seq: int
+    document_id: UUID = field(compare=False)
+    profile: str = field(compare=False)
+    pages: int = field(compare=False)
+    seconds: float = field(compare=False)
+    submitted_at: float = field(compare=False)
+    started_at: float | None = field(default=None, compare=False)
+    # Resolved when the job is granted a conversion slot.
+    granted: asyncio.Future = field(default=None, compare=False, repr=False)
+
+
+class ConversionScheduler:
+    """Hand out conversion slots shortest estimated job first.
+
+    A job's estimated run time is its page count divided by the moving
+    average throughput of its profile. Jobs are ordered by submission time
+    plus estimated run time times *size_weight*: a later job overtakes an
+    earlier one only if it is shorter by more than the earlier job has
+    waited, so a large job is never overtaken indefinitely. With a
+    *size_weight* of 0 jobs run in arrival order.
+    """
+
+    def __init__(self, *, slots: int = 2, size_weight: float = 1.0) -> None:
+        self._slots = slots
+        self._size_weight = size_weight
+        self._queue: list[ConversionJob] = []
+        self._running: list[ConversionJob] = []
+        self._rates: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._etas: dict[UUID, float] | None = None
+        self._etas_at = 0.0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def estimate(self, profile: str, pages: int) -> float:
+        """Estimated conversion time in seconds."""
+        return pages / self._rates.get(profile, _DEFAULT_PAGES_PER_SECOND)
+
+    def record(self, profile: str, pages: int, seconds: float) -> None:
+        """Feed the throughput of a finished conversion into the estimates."""
+        if pages <= 0 or seconds <= 0:
+            return
+        rate = pages / seconds
+        previous = self._rates.get(profile)
+        if previous is not None:
+            rate = previous + _RATE_SMOOTHING * (rate - previous)
+        self._rates[profile] = rate
+
+    def submit(
+        self, document_id: UUID, *, profile: str, pages: int, urgent: bool = False
+    ) -> ConversionJob:
+        """Queue a job; *urgent* jobs go ahead of all others."""
+        now = time.time()
+        seconds = self.estimate(profile, pages)
+        job = ConversionJob(
+            key=-math.inf if urgent else now + seconds * self._size_weight,
+            seq=next(self._seq),
+            document_id=document_id,
+            profile=profile,
+            pages=pages,
+            seconds=seconds,
+            submitted_at=now,
+            granted=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._queue, job)
+        self._dispatch()
+        return job
+
+    def release(self, job: ConversionJob) -> None:
+        """Free the job's slot, or drop it from the queue. Idempotent."""
+        if job in self._running:
+            self._running.remove(job)
+        elif job in self._queue:
+            self._queue.remove(job)
+            heapq.heapify(self._queue)
+        else:
+            return
+        self._dispatch()
+
+    def promote(self, document_id: UUID) -> None:
+        """Move the document's queued job to the head of the queue."""
+        for job in self._queue:
+            if job.document_id == document_id and job.key != -math.inf:
+                job.key = -math.inf
+                heapq.heapify(self._queue)
+                self._etas = None
+                return
+
+    def cancel_queued(self) -> None:
+        """Cancel every job still waiting for a slot."""
+        for job in self._queue:
+            job.granted.cancel()
+        self._queue.clear()
+        self._dispatch()
+
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def wait_idle(self) -> None:
+        """Wait until a slot is free and nothing is queued."""
+        await self._idle.wait()
+
+    def estimated_completion(self, document_id: UUID) -> datetime | None:
+        now = time.time()
+        if self._etas is None or now - self._etas_at > _ETA_TTL:
+            self._etas, _ = self._schedule(now)
+            self._etas_at = now
+        eta = self._etas.get(document_id)
+        return datetime.fromtimestamp(eta, UTC) if eta is not None else None
+
+    def backlog_seconds(self) -> float:
+        """Estimated wait before a job submitted now gets a slot, at worst."""
+        now = time.time()
+        _, free = self._schedule(now)
+        return free[0] - now
+
+    def _dispatch(self) -> None:
+        self._etas = None
+        while self._queue and len(self._running) < self._slots:
+            job = heapq.heappop(self._queue)
+            if job.granted.done():
+                # Cancelled while waiting; its release will find nothing.
+                continue
+            job.started_at = time.time()
+            self._running.append(job)
+            job.granted.set_result(None)
+        if self._queue or len(self._running) >= self._slots:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    def _schedule(self, now: float) -> tuple[dict[UUID, float], list[float]]:
+        """Simulate the queue on the free slots, assuming no new arrivals.
+
+        Returns each document's completion time and the heap of times at
+        which the slots become free afterwards.
+        """
+        etas = {}
+        free = []
+        for job in self._running:
+            end = max(job.started_at + job.seconds, now)
+            etas[job.document_id] = end
+            free.append(end)
+        free.extend([now] * (self._slots - len(free)))
+        heapq.heapify(free)
+        for job in sorted(self._queue):
+            end = heapq.heappop(free) + job.seconds
+            etas[job.document_id] = end
+            heapq.heappush(free, end)
+        return etas, free
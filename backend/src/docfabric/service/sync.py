@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from uuid import UUID
+
+from docfabric.db.repository import DocumentRepository
+from docfabric.metrics import SYNC_FILES
+from docfabric.service.document import DocumentNotFoundError, DocumentService
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = 500
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def _scan(root: Path) -> dict[str, tuple[int, int]]:
+    """Return ``{relative path: (size, mtime_ns)}`` for the files below *root*.
+
+    Hidden files and directories are skipped and symlinks are not followed.
+    """
+    found: dict[str, tuple[int, int]] = {}
+    prefix = len(str(root)) + 1
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    rel = entry.path[prefix:].replace(os.sep, "/")
+                    found[rel] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+def _read(path: Path) -> tuple[bytes, str]:
+    data = path.read_bytes()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+class FolderSync:
+    """Mirror a local directory into DocFabric.
+
+    Files whose size and mtime match the manifest are skipped without being
+    opened. Changed files are hashed and only uploaded if the hash differs,
+    so a touched but identical file costs one read.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        service: DocumentService,
+        repository: DocumentRepository,
+    ) -> None:
+        self._root = root
+        self._service = service
+        self._repo = repository
+
+    async def sync(self) -> SyncResult:
+        manifest = await self._repo.list_sync_entries()
+        found = await asyncio.to_thread(_scan, self._root)
+        result = SyncResult()
+
+        upserts: list[dict] = []
+        deletes: list[str] = []
+        try:
+            for rel, (size, mtime_ns) in found.items():
+                entry = manifest.get(rel)
+                seen = (size, mtime_ns)
+                if entry and (entry["size_bytes"], entry["mtime_ns"]) == seen:
+                    result.unchanged += 1
+                    continue
+                try:
+                    data, sha256 = await asyncio.to_thread(_read, self._root / rel)
+                    if entry and entry["sha256"] == sha256:
+                        result.unchanged += 1
+                        document_id = entry["document_id"]
+                    else:
+                        document_id = await self._upload(rel, data, entry, result)
+                except Exception:
+                    # Left out of the manifest, so the next pass retries it.
+                    logger.exception("Sync of %s failed", rel)
+                    result.failed += 1
+                    SYNC_FILES.inc(action="failed")
+                    continue
+                upserts.append(
+                    {
+                        "path": rel,
+                        "size_bytes": size,
+                        "mtime_ns": mtime_ns,
+                        "sha256": sha256,
+                        "document_id": document_id,
+                    }
+                )
+                if len(upserts) >= _BATCH_SIZE:
+                    await self._repo.write_sync_entries(upserts, [])
+                    upserts = []
+
+            removed = sorted(manifest.keys() - found.keys())
+            if removed and not found:
+                # More likely an unmounted share than every file deleted.
+                logger.warning(
+                    "%s is empty; keeping its %d synced documents",
+                    self._root,
+                    len(removed),
+                )
+                removed = []
+            for start in range(0, len(removed), _BATCH_SIZE):
+                batch = removed[start : start + _BATCH_SIZE]
+                await self._service.delete_many(
+                    [UUID(manifest[rel]["document_id"]) for rel in batch]
+                )
+                deletes.extend(batch)
+                result.deleted += len(batch)
+                SYNC_FILES.inc(len(batch), action="deleted")
+        finally:
+            # Written even if the pass fails, so files already uploaded are
+            # not uploaded again by the next one.
+            await self._repo.write_sync_entries(upserts, deletes)
+
+        SYNC_FILES.inc(result.unchanged, action="unchanged")
+        return result
+
+    async def run(self, interval: float) -> None:
+        """Sync every *interval* seconds until cancelled."""
+        while True:
+            try:
+                result = await self.sync()
+            except Exception:
+                logger.exception("Sync of %s failed", self._root)
+            else:
+                if result.created or result.updated or result.deleted:
+                    logger.info("Synced %s: %s", self._root, result)
+            await asyncio.sleep(interval)
+
+    async def _upload(
+        self, rel: str, data: bytes, entry: dict | None, result: SyncResult
+    ) -> str:
+        filename = PurePosixPath(rel).name
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        if entry is not None:
+            try:
+                await self._service.update(
+                    UUID(entry["document_id"]),
+                    filename=filename,
+                    content_type=content_type,
+                    data=data,
+                )
+            except DocumentNotFoundError:
+                pass
+            else:
+                result.updated += 1
+                SYNC_FILES.inc(action="updated")
+                return entry["document_id"]
+
+        doc = await self._service.create(
+            filename=filename,
+            content_type=content_type,
+            data=data,
+            metadata={"sync_path": rel},
+        )
+        result.created += 1
+        SYNC_FILES.inc(action="created")
+        return str(doc.id)
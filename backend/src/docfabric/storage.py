@@ -1,40 +1,457 @@
+import hashlib
+import json
+import mmap
+import os
 import shutil
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
 from pathlib import Path
-from uuid import UUID
+from typing import BinaryIO, Literal, TextIO
+from uuid import UUID, uuid4
+
+from docfabric.metrics import (
+    STORAGE_READ_BYTES,
+    STORAGE_SECONDS,
+    STORAGE_WRITE_BYTES,
+    timed,
+)
+
+_CHUNK_CHARS = 64 * 1024
+
+Durability = Literal["none", "fsync", "group"]
+
+_TEMP_SUFFIX = ".tmp"
+
+MAX_SHARD_DEPTH = 4
+
+
+def _fsync(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _temp_path(path: Path) -> Path:
+    """Hidden, unique sibling of *path* to write before renaming into place."""
+    return path.with_name(f".{path.name}.{uuid4().hex[:12]}{_TEMP_SUFFIX}")
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.renames: list[tuple[Path, Path]] = []
+        self.done = False
+        self.error: OSError | None = None
+
+
+class _GroupCommit:
+    """Make renames durable in batches shared by concurrent writers.
+
+    Each writer fsyncs its own file, in its own thread, before queueing the
+    rename. A writer that finds no flush running then renames every file
+    queued so far and fsyncs each directory they landed in once; the others
+    wait for it, and writes arriving meanwhile form the next batch. Only the
+    batch's own files and directories are flushed, so unrelated I/O on the
+    filesystem does not slow it down.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._open = _Batch()
+        self._flushing = False
+
+    def commit(self, temp: Path, path: Path) -> None:
+        _fsync(temp)
+        with self._cond:
+            batch = self._open
+            batch.renames.append((temp, path))
+            while not batch.done:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # Our batch has not been taken, so it is the open one.
+                self._flushing = True
+                self._open = _Batch()
+                self._cond.release()
+                try:
+                    self._flush(batch.renames)
+                except OSError as exc:
+                    batch.error = exc
+                finally:
+                    self._cond.acquire()
+                    batch.done = True
+                    self._flushing = False
+                    self._cond.notify_all()
+        if batch.error is not None:
+            raise batch.error
+
+    def _flush(self, renames: Sequence[tuple[Path, Path]]) -> None:
+        for temp, path in renames:
+            os.replace(temp, path)
+        for directory in {path.parent for _, path in renames}:
+            _fsync(directory)
+
+
+# Top-level directories of the store and the suffix after the document id of
+# the entry each holds per document. Originals are a directory per document.
+_KINDS = (
+    ("originals", ""),
+    ("markdown", ".md"),
+    ("index", ".json"),
+    ("pages", ".json"),
+)
+
+
+def shard_prefix(document_id: UUID, depth: int) -> Path:
+    """Relative directory of a document's entries: one level per byte of the
+    SHA-256 of its id, so documents spread evenly over 256 subdirectories
+    per level whatever the id scheme."""
+    digest = hashlib.sha256(str(document_id).encode()).hexdigest()
+    return Path(*(digest[2 * i : 2 * i + 2] for i in range(depth)))
+
+
+def _document_entries(directory: Path, suffix: str) -> Iterator[tuple[UUID, Path]]:
+    """Yield every entry named after a document below *directory*, each
+    directory in name order."""
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        name = entry.name.removesuffix(suffix) if suffix else entry.name
+        is_entry = entry.is_dir() if not suffix else entry.name.endswith(suffix)
+        try:
+            document_id = UUID(name) if is_entry else None
+        except ValueError:
+            document_id = None
+        if document_id is not None:
+            yield document_id, Path(entry.path)
+        elif entry.is_dir():
+            yield from _document_entries(Path(entry.path), suffix)
+
+
+def _iter_text(
+    file: TextIO, offset: int, limit: int | None, chunk_size: int
+) -> Iterator[str]:
+    with file:
+        while offset > 0:
+            skipped = len(file.read(min(offset, chunk_size)))
+            if not skipped:
+                return
+            offset -= skipped
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = file.read(size)
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
 
 
 class FileStorage:
-    def __init__(self, base_path: Path) -> None:
+    """Originals, markdown and sidecars on local disk.
+
+    Entries live *shard_depth* hash-prefix directories below their kind's
+    directory. Entries still at another depth, such as the flat layout of
+    earlier versions, are found at their old path until ``migrate_layout``
+    moves them.
+    """
+
+    def __init__(
+        self,
+        base_path: Path,
+        *,
+        shard_depth: int = 2,
+        durability: Durability = "fsync",
+    ) -> None:
         self._base = base_path
+        self._shard_depth = shard_depth
+        self._durability = durability
+        self._group = _GroupCommit() if durability == "group" else None
+
+    def _sharded_path(self, kind: str, document_id: UUID, name: str) -> Path:
+        return self._base / kind / shard_prefix(document_id, self._shard_depth) / name
+
+    def _locate(self, kind: str, document_id: UUID, name: str) -> Path:
+        path = self._sharded_path(kind, document_id, name)
+        if path.exists():
+            return path
+        # Not yet moved after a change of depth, from or to any other depth.
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            if depth != self._shard_depth:
+                other = self._base / kind / shard_prefix(document_id, depth) / name
+                if other.exists():
+                    return other
+        return path
 
     def _original_dir(self, document_id: UUID) -> Path:
-        return self._base / "originals" / str(document_id)
+        return self._locate("originals", document_id, str(document_id))
 
     def _markdown_path(self, document_id: UUID) -> Path:
-        return self._base / "markdown" / f"{document_id}.md"
+        return self._locate("markdown", document_id, f"{document_id}.md")
+
+    def _index_path(self, document_id: UUID) -> Path:
+        return self._locate("index", document_id, f"{document_id}.json")
+
+    def _pages_path(self, document_id: UUID) -> Path:
+        return self._locate("pages", document_id, f"{document_id}.json")
+
+    def _upload_path(self, upload_id: UUID) -> Path:
+        # The upload id becomes the document id, so the partial file lives in
+        # the document's originals directory and is renamed into place.
+        return self._original_dir(upload_id) / ".upload"
+
+    def _commit(self, temp: Path, path: Path, *, durable: bool = True) -> None:
+        """Rename the complete file *temp* over *path*.
 
+        Readers see the old file or the new one, never a partial write. When
+        *durable*, both the data and the rename are on disk before this
+        returns, unless the durability mode is ``none``.
+        """
+        if not durable or self._durability == "none":
+            os.replace(temp, path)
+        elif self._group is not None:
+            self._group.commit(temp, path)
+        else:
+            _fsync(temp)
+            os.replace(temp, path)
+            _fsync(path.parent)
+
+    def _write(self, path: Path, data: bytes, *, durable: bool = True) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = _temp_path(path)
+        try:
+            temp.write_bytes(data)
+            self._commit(temp, path, durable=durable)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+    @timed(STORAGE_SECONDS, operation="save_original")
     def save_original(self, document_id: UUID, filename: str, data: bytes) -> Path:
-        dir_ = self._original_dir(document_id)
-        dir_.mkdir(parents=True, exist_ok=True)
-        path = dir_ / filename
-        path.write_bytes(data)
+        path = self._original_dir(document_id) / filename
+        self._write(path, data)
+        STORAGE_WRITE_BYTES.observe(len(data), kind="original")
         return path
 
+    @timed(STORAGE_SECONDS, operation="read_original")
     def read_original(self, document_id: UUID, filename: str) -> bytes:
-        return (self._original_dir(document_id) / filename).read_bytes()
+        data = self.original_path(document_id, filename).read_bytes()
+        STORAGE_READ_BYTES.observe(len(data), kind="original")
+        return data
 
     def original_path(self, document_id: UUID, filename: str) -> Path:
-        return self._original_dir(document_id) / filename
+        path = self._original_dir(document_id) / filename
+        if not path.exists():
+            # Renamed by a metadata patch; the file keeps its stored name.
+            for entry in self._original_dir(document_id).glob("[!.]*"):
+                return entry
+        return path
+
+    def has_original(self, document_id: UUID, filename: str) -> bool:
+        return self.original_path(document_id, filename).exists()
+
+    def create_upload(self, upload_id: UUID) -> None:
+        path = self._upload_path(upload_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+    def upload_size(self, upload_id: UUID) -> int:
+        return self._upload_path(upload_id).stat().st_size
+
+    def open_upload(self, upload_id: UUID) -> BinaryIO:
+        """Open the partial upload for appending."""
+        return self._upload_path(upload_id).open("ab")
 
+    def upload_mtime(self, upload_id: UUID) -> float:
+        """When the upload last received bytes, as a POSIX timestamp."""
+        return self._upload_path(upload_id).stat().st_mtime
+
+    @timed(STORAGE_SECONDS, operation="finish_upload")
+    def finish_upload(self, upload_id: UUID, filename: str) -> Path:
+        """Move a complete upload to its original path without copying."""
+        source = self._upload_path(upload_id)
+        size = source.stat().st_size
+        path = self.original_path(upload_id, filename)
+        self._commit(source, path)
+        STORAGE_WRITE_BYTES.observe(size, kind="original")
+        return path
+
+    @timed(STORAGE_SECONDS, operation="save_markdown")
     def save_markdown(self, document_id: UUID, content: str) -> Path:
         path = self._markdown_path(document_id)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding="utf-8")
+        data = content.encode("utf-8")
+        self._write(path, data)
+        STORAGE_WRITE_BYTES.observe(len(data), kind="markdown")
         return path
 
+    def has_markdown(self, document_id: UUID) -> bool:
+        return self._markdown_path(document_id).exists()
+
+    def markdown_sha256(self, document_id: UUID) -> str | None:
+        """SHA-256 of the stored markdown, or None if there is none."""
+        try:
+            with self._markdown_path(document_id).open("rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        except FileNotFoundError:
+            return None
+
+    @timed(STORAGE_SECONDS, operation="read_markdown")
     def read_markdown(self, document_id: UUID) -> str:
-        return self._markdown_path(document_id).read_text(encoding="utf-8")
+        path = self._markdown_path(document_id)
+        content = path.read_text(encoding="utf-8")
+        STORAGE_READ_BYTES.observe(path.stat().st_size, kind="markdown")
+        return content
+
+    def iter_markdown(
+        self,
+        document_id: UUID,
+        *,
+        offset: int = 0,
+        limit: int | None = None,
+        chunk_size: int = _CHUNK_CHARS,
+    ) -> Iterator[str]:
+        """Yield the markdown from *offset* in chunks of *chunk_size* characters.
+
+        The file is opened immediately so a missing file fails before the
+        first chunk is requested.
+        """
+        file = self._markdown_path(document_id).open(encoding="utf-8")
+        return _iter_text(file, offset, limit, chunk_size)
+
+    @contextmanager
+    def map_markdown(self, document_id: UUID) -> Iterator[mmap.mmap | bytes]:
+        """Map the markdown read-only for scanning; an empty file maps to b"".
+
+        Writes replace the file by rename, so the mapping keeps the version
+        that was open.
+        """
+        with self._markdown_path(document_id).open("rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                yield data
+
+    def _save_sidecar(self, document_id: UUID, path: Path, data: object) -> Path:
+        """Write *data* stamped with the markdown file it was derived from.
+
+        Sidecars are rebuilt when missing, so they skip the fsync.
+        """
+        stat = self._markdown_path(document_id).stat()
+        payload = {
+            "markdown_size": stat.st_size,
+            "markdown_mtime_ns": stat.st_mtime_ns,
+            "data": data,
+        }
+        self._write(path, json.dumps(payload).encode("utf-8"), durable=False)
+        return path
+
+    def _read_sidecar(self, document_id: UUID, path: Path):
+        """Return sidecar data, or None if it is missing or the markdown has
+        been rewritten since it was saved."""
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            stat = self._markdown_path(document_id).stat()
+        except (FileNotFoundError, ValueError):
+            return None
+        if (payload.get("markdown_size"), payload.get("markdown_mtime_ns")) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return None
+        return payload.get("data")
+
+    def save_index(self, document_id: UUID, index: dict) -> Path:
+        return self._save_sidecar(document_id, self._index_path(document_id), index)
+
+    def read_index(self, document_id: UUID) -> dict | None:
+        return self._read_sidecar(document_id, self._index_path(document_id))
+
+    def save_pages(self, document_id: UUID, pages: list[dict]) -> Path:
+        """Save per-page hashes and the markdown span each page produced."""
+        return self._save_sidecar(document_id, self._pages_path(document_id), pages)
+
+    def read_page_fragments(self, document_id: UUID) -> dict[str, str] | None:
+        """Return the markdown of each saved page keyed by page hash."""
+        pages = self._read_sidecar(document_id, self._pages_path(document_id))
+        if pages is None:
+            return None
+        markdown = self._markdown_path(document_id).read_text(encoding="utf-8")
+        return {
+            p["hash"]: markdown[p["offset"] : p["offset"] + p["length"]] for p in pages
+        }
+
+    def remove_temp_files(self, *, older_than: float = 3600.0) -> int:
+        """Delete temp files left by interrupted writes.
+
+        Only files older than *older_than* seconds are removed, so writes in
+        progress are left alone. Returns the number removed.
+        """
+        cutoff = time.time() - older_than
+        removed = 0
+        for kind, _ in _KINDS:
+            for root, _, files in os.walk(self._base / kind):
+                for name in files:
+                    path = Path(root, name)
+                    if not (name.startswith(".") and name.endswith(_TEMP_SUFFIX)):
+                        continue
+                    try:
+                        if path.stat().st_mtime < cutoff:
+                            path.unlink()
+                            removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def scan(self, *, batch_size: int = 1000) -> Iterator[list[tuple[UUID, float]]]:
+        """Yield ``(document id, mtime)`` of every stored entry in batches.
+
+        Kinds are walked one after the other, each directory in name order,
+        so memory is bounded by *batch_size* and the size of one directory.
+        A document has an entry per kind it is stored under.
+        """
+        batch: list[tuple[UUID, float]] = []
+        for kind, suffix in _KINDS:
+            root = self._base / kind
+            if not root.is_dir():
+                continue
+            for document_id, path in _document_entries(root, suffix):
+                try:
+                    batch.append((document_id, path.stat().st_mtime))
+                except FileNotFoundError:
+                    continue
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def migrate_layout(self) -> int:
+        """Move entries stored at another shard depth to the configured one.
+
+        Each entry moves with a single rename, and lookups fall back to every
+        other depth, so this can run while the service is serving it.
+        Returns the number of entries moved.
+        """
+        moved = 0
+        for kind, suffix in _KINDS:
+            root = self._base / kind
+            if not root.is_dir():
+                continue
+            for document_id, path in _document_entries(root, suffix):
+                target = self._sharded_path(kind, document_id, path.name)
+                if path == target or target.exists():
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                path.rename(target)
+                moved += 1
+        return moved
 
+    @timed(STORAGE_SECONDS, operation="delete")
     def delete(self, document_id: UUID) -> None:
         original_dir = self._original_dir(document_id)
         if original_dir.exists():
@@ -42,3 +459,5 @@ class FileStorage:
         md_path = self._markdown_path(document_id)
         if md_path.exists():
             md_path.unlink()
+        self._index_path(document_id).unlink(missing_ok=True)
+        self._pages_path(document_id).unlink(missing_ok=True)
@@ -1,3 +1,4 @@
+import json
 from contextlib import asynccontextmanager
 from uuid import uuid4
 
@@ -11,10 +12,16 @@ from docfabric.api.router import router
 from docfabric.conversion.converter import MarkdownConverter
 from docfabric.db.engine import create_engine, init_db
 from docfabric.db.repository import DocumentRepository
+from docfabric.health import HealthMonitor, ReadinessLimits
+from docfabric.models.document import ConversionProfile
 from docfabric.service.document import (
+    ChangesExpiredError,
     DocumentNotFoundError,
     DocumentNotReadyError,
     DocumentService,
+    SectionNotFoundError,
+    UploadConflictError,
+    UploadNotFoundError,
 )
 from docfabric.storage import FileStorage
 
@@ -23,7 +30,7 @@ from docfabric.storage import FileStorage
 async def app(tmp_path):
     from unittest.mock import MagicMock, patch
 
-    engine = create_engine("sqlite+aiosqlite://")
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
     await init_db(engine)
 
     storage = FileStorage(tmp_path)
@@ -45,7 +52,15 @@ async def app(tmp_path):
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         app.state.document_service = service
+        app.state.health = HealthMonitor(
+            service,
+            service._scheduler,
+            service._repo,
+            tmp_path,
+            ReadinessLimits(min_free_bytes=0),
+        )
         yield
+        await service._wait_pending()
         await engine.dispose()
 
     app = FastAPI(lifespan=lifespan)
@@ -69,10 +84,55 @@ async def app(tmp_path):
             content={"detail": detail, "status": exc.status},
         )
 
+    @app.exception_handler(SectionNotFoundError)
+    async def section_not_found_handler(
+        request: Request, exc: SectionNotFoundError
+    ) -> JSONResponse:
+        return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+    @app.exception_handler(ChangesExpiredError)
+    async def changes_expired_handler(
+        request: Request, exc: ChangesExpiredError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=410,
+            content={
+                "detail": str(exc),
+                "oldest_seq": exc.oldest,
+                "last_seq": exc.last_seq,
+            },
+        )
+
+    @app.exception_handler(UploadNotFoundError)
+    async def upload_not_found_handler(
+        request: Request, exc: UploadNotFoundError
+    ) -> JSONResponse:
+        return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+    @app.exception_handler(UploadConflictError)
+    async def upload_conflict_handler(
+        request: Request, exc: UploadConflictError
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": str(exc), "offset": exc.offset},
+        )
+
     @app.get("/health")
     async def health():
+        if app.state.document_service.draining:
+            return JSONResponse(status_code=503, content={"status": "draining"})
+        return {"status": "ok"}
+
+    @app.get("/health/live")
+    async def health_live():
         return {"status": "ok"}
 
+    @app.get("/health/ready")
+    async def health_ready():
+        ready, body = await app.state.health.readiness()
+        return JSONResponse(status_code=200 if ready else 503, content=body)
+
     app.include_router(router, prefix="/api")
 
     async with lifespan(app):
@@ -101,6 +161,26 @@ class TestHealth:
         assert resp.status_code == 200
         assert resp.json() == {"status": "ok"}
 
+    async def test_health_while_draining(self, app, client: httpx.AsyncClient):
+        await app.state.document_service.drain(timeout=1)
+        resp = await client.get("/health")
+        assert resp.status_code == 503
+        assert resp.json() == {"status": "draining"}
+
+    async def test_live_and_ready(self, client: httpx.AsyncClient):
+        resp = await client.get("/health/live")
+        assert resp.status_code == 200
+        resp = await client.get("/health/ready")
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "ok"
+
+    async def test_not_ready_while_draining(self, app, client: httpx.AsyncClient):
+        await app.state.document_service.drain(timeout=1)
+        assert (await client.get("/health/live")).status_code == 200
+        resp = await client.get("/health/ready")
+        assert resp.status_code == 503
+        assert resp.json()["status"] == "draining"
+
 
 class TestCreateDocument:
     async def test_create(self, client: httpx.AsyncClient):
@@ -144,6 +224,22 @@ class TestCreateDocument:
         resp = await client.post("/api/documents")
         assert resp.status_code == 422
 
+    async def test_create_with_profile(self, app, client: httpx.AsyncClient):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"profile": "accurate"}
+        )
+        assert resp.status_code == 201
+        assert resp.json()["conversion_profile"] == "accurate"
+        await _wait(app)
+        resp = await client.get(f"/api/documents/{resp.json()['id']}")
+        assert resp.json()["conversion_profile"] == "accurate"
+
+    async def test_create_invalid_profile(self, client: httpx.AsyncClient):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"profile": "turbo"}
+        )
+        assert resp.status_code == 422
+
 
 class TestListDocuments:
     async def test_empty(self, client: httpx.AsyncClient):
@@ -177,6 +273,43 @@ class TestListDocuments:
         assert body["total"] == 3
 
 
+class TestMetadataFilters:
+    async def _create(self, client, metadata):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"metadata": metadata}
+        )
+        return resp.json()["id"]
+
+    async def test_filter(self, client: httpx.AsyncClient):
+        doc_id = await self._create(client, '{"project": "alpha", "ref": "a:1"}')
+        await self._create(client, '{"project": "alpha"}')
+        await self._create(client, '{"project": "beta"}')
+
+        resp = await client.get("/api/documents", params={"meta": "project:alpha"})
+        assert resp.json()["total"] == 2
+
+        resp = await client.get(
+            "/api/documents", params={"meta": ["project:alpha", "ref:a:1"]}
+        )
+        assert resp.json()["total"] == 1
+        assert resp.json()["items"][0]["id"] == doc_id
+
+    async def test_invalid_filter(self, client: httpx.AsyncClient):
+        resp = await client.get("/api/documents", params={"meta": "project"})
+        assert resp.status_code == 422
+
+    async def test_facets(self, client: httpx.AsyncClient):
+        await self._create(client, '{"project": "alpha", "lang": "en"}')
+        await self._create(client, '{"project": "alpha"}')
+
+        resp = await client.get("/api/documents/facets")
+        assert resp.status_code == 200
+        assert resp.json() == {"facets": {"lang": {"en": 1}, "project": {"alpha": 2}}}
+
+        resp = await client.get("/api/documents/facets", params={"key": "lang"})
+        assert resp.json() == {"facets": {"lang": {"en": 1}}}
+
+
 class TestGetDocument:
     async def test_found(self, app, client: httpx.AsyncClient):
         create_resp = await client.post("/api/documents", files=_upload())
@@ -195,6 +328,17 @@ class TestGetDocument:
         assert resp.status_code == 200
         assert resp.json()["status"] in ("processing", "ready")
 
+    async def test_wait_returns_ready(self, client: httpx.AsyncClient):
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        resp = await client.get(f"/api/documents/{doc_id}", params={"wait": 5})
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "ready"
+
+    async def test_wait_out_of_range(self, client: httpx.AsyncClient):
+        resp = await client.get(f"/api/documents/{uuid4()}", params={"wait": 600})
+        assert resp.status_code == 422
+
     async def test_not_found(self, client: httpx.AsyncClient):
         resp = await client.get(f"/api/documents/{uuid4()}")
         assert resp.status_code == 404
@@ -242,6 +386,91 @@ class TestUpdateDocument:
         assert resp.status_code == 404
 
 
+class TestPatchDocument:
+    async def _create(self, app, client, metadata='{"author": "a", "lang": "en"}'):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"metadata": metadata}
+        )
+        await _wait(app)
+        return resp.json()["id"]
+
+    async def test_merge(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create(app, client)
+        resp = await client.patch(
+            f"/api/documents/{doc_id}",
+            json={"metadata": {"author": "b", "lang": None, "year": "2024"}},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["metadata"] == {"author": "b", "year": "2024"}
+        assert resp.json()["status"] == "ready"
+
+    async def test_replace(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create(app, client)
+        resp = await client.patch(
+            f"/api/documents/{doc_id}",
+            json={"metadata": {"year": "2024"}, "metadata_mode": "replace"},
+        )
+        assert resp.json()["metadata"] == {"year": "2024"}
+
+    async def test_replace_rejects_null(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create(app, client)
+        resp = await client.patch(
+            f"/api/documents/{doc_id}",
+            json={"metadata": {"year": None}, "metadata_mode": "replace"},
+        )
+        assert resp.status_code == 422
+
+    async def test_rename_keeps_original(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create(app, client)
+        converter = app.state.document_service._converter
+        calls = converter._converters[ConversionProfile.fast].convert.call_count
+
+        resp = await client.patch(
+            f"/api/documents/{doc_id}", json={"filename": "renamed.pdf"}
+        )
+        assert resp.json()["filename"] == "renamed.pdf"
+        assert resp.json()["metadata"] == {"author": "a", "lang": "en"}
+
+        original = await client.get(f"/api/documents/{doc_id}/original")
+        assert original.status_code == 200
+        assert original.content == b"pdf bytes"
+        assert "renamed.pdf" in original.headers["content-disposition"]
+        assert converter._converters[ConversionProfile.fast].convert.call_count == calls
+
+    @pytest.mark.parametrize("filename", ["", "a/b.pdf", "..", "a\\b"])
+    async def test_invalid_filename(self, app, client: httpx.AsyncClient, filename):
+        doc_id = await self._create(app, client)
+        resp = await client.patch(
+            f"/api/documents/{doc_id}", json={"filename": filename}
+        )
+        assert resp.status_code == 422
+
+    async def test_not_found(self, client: httpx.AsyncClient):
+        resp = await client.patch(
+            f"/api/documents/{uuid4()}", json={"metadata": {"a": "b"}}
+        )
+        assert resp.status_code == 404
+
+    async def test_bulk(self, app, client: httpx.AsyncClient):
+        ids = [await self._create(app, client) for _ in range(3)]
+        missing = str(uuid4())
+        resp = await client.patch(
+            "/api/documents",
+            json={"ids": [*ids, missing], "metadata": {"lang": "de"}},
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {"updated": 3, "not_found": [missing]}
+        for doc_id in ids:
+            doc = (await client.get(f"/api/documents/{doc_id}")).json()
+            assert doc["metadata"] == {"author": "a", "lang": "de"}
+
+    async def test_bulk_requires_ids(self, client: httpx.AsyncClient):
+        resp = await client.patch(
+            "/api/documents", json={"ids": [], "metadata": {"a": "b"}}
+        )
+        assert resp.status_code == 422
+
+
 class TestDeleteDocument:
     async def test_delete(self, app, client: httpx.AsyncClient):
         create_resp = await client.post("/api/documents", files=_upload())
@@ -260,6 +489,60 @@ class TestDeleteDocument:
         assert resp.status_code == 404
 
 
+class TestBulkDelete:
+    async def _create(self, app, client, metadata):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"metadata": metadata}
+        )
+        await _wait(app)
+        return resp.json()["id"]
+
+    async def test_by_ids(self, app, client: httpx.AsyncClient):
+        doc_ids = [await self._create(app, client, "{}") for _ in range(2)]
+        missing = str(uuid4())
+
+        resp = await client.post(
+            "/api/documents/delete", json={"ids": [*doc_ids, missing]}
+        )
+        assert resp.status_code == 202
+        assert resp.json() == {"deleted": 2, "not_found": [missing]}
+        assert (await client.get(f"/api/documents/{doc_ids[0]}")).status_code == 404
+        assert (await client.get("/api/documents")).json()["total"] == 0
+
+    async def test_by_metadata(self, app, client: httpx.AsyncClient):
+        kept = await self._create(app, client, '{"project": "b"}')
+        for _ in range(3):
+            await self._create(app, client, '{"project": "a"}')
+
+        resp = await client.post(
+            "/api/documents/delete", json={"metadata": {"project": "a"}}
+        )
+        assert resp.json() == {"deleted": 3, "not_found": []}
+        listed = (await client.get("/api/documents")).json()
+        assert [d["id"] for d in listed["items"]] == [kept]
+        facets = (await client.get("/api/documents/facets")).json()
+        assert facets["facets"] == {"project": {"b": 1}}
+
+    async def test_hidden_from_content(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create(app, client, "{}")
+        await client.post("/api/documents/delete", json={"ids": [doc_id]})
+        resp = await client.get(f"/api/documents/{doc_id}/content")
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            {},
+            {"ids": []},
+            {"metadata": {}},
+            {"ids": [str(uuid4())], "metadata": {"a": "b"}},
+        ],
+    )
+    async def test_needs_one_selector(self, client: httpx.AsyncClient, body):
+        resp = await client.post("/api/documents/delete", json=body)
+        assert resp.status_code == 422
+
+
 class TestGetDocumentContent:
     async def test_full_content(self, app, client: httpx.AsyncClient):
         create_resp = await client.post("/api/documents", files=_upload())
@@ -289,6 +572,94 @@ class TestGetDocumentContent:
         assert body["offset"] == 2
         assert body["length"] == 5
 
+    async def test_with_max_tokens(self, client: httpx.AsyncClient):
+        create_resp = await client.post(
+            "/api/documents",
+            files={"file": ("notes.md", b"# A\nOne.\n\nTwo words.", "text/markdown")},
+        )
+        doc_id = create_resp.json()["id"]
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content", params={"max_tokens": 5}
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["content"] == "# A\nOne.\n\n"
+        assert body["tokens"] == 4
+        assert body["next_offset"] == 10
+
+    async def test_invalid_max_tokens(self, app, client: httpx.AsyncClient):
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        await _wait(app)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content", params={"max_tokens": 0}
+        )
+        assert resp.status_code == 422
+
+    async def test_stream_markdown(self, app, client: httpx.AsyncClient):
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        await _wait(app)
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content",
+            params={"offset": 2},
+            headers={"Accept": "text/markdown"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "text/markdown; charset=utf-8"
+        assert resp.text == "Converted markdown"
+        assert "etag" in resp.headers
+
+    async def test_stream_ndjson(self, app, client: httpx.AsyncClient):
+        import json
+
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        await _wait(app)
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content",
+            params={"offset": 2, "limit": 9},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert lines == [{"offset": 2, "content": "Converted"}]
+
+    async def test_accept_quality_prefers_json(self, app, client: httpx.AsyncClient):
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        await _wait(app)
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content",
+            headers={"Accept": "text/markdown;q=0.5, application/json"},
+        )
+        assert resp.json()["content"] == "# Converted markdown"
+
+    async def test_stream_etag_differs_from_json(self, app, client: httpx.AsyncClient):
+        create_resp = await client.post("/api/documents", files=_upload())
+        doc_id = create_resp.json()["id"]
+        await _wait(app)
+
+        as_json = await client.get(f"/api/documents/{doc_id}/content")
+        as_markdown = await client.get(
+            f"/api/documents/{doc_id}/content", headers={"Accept": "text/markdown"}
+        )
+        assert as_json.headers["etag"] != as_markdown.headers["etag"]
+        assert as_markdown.headers["vary"] == "Accept"
+
+    async def test_stream_conflict_while_processing(self, client: httpx.AsyncClient):
+        resp = await client.post("/api/documents", files=_upload())
+        doc_id = resp.json()["id"]
+        content_resp = await client.get(
+            f"/api/documents/{doc_id}/content", headers={"Accept": "text/markdown"}
+        )
+        assert content_resp.status_code in (200, 409)
+
     async def test_not_found(self, client: httpx.AsyncClient):
         resp = await client.get(f"/api/documents/{uuid4()}/content")
         assert resp.status_code == 404
@@ -346,6 +717,34 @@ class TestGetDocumentOutline:
         assert h1["offset"] == 0
         assert h1["length"] == len(self._OUTLINE_MD)
 
+    async def test_depth_and_pagination(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create_with_markdown(app, client, self._OUTLINE_MD)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/outline",
+            params={"subtree": "Introduction", "max_depth": 1, "limit": 2},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [s["title"] for s in body["sections"]] == ["Introduction", "Background"]
+        assert body["sections"][0]["child_count"] == 2
+        assert body["total_sections"] == 3
+        assert body["next_offset"] == 2
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/outline",
+            params={"subtree": "Introduction", "max_depth": 1, "offset": 2},
+            headers={"If-None-Match": resp.headers["etag"]},
+        )
+        assert resp.status_code == 200
+        assert [s["title"] for s in resp.json()["sections"]] == ["Methods"]
+
+    async def test_unknown_subtree(self, app, client: httpx.AsyncClient):
+        doc_id = await self._create_with_markdown(app, client, self._OUTLINE_MD)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/outline", params={"subtree": "Nope"}
+        )
+        assert resp.status_code == 404
+
     async def test_not_found(self, client: httpx.AsyncClient):
         resp = await client.get(f"/api/documents/{uuid4()}/outline")
         assert resp.status_code == 404
@@ -367,6 +766,141 @@ class TestGetDocumentOutline:
             assert body["status"] == "processing"
 
 
+class TestGetDocumentSection:
+    _MD = "# Intro\nIntro text.\n## Background\nBackground text."
+
+    async def _ready_doc(self, app, client) -> str:
+        from uuid import UUID
+
+        resp = await client.post("/api/documents", files=_upload())
+        doc_id = resp.json()["id"]
+        await _wait(app)
+        app.state.document_service._storage.save_markdown(UUID(doc_id), self._MD)
+        return doc_id
+
+    async def test_by_heading_path(self, app, client: httpx.AsyncClient):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/section", params={"heading_path": "Background"}
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["heading_path"] == "Intro > Background"
+        assert body["content"] == "## Background\nBackground text."
+        assert "etag" in resp.headers
+
+    async def test_by_index_flat(self, app, client: httpx.AsyncClient):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/section", params={"index": 0, "mode": "flat"}
+        )
+        assert resp.json()["content"] == "# Intro\nIntro text.\n"
+
+    async def test_unknown_section(self, app, client: httpx.AsyncClient):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/section", params={"heading_path": "Nope"}
+        )
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize(
+        "params", [{}, {"heading_path": "Intro", "index": 0}, {"index": -1}]
+    )
+    async def test_needs_one_selector(self, app, client, params):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(f"/api/documents/{doc_id}/section", params=params)
+        assert resp.status_code == 422
+
+    async def test_not_found(self, client: httpx.AsyncClient):
+        resp = await client.get(
+            f"/api/documents/{uuid4()}/section", params={"index": 0}
+        )
+        assert resp.status_code == 404
+
+
+class TestGrepDocuments:
+    async def test_grep(self, app, client: httpx.AsyncClient):
+        resp = await client.post(
+            "/api/documents", files=_upload(), data={"metadata": '{"team": "x"}'}
+        )
+        doc_id = resp.json()["id"]
+        await _wait(app)
+
+        resp = await client.get(
+            "/api/documents/grep",
+            params={"pattern": "markdown", "meta": "team:x", "ignore_case": True},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["documents_scanned"] == 1
+        (match,) = body["matches"]
+        assert match["document_id"] == doc_id
+        assert match["heading_path"] == "Converted markdown"
+        assert match["line"] == 1
+
+    async def test_unknown_document(self, client: httpx.AsyncClient):
+        resp = await client.get(
+            "/api/documents/grep", params={"pattern": "x", "document_id": str(uuid4())}
+        )
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize(
+        "params", [{}, {"pattern": ""}, {"pattern": "(", "regex": True}]
+    )
+    async def test_invalid(self, client: httpx.AsyncClient, params):
+        resp = await client.get("/api/documents/grep", params=params)
+        assert resp.status_code == 422
+
+
+class TestChanges:
+    async def test_json_page(self, app, client: httpx.AsyncClient):
+        resp = await client.post("/api/documents", files=_upload())
+        doc_id = resp.json()["id"]
+        await _wait(app)
+
+        resp = await client.get("/api/changes", params={"limit": 1})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [c["operation"] for c in body["changes"]] == ["created"]
+        assert body["changes"][0]["document_id"] == doc_id
+        assert body["next_since"] == 1
+        assert body["last_seq"] == 2
+
+        resp = await client.get("/api/changes", params={"since": body["next_since"]})
+        assert [c["status"] for c in resp.json()["changes"]] == ["ready"]
+
+    async def test_ndjson_stream(self, app, client: httpx.AsyncClient):
+        for _ in range(3):
+            await client.post("/api/documents", files=_upload())
+        await _wait(app)
+
+        resp = await client.get(
+            "/api/changes",
+            params={"limit": 2},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert [line["seq"] for line in lines] == list(range(1, 7))
+
+    async def test_expired_cursor(self, app, client: httpx.AsyncClient):
+        from datetime import UTC, datetime, timedelta
+
+        for _ in range(2):
+            await client.post("/api/documents", files=_upload())
+        await _wait(app)
+        repo = app.state.document_service._repo
+        await repo.prune_changes(datetime.now(UTC) + timedelta(1))
+
+        resp = await client.get("/api/changes")
+        assert resp.status_code == 410
+        assert resp.json()["last_seq"] == 4
+        resp = await client.get(
+            "/api/changes", headers={"Accept": "application/x-ndjson"}
+        )
+        assert resp.status_code == 410
+
+
 class TestGetDocumentOriginal:
     async def test_original(self, app, client: httpx.AsyncClient):
         create_resp = await client.post("/api/documents", files=_upload())
@@ -382,3 +916,164 @@ class TestGetDocumentOriginal:
     async def test_not_found(self, client: httpx.AsyncClient):
         resp = await client.get(f"/api/documents/{uuid4()}/original")
         assert resp.status_code == 404
+
+
+class TestConditionalGet:
+    async def _ready_doc(self, app, client) -> str:
+        resp = await client.post("/api/documents", files=_upload())
+        await _wait(app)
+        return resp.json()["id"]
+
+    @pytest.mark.parametrize("suffix", ["", "/content", "/outline"])
+    async def test_etag_and_cache_control(self, app, client, suffix):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(f"/api/documents/{doc_id}{suffix}")
+        assert resp.status_code == 200
+        assert resp.headers["etag"].startswith('"')
+        assert resp.headers["cache-control"] == "no-cache"
+
+    @pytest.mark.parametrize("suffix", ["", "/content", "/outline"])
+    async def test_if_none_match_returns_304(self, app, client, suffix):
+        doc_id = await self._ready_doc(app, client)
+        first = await client.get(f"/api/documents/{doc_id}{suffix}")
+        etag = first.headers["etag"]
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}{suffix}", headers={"If-None-Match": etag}
+        )
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == etag
+
+    async def test_weak_and_listed_etags_match(self, app, client):
+        doc_id = await self._ready_doc(app, client)
+        etag = (await client.get(f"/api/documents/{doc_id}")).headers["etag"]
+        resp = await client.get(
+            f"/api/documents/{doc_id}",
+            headers={"If-None-Match": f'"other", W/{etag}'},
+        )
+        assert resp.status_code == 304
+
+    async def test_stale_etag_returns_full_response(self, app, client):
+        doc_id = await self._ready_doc(app, client)
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content", headers={"If-None-Match": '"stale"'}
+        )
+        assert resp.status_code == 200
+        assert resp.json()["content"] == "# Converted markdown"
+
+    async def test_content_etag_varies_with_range(self, app, client):
+        doc_id = await self._ready_doc(app, client)
+        full = await client.get(f"/api/documents/{doc_id}/content")
+        partial = await client.get(
+            f"/api/documents/{doc_id}/content", params={"offset": 2, "limit": 5}
+        )
+        assert full.headers["etag"] != partial.headers["etag"]
+
+    async def test_update_changes_etag(self, app, client):
+        doc_id = await self._ready_doc(app, client)
+        first = await client.get(f"/api/documents/{doc_id}/content")
+        before = first.headers["etag"]
+
+        await client.put(f"/api/documents/{doc_id}", files=_upload("new.pdf", b"new"))
+        await _wait(app)
+
+        resp = await client.get(
+            f"/api/documents/{doc_id}/content", headers={"If-None-Match": before}
+        )
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != before
+
+    async def test_304_does_not_read_markdown(self, app, client):
+        from unittest.mock import patch
+
+        doc_id = await self._ready_doc(app, client)
+        first = await client.get(f"/api/documents/{doc_id}/content")
+        etag = first.headers["etag"]
+
+        storage = app.state.document_service._storage
+        with patch.object(
+            storage, "read_markdown", side_effect=AssertionError("read markdown")
+        ):
+            resp = await client.get(
+                f"/api/documents/{doc_id}/content", headers={"If-None-Match": etag}
+            )
+        assert resp.status_code == 304
+
+
+class TestUploads:
+    async def test_resumable_upload(self, client: httpx.AsyncClient, app: FastAPI):
+        resp = await client.post(
+            "/api/uploads",
+            json={
+                "filename": "big.pdf",
+                "content_type": "application/pdf",
+                "size_bytes": 6,
+                "metadata": {"author": "tester"},
+            },
+        )
+        assert resp.status_code == 201
+        upload_id = resp.json()["id"]
+        assert resp.json()["offset"] == 0
+
+        resp = await client.put(
+            f"/api/uploads/{upload_id}", params={"offset": 0}, content=b"abc"
+        )
+        assert resp.status_code == 200
+        assert resp.json()["offset"] == 3
+
+        resp = await client.put(
+            f"/api/uploads/{upload_id}", params={"offset": 0}, content=b"abc"
+        )
+        assert resp.status_code == 409
+        assert resp.json()["offset"] == 3
+
+        resp = await client.get(f"/api/uploads/{upload_id}")
+        offset = resp.json()["offset"]
+        await client.put(
+            f"/api/uploads/{upload_id}", params={"offset": offset}, content=b"def"
+        )
+
+        resp = await client.post(f"/api/uploads/{upload_id}/complete")
+        assert resp.status_code == 201
+        doc = resp.json()
+        assert doc["id"] == upload_id
+        assert doc["size_bytes"] == 6
+        assert doc["metadata"] == {"author": "tester"}
+
+        resp = await client.get(f"/api/documents/{upload_id}/original")
+        assert resp.content == b"abcdef"
+        resp = await client.get(f"/api/uploads/{upload_id}")
+        assert resp.status_code == 404
+        await _wait(app)
+
+    async def test_complete_incomplete_upload(self, client: httpx.AsyncClient):
+        resp = await client.post(
+            "/api/uploads", json={"filename": "big.pdf", "size_bytes": 10}
+        )
+        upload_id = resp.json()["id"]
+        resp = await client.post(f"/api/uploads/{upload_id}/complete")
+        assert resp.status_code == 409
+        assert resp.json()["offset"] == 0
+
+    async def test_abort(self, client: httpx.AsyncClient):
+        resp = await client.post("/api/uploads", json={"filename": "big.pdf"})
+        upload_id = resp.json()["id"]
+        resp = await client.delete(f"/api/uploads/{upload_id}")
+        assert resp.status_code == 204
+        resp = await client.put(
+            f"/api/uploads/{upload_id}", params={"offset": 0}, content=b"abc"
+        )
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize("filename", ["../x.pdf", "a/b.pdf", "a\\b.pdf", ".."])
+    async def test_rejects_path_in_filename(
+        self, client: httpx.AsyncClient, filename: str
+    ):
+        resp = await client.post("/api/uploads", json={"filename": filename})
+        assert resp.status_code == 422
+
+    async def test_offset_required(self, client: httpx.AsyncClient):
+        resp = await client.post("/api/uploads", json={"filename": "big.pdf"})
+        resp = await client.put(f"/api/uploads/{resp.json()['id']}", content=b"a")
+        assert resp.status_code == 422
@@ -0,0 +1,61 @@
+import asyncio
+from unittest.mock import patch
+from uuid import uuid4
+
+from docfabric.cli import main
+from docfabric.storage import FileStorage, shard_prefix
+
+
+class TestMigrateStorage:
+    def test_moves_flat_store(self, tmp_path, capsys):
+        doc_id = uuid4()
+        FileStorage(tmp_path, shard_depth=0).save_markdown(doc_id, "# Title")
+
+        args = ["--storage-path", str(tmp_path), "migrate-storage"]
+        assert main([*args, "--shard-depth", "1"]) == 0
+
+        path = tmp_path / "markdown" / shard_prefix(doc_id, 1) / f"{doc_id}.md"
+        assert path.read_text() == "# Title"
+        assert "Moved 1 entries" in capsys.readouterr().out
+
+
+class TestVerify:
+    async def test_reports_torn_markdown(self, tmp_path, monkeypatch, capsys):
+        from docfabric.db.engine import create_engine, init_db
+        from docfabric.db.repository import DocumentRepository
+
+        monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'db'}")
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'db'}")
+        await init_db(engine)
+        doc_id = uuid4()
+        await DocumentRepository(engine).insert(
+            id=doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+            metadata={},
+            content_sha256="0" * 64,
+        )
+        await engine.dispose()
+        FileStorage(tmp_path).save_markdown(doc_id, "# Trunc")
+
+        with patch("docfabric.conversion.converter.DocumentConverter"):
+            code = await asyncio.to_thread(
+                main, ["--storage-path", str(tmp_path), "verify"]
+            )
+        assert code == 1
+        assert f"Torn or missing markdown: {doc_id}" in capsys.readouterr().out
+
+
+class TestReconcile:
+    def test_reports_and_removes_orphans(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'db'}")
+        orphan = uuid4()
+        FileStorage(tmp_path).save_markdown(orphan, "# Orphan")
+        args = ["--storage-path", str(tmp_path), "reconcile", "--grace", "0"]
+
+        with patch("docfabric.conversion.converter.DocumentConverter"):
+            assert main(args) == 1
+            assert f"Orphaned files: {orphan}" in capsys.readouterr().out
+            assert main([*args, "--repair"]) == 0
+        assert not FileStorage(tmp_path).has_markdown(orphan)
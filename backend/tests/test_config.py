@@ -17,3 +17,12 @@ class TestSettings:
         settings = Settings(_env_file=None)
         assert settings.database_url == "sqlite+aiosqlite:///custom.db"
         assert settings.storage_path == Path("/tmp/docs")
+
+    def test_conversion_pool_settings(self, monkeypatch):
+        monkeypatch.setenv("CONVERSION_WORKERS", "8")
+        monkeypatch.setenv("CONVERSION_SPLIT_PAGES", "200")
+        monkeypatch.setenv("CONVERSION_RANGE_PAGES", "50")
+        settings = Settings(_env_file=None)
+        assert settings.conversion_workers == 8
+        assert settings.conversion_split_pages == 200
+        assert settings.conversion_range_pages == 50
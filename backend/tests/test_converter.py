@@ -1,6 +1,12 @@
 from unittest.mock import MagicMock, patch
 
-from docfabric.conversion.converter import MarkdownConverter
+from docfabric.conversion.converter import (
+    MarkdownConverter,
+    _pipeline_options,
+    estimate_pages,
+    inspect_pdf,
+)
+from docfabric.models.document import ConversionProfile
 
 
 class TestMarkdownConverter:
@@ -35,3 +41,185 @@ class TestMarkdownConverter:
                 assert False, "Should have raised"
             except RuntimeError as e:
                 assert "parse error" in str(e)
+
+    def test_convert_document_reports_page_count(self, tmp_path):
+        test_file = tmp_path / "test.pdf"
+        test_file.write_bytes(b"fake pdf content")
+
+        mock_result = MagicMock()
+        mock_result.document.export_to_markdown.return_value = "# Converted"
+        mock_result.document.pages = {1: object(), 2: object()}
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            mock_dc_class.return_value.convert.return_value = mock_result
+            converter = MarkdownConverter()
+            converted = converter.convert_document(test_file)
+
+        assert converted.markdown == "# Converted"
+        assert converted.page_count == 2
+
+
+def _paged_docling(mock_dc_class, calls: list, label: str = "v1") -> None:
+    """Fake docling that renders each page as a heading naming the page."""
+
+    def convert(source, page_range=None):
+        calls.append(page_range)
+        result = MagicMock()
+        result.document.export_to_markdown.side_effect = lambda page_no=None: (
+            f"# Page {page_no} {label}\n"
+        )
+        return result
+
+    mock_dc_class.return_value.convert.side_effect = convert
+
+
+class TestPagedConversion:
+    def test_pdf_is_converted_per_page(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf(["one", "two", "three"]))
+        calls = []
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            _paged_docling(mock_dc_class, calls)
+            converted = MarkdownConverter().convert_document(test_file)
+
+        assert calls == [(1, 3)]
+        assert converted.markdown == "# Page 1 v1\n\n# Page 2 v1\n\n# Page 3 v1"
+        assert converted.page_count == 3
+        assert converted.reused_pages == 0
+        assert len({p.hash for p in converted.pages}) == 3
+
+    def test_only_changed_pages_are_reconverted(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf(["one", "two", "three", "four"]))
+        calls = []
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            _paged_docling(mock_dc_class, calls)
+            converter = MarkdownConverter()
+            first = converter.convert_document(test_file)
+
+            test_file.write_bytes(make_pdf(["ONE", "two", "THREE", "four"]))
+            calls.clear()
+            _paged_docling(mock_dc_class, calls, label="v2")
+            previous = {p.hash: p.markdown for p in first.pages}
+            second = converter.convert_document(test_file, previous=previous)
+
+        assert calls == [(1, 1), (3, 3)]
+        assert second.reused_pages == 2
+        assert second.markdown == (
+            "# Page 1 v2\n\n# Page 2 v1\n\n# Page 3 v2\n\n# Page 4 v1"
+        )
+
+    def test_page_hash_ignores_other_pages(self, tmp_path, make_pdf):
+        a = tmp_path / "a.pdf"
+        b = tmp_path / "b.pdf"
+        a.write_bytes(make_pdf(["one", "two"]))
+        b.write_bytes(make_pdf(["zero", "one", "two"]))
+        assert inspect_pdf(b).page_hashes[1:] == inspect_pdf(a).page_hashes
+
+    def test_inspect_non_pdf(self, tmp_path):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(b"not a pdf")
+        assert inspect_pdf(test_file) is None
+
+    def test_large_pdf_is_split_into_concurrent_ranges(self, tmp_path, make_pdf):
+        import threading
+
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf([f"page {i}" for i in range(7)]))
+        calls = []
+        threads = set()
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            _paged_docling(mock_dc_class, calls)
+            original = mock_dc_class.return_value.convert.side_effect
+
+            def convert(source, page_range=None):
+                threads.add(threading.current_thread().name)
+                return original(source, page_range=page_range)
+
+            mock_dc_class.return_value.convert.side_effect = convert
+            converter = MarkdownConverter(workers=3, split_pages=4, range_pages=3)
+            converted = converter.convert_document(test_file)
+            converter.close()
+
+        assert sorted(calls) == [(1, 3), (4, 6), (7, 7)]
+        assert all(name.startswith("docling") for name in threads)
+        assert converted.markdown == "\n\n".join(f"# Page {n} v1" for n in range(1, 8))
+
+    def test_small_pdf_is_not_split(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf(["one", "two", "three"]))
+        calls = []
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            _paged_docling(mock_dc_class, calls)
+            converter = MarkdownConverter(workers=3, split_pages=4, range_pages=1)
+            converter.convert_document(test_file)
+            converter.close()
+
+        assert calls == [(1, 3)]
+
+
+_TEXT_PAGE = "A born-digital page with a usable text layer"
+
+
+class TestConversionProfiles:
+    def _convert(self, test_file, **kwargs):
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            _paged_docling(mock_dc_class, [])
+            converter = MarkdownConverter(
+                default_profile=kwargs.pop("default", ConversionProfile.auto)
+            )
+            return converter.convert_document(test_file, **kwargs)
+
+    def test_text_layer_pdf_skips_ocr(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf([_TEXT_PAGE, _TEXT_PAGE]))
+        assert inspect_pdf(test_file).has_text_layer
+        assert self._convert(test_file).profile is ConversionProfile.fast
+
+    def test_pdf_without_text_layer_uses_balanced(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf([_TEXT_PAGE, "", ""]))
+        assert not inspect_pdf(test_file).has_text_layer
+        assert self._convert(test_file).profile is ConversionProfile.balanced
+
+    def test_explicit_profile_wins(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf([_TEXT_PAGE]))
+        converted = self._convert(test_file, profile=ConversionProfile.accurate)
+        assert converted.profile is ConversionProfile.accurate
+
+    def test_configured_default_profile(self, tmp_path):
+        test_file = tmp_path / "doc.docx"
+        test_file.write_bytes(b"not a pdf")
+        converted = self._convert(test_file, default=ConversionProfile.fast)
+        assert converted.profile is ConversionProfile.fast
+
+    def test_pages_are_not_reused_across_profiles(self, tmp_path, make_pdf):
+        test_file = tmp_path / "doc.pdf"
+        test_file.write_bytes(make_pdf(["one", "two"]))
+        first = self._convert(test_file, profile=ConversionProfile.fast)
+        previous = {p.hash: p.markdown for p in first.pages}
+        second = self._convert(
+            test_file, profile=ConversionProfile.accurate, previous=previous
+        )
+        assert second.reused_pages == 0
+
+    def test_pipeline_options(self):
+        assert _pipeline_options(ConversionProfile.fast).do_ocr is False
+        accurate = _pipeline_options(ConversionProfile.accurate)
+        assert accurate.ocr_options.force_full_page_ocr is True
+        assert _pipeline_options(ConversionProfile.balanced).do_ocr is True
+
+
+class TestEstimatePages:
+    def test_non_pdf_is_estimated_from_size(self, tmp_path):
+        path = tmp_path / "a.docx"
+        path.write_bytes(b"x" * 120_000)
+        assert estimate_pages(path, "application/octet-stream") == 2
+
+    def test_missing_file_counts_as_one_page(self, tmp_path):
+        assert estimate_pages(tmp_path / "gone.pdf", "application/pdf") == 1
@@ -0,0 +1,44 @@
+import asyncio
+from uuid import uuid4
+
+from docfabric.service.events import StatusEvents
+
+
+class TestStatusEvents:
+    async def test_publish_resolves_subscribers(self):
+        events = StatusEvents()
+        doc_id = uuid4()
+        with events.subscribe(doc_id) as first, events.subscribe(doc_id) as second:
+            events.publish(doc_id, "ready")
+            assert await first == "ready"
+            assert await second == "ready"
+
+    async def test_publish_other_document_does_not_resolve(self):
+        events = StatusEvents()
+        doc_id = uuid4()
+        with events.subscribe(doc_id) as waiter:
+            events.publish(uuid4(), "ready")
+            assert not waiter.done()
+
+    async def test_publish_without_subscribers(self):
+        StatusEvents().publish(uuid4(), "ready")
+
+    async def test_unsubscribe_on_exit(self):
+        events = StatusEvents()
+        doc_id = uuid4()
+        with events.subscribe(doc_id) as waiter:
+            pass
+        assert events._waiters == {}
+        events.publish(doc_id, "ready")
+        assert not waiter.done()
+
+    async def test_cancelled_waiter_is_skipped(self):
+        events = StatusEvents()
+        doc_id = uuid4()
+        with events.subscribe(doc_id) as waiter:
+            try:
+                await asyncio.wait_for(waiter, 0.01)
+            except TimeoutError:
+                pass
+            events.publish(doc_id, "ready")
+            assert waiter.cancelled()
@@ -0,0 +1,113 @@
+import re
+import time
+
+import pytest
+
+from docfabric.service.grep import compile_pattern, scan
+
+_MD = """\
+# Contract
+Clause 7.2: the supplier pays.
+## Fees
+Überweisung per Clause 9.
+Error E-1042 raised."""
+
+
+def _scan(pattern, **kwargs):
+    compiled = compile_pattern(
+        pattern,
+        regex=kwargs.pop("regex", False),
+        ignore_case=kwargs.pop("ignore_case", False),
+    )
+    kwargs.setdefault("limit", 100)
+    return scan(_MD.encode(), compiled, **kwargs)
+
+
+class TestScan:
+    def test_literal_offsets_are_characters(self):
+        hits, timed_out = _scan("Clause 9")
+        assert not timed_out
+        (hit,) = hits
+        assert hit.offset == _MD.index("Clause 9")
+        assert hit.length == len("Clause 9")
+        assert hit.line == 4
+        assert hit.text == "Überweisung per Clause 9."
+
+    def test_literal_is_matched_on_bytes(self):
+        assert isinstance(compile_pattern("Clause").pattern, bytes)
+        assert isinstance(compile_pattern("ü", ignore_case=True).pattern, str)
+
+    def test_regex_and_ignore_case(self):
+        hits, _ = _scan(r"clause \d+\.?\d*", regex=True, ignore_case=True)
+        assert [h.line for h in hits] == [2, 4]
+        assert _MD[hits[0].offset :].startswith("Clause 7.2")
+
+    def test_non_ascii_ignore_case(self):
+        hits, _ = _scan("ÜBERWEISUNG", ignore_case=True)
+        assert [h.offset for h in hits] == [_MD.index("Überweisung")]
+
+    def test_regex_anchors_match_lines(self):
+        hits, _ = _scan(r"^#+ \w+$", regex=True)
+        assert [h.text for h in hits] == ["# Contract", "## Fees"]
+
+    def test_context_lines(self):
+        (hit,), _ = _scan("E-1042", context=1)
+        assert hit.text == "Überweisung per Clause 9.\nError E-1042 raised."
+
+    def test_limit(self):
+        hits, _ = _scan("e", limit=3)
+        assert len(hits) == 3
+
+    def test_deadline(self):
+        hits, timed_out = _scan("e", deadline=time.monotonic() - 1)
+        assert hits == []
+        assert timed_out
+
+    def test_invalid_regex(self):
+        with pytest.raises(re.error):
+            compile_pattern("(", regex=True)
+
+    @pytest.mark.parametrize(
+        "pattern", [r"^#+ [A-Z][a-z]+$", r"E-[0-9]{4}", r"(?:ab|cd){2}"]
+    )
+    def test_byte_safe_regex_is_matched_on_bytes(self, pattern):
+        assert isinstance(compile_pattern(pattern, regex=True).pattern, bytes)
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [r"E-\d{4}", r"a.b", r"[^a]", r"\bx", "ü+", r"caf\xe9", r"[\x80-\xff]"],
+    )
+    def test_character_regex_is_matched_on_text(self, pattern):
+        assert isinstance(compile_pattern(pattern, regex=True).pattern, str)
+
+    def test_byte_regex_offsets_are_characters(self):
+        (hit,), _ = _scan(r"Clause [0-9]\.$", regex=True)
+        assert hit.offset == _MD.index("Clause 9")
+        assert hit.line == 4
+
+    def test_escaped_non_ascii_matches_characters(self):
+        data = "café 陈 naïve".encode()
+        (hit,), _ = scan(data, compile_pattern(r"caf\xe9", regex=True), limit=10)
+        assert (hit.offset, hit.length) == (0, 4)
+        hits, _ = scan(data, compile_pattern(r"[\x80-\xff]", regex=True), limit=10)
+        assert [h.offset for h in hits] == [3, 9]
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [
+            r"(a+)+$",
+            r"(\w*\s?)*x",
+            r"(a|a)*b",
+            r"(a|aa)*c",
+            r"(?:a|a)+$",
+            r"(a)\1",
+            r"(a)?(?(1)b|c)",
+            "a" * 1001,
+        ],
+    )
+    def test_refuses_backtracking_hazards(self, pattern):
+        with pytest.raises(re.error):
+            compile_pattern(pattern, regex=True)
+
+    def test_fixed_repeats_may_nest(self):
+        compile_pattern(r"(\d{4}-){2,}", regex=True)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from docfabric.conversion.converter import MarkdownConverter
+from docfabric.db.repository import DocumentRepository
+from docfabric.health import HealthMonitor, ReadinessLimits
+from docfabric.service.document import DocumentService
+from docfabric.service.scheduler import ConversionScheduler
+from docfabric.storage import FileStorage
+
+
+@pytest.fixture
+def make_monitor(engine: AsyncEngine, tmp_path):
+    from unittest.mock import patch
+
+    with patch("docfabric.conversion.converter.DocumentConverter"):
+        converter = MarkdownConverter()
+
+    def make(limits=None, scheduler=None):
+        scheduler = scheduler or ConversionScheduler()
+        repository = DocumentRepository(engine)
+        service = DocumentService(
+            repository=repository,
+            storage=FileStorage(tmp_path),
+            converter=converter,
+            scheduler=scheduler,
+        )
+        return HealthMonitor(service, scheduler, repository, tmp_path, limits)
+
+    return make
+
+
+def _block_loop(seconds: float) -> None:
+    # Stands in for blocking work run on the event loop by mistake.
+    time.sleep(seconds)
+
+
+class TestHealthMonitor:
+    async def test_ready_when_idle(self, make_monitor):
+        ready, body = await make_monitor(ReadinessLimits(min_free_bytes=0)).readiness()
+        assert ready
+        assert body["status"] == "ok"
+        assert set(body["checks"]) == {
+            "conversion_queue",
+            "conversion_backlog_seconds",
+            "db_latency_seconds",
+            "storage_free_bytes",
+            "event_loop_lag_seconds",
+        }
+        assert all(check["ok"] for check in body["checks"].values())
+
+    async def test_conversion_backlog(self, make_monitor):
+        scheduler = ConversionScheduler(slots=1)
+        for pages in (10, 20, 30):
+            scheduler.submit(uuid4(), profile="auto", pages=pages)
+        limits = ReadinessLimits(max_queued=1, max_backlog_seconds=30, min_free_bytes=0)
+        ready, body = await make_monitor(limits, scheduler).readiness()
+        assert not ready
+        assert body["status"] == "overloaded"
+        assert body["checks"]["conversion_queue"] == {
+            "ok": False,
+            "value": 2,
+            "limit": 1,
+        }
+        backlog = body["checks"]["conversion_backlog_seconds"]
+        assert not backlog["ok"]
+        assert backlog["value"] == pytest.approx(60, abs=1)
+
+    async def test_storage_free_space(self, make_monitor):
+        limits = ReadinessLimits(min_free_bytes=2**62)
+        ready, body = await make_monitor(limits).readiness()
+        assert not ready
+        assert not body["checks"]["storage_free_bytes"]["ok"]
+
+    async def test_slow_database(self, make_monitor):
+        limits = ReadinessLimits(max_db_latency=0, min_free_bytes=0)
+        ready, body = await make_monitor(limits).readiness()
+        assert not ready
+        assert body["checks"]["db_latency_seconds"]["value"] is None
+
+    async def test_database_error(self, make_monitor):
+        from unittest.mock import patch
+
+        from sqlalchemy.exc import OperationalError
+
+        monitor = make_monitor(ReadinessLimits(min_free_bytes=0))
+        error = OperationalError("SELECT 1", {}, Exception("database is locked"))
+        with patch.object(monitor._repo, "ping", side_effect=error):
+            ready, body = await monitor.readiness()
+        assert not ready
+        assert body["checks"]["db_latency_seconds"]["value"] is None
+
+    async def test_draining(self, make_monitor):
+        monitor = make_monitor(ReadinessLimits(min_free_bytes=0))
+        await monitor._service.drain(timeout=1)
+        ready, body = await monitor.readiness()
+        assert not ready
+        assert body["status"] == "draining"
+
+    async def test_event_loop_lag(self, make_monitor):
+        monitor = make_monitor()
+        task = asyncio.create_task(monitor.run(interval=0.01))
+        await asyncio.sleep(0)
+        _block_loop(0.1)
+        await asyncio.sleep(0.001)
+        task.cancel()
+        assert monitor.loop_lag >= 0.05
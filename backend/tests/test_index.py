@@ -0,0 +1,130 @@
+import pytest
+
+from docfabric.conversion.index import INDEX_VERSION, MarkdownIndex
+from docfabric.conversion.tokenizer import ApproximateTokenizer, create_tokenizer
+
+_MD = """\
+# Title
+Intro paragraph with a few words.
+
+Second paragraph is here.
+
+## Section
+Section body text.
+
+Closing words."""
+
+
+class TestApproximateTokenizer:
+    def test_counts_words_and_punctuation(self):
+        assert ApproximateTokenizer().count("Hi, you!") == 4
+
+    def test_splits_long_words(self):
+        assert ApproximateTokenizer().count("internationalization") == 5
+
+    def test_create_by_name(self):
+        assert create_tokenizer("approximate").name == "approximate"
+
+    def test_create_unknown(self):
+        with pytest.raises(ValueError):
+            create_tokenizer("nope")
+
+
+class TestMarkdownIndex:
+    def test_blocks_start_at_headings_and_paragraphs(self):
+        index = MarkdownIndex.build(_MD, ApproximateTokenizer())
+        starts = [_MD[o : o + 8] for o in index.offsets]
+        assert starts == ["# Title\n", "Second p", "## Secti", "Closing "]
+        assert index.sections == [True, False, True, False]
+        assert index.total_length == len(_MD)
+
+    def test_block_tokens_sum_to_document(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        assert sum(index.tokens) == tokenizer.count(_MD)
+
+    def test_leading_blank_lines_belong_to_first_block(self):
+        index = MarkdownIndex.build("\n\nText", ApproximateTokenizer())
+        assert index.offsets == [0]
+
+    def test_roundtrip(self):
+        index = MarkdownIndex.build(_MD, ApproximateTokenizer())
+        assert MarkdownIndex.from_dict(index.to_dict()) == index
+
+    def test_headings_and_paths(self):
+        index = MarkdownIndex.build(_MD, ApproximateTokenizer())
+        assert index.headings == [(0, 1, "Title"), (_MD.index("## "), 2, "Section")]
+        assert index.heading_paths() == ["Title", "Title > Section"]
+        assert index.section_end(0) == _MD.index("## ")
+        assert index.section_end(0, nested=True) == len(_MD)
+
+    def test_heading_path_and_heading_at(self):
+        md = "intro\n# A\n## B\n### C\n## D\ntext"
+        index = MarkdownIndex.build(md, ApproximateTokenizer())
+        assert [index.heading_path(i) for i in range(4)] == index.heading_paths()
+        assert index.heading_at(0) is None
+        assert index.heading_at(md.index("text")) == 3
+
+    def test_tree_matches_section_end(self):
+        md = "# A\n## B\n### C\n## D\n# E\ntext"
+        index = MarkdownIndex.build(md, ApproximateTokenizer())
+        parents, ends = index.tree()
+        assert parents == [None, 0, 1, 0, None]
+        assert ends == [index.section_end(i, nested=True) for i in range(5)]
+
+    def test_find_heading_by_full_path_or_suffix(self):
+        index = MarkdownIndex.build(_MD, ApproximateTokenizer())
+        assert index.find_heading("Title > Section") == 1
+        assert index.find_heading("Section") == 1
+        assert index.find_heading("Title") == 0
+        assert index.find_heading("ection") is None
+
+    def test_from_dict_rejects_other_version(self):
+        data = MarkdownIndex.build(_MD, ApproximateTokenizer()).to_dict()
+        data["version"] = INDEX_VERSION + 1
+        assert MarkdownIndex.from_dict(data) is None
+
+    def test_slice_whole_document_when_budget_allows(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        end, tokens = index.slice(_MD, 0, 10_000, tokenizer)
+        assert end == len(_MD)
+        assert tokens == sum(index.tokens)
+
+    def test_slice_ends_on_block_boundary(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        budget = index.tokens[0] + 1
+        end, tokens = index.slice(_MD, 0, budget, tokenizer)
+        assert end == index.offsets[1]
+        assert tokens == index.tokens[0]
+
+    def test_slice_prefers_section_boundary(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        budget = index.tokens[0] + index.tokens[1] + index.tokens[2]
+        end, _ = index.slice(_MD, 0, budget, tokenizer)
+        # Stopping before "Closing words." would split the section; the
+        # slice ends where "## Section" starts instead.
+        assert end == index.offsets[2]
+
+    def test_slice_cuts_oversized_block_at_whitespace(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        end, tokens = index.slice(_MD, 0, 4, tokenizer)
+        assert 0 < end < index.offsets[1]
+        assert tokens <= 4
+        assert _MD[end - 1] in " \n"
+
+    def test_slice_from_middle_of_block(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        start = index.offsets[1] + 7
+        end, tokens = index.slice(_MD, start, 10_000, tokenizer)
+        assert end == len(_MD)
+        assert tokens == tokenizer.count(_MD[start:])
+
+    def test_slice_past_end(self):
+        tokenizer = ApproximateTokenizer()
+        index = MarkdownIndex.build(_MD, tokenizer)
+        assert index.slice(_MD, len(_MD), 10, tokenizer) == (len(_MD), 0)
@@ -21,7 +21,7 @@ def _parse_tool_result(result) -> dict:
 
 @pytest.fixture
 async def mcp_env(tmp_path):
-    engine = create_engine("sqlite+aiosqlite://")
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
     await init_db(engine)
 
     storage = FileStorage(tmp_path)
@@ -44,6 +44,7 @@ async def mcp_env(tmp_path):
 
     yield mcp, service
 
+    await service._wait_pending()
     await engine.dispose()
 
 
@@ -88,6 +89,8 @@ class TestListTools:
             "get_document_info",
             "read_document_content",
             "get_document_outline",
+            "read_section",
+            "grep_documents",
         }
 
 
@@ -134,6 +137,22 @@ class TestListDocuments:
         data = _parse_tool_result(result)
         assert len(data["items"]) == 1
 
+    async def test_metadata_filter(self, mcp_client: Client, service):
+        await service.create(
+            filename="a.pdf",
+            content_type="application/pdf",
+            data=b"pdf bytes",
+            metadata={"project": "alpha"},
+        )
+        await _create_doc(service, "b.pdf")
+
+        result = await mcp_client.call_tool(
+            "list_documents", {"metadata": {"project": "alpha"}}
+        )
+        data = _parse_tool_result(result)
+        assert data["total"] == 1
+        assert data["items"][0]["filename"] == "a.pdf"
+
 
 class TestGetDocumentInfo:
     async def test_found(self, mcp_client: Client, service):
@@ -178,6 +197,19 @@ class TestReadDocumentContent:
         assert text.startswith("Conve")
         assert "[offset=2 length=5 total=20]" in text
 
+    async def test_max_tokens_footer_has_tokens_and_next_offset(
+        self, mcp_client: Client, service
+    ):
+        doc_id = await _create_doc_with_markdown(
+            service, "# A\nOne.\n\nTwo words here."
+        )
+        result = await mcp_client.call_tool(
+            "read_document_content", {"document_id": doc_id, "max_tokens": 5}
+        )
+        text = result.content[0].text
+        assert text.startswith("# A\nOne.\n\n")
+        assert "[offset=0 length=10 total=25 tokens=4 next_offset=10]" in text
+
     async def test_full_content_has_no_metadata_footer(
         self, mcp_client: Client, service
     ):
@@ -238,7 +270,15 @@ class TestGetDocumentOutline:
         assert data["total_length"] == len(_OUTLINE_MD)
 
         for s in sections:
-            assert set(s.keys()) == {"level", "title", "heading_path", "offset", "length"}
+            assert set(s.keys()) == {
+                "level",
+                "title",
+                "heading_path",
+                "offset",
+                "length",
+                "child_count",
+                "subtree_length",
+            }
 
         assert sections[0]["title"] == "Introduction"
         assert sections[0]["level"] == 1
@@ -321,6 +361,35 @@ class TestGetDocumentOutline:
         assert data["sections"] == []
         assert data["total_length"] == 16
 
+    async def test_drill_down(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        top = _parse_tool_result(
+            await mcp_client.call_tool(
+                "get_document_outline",
+                {"document_id": doc_id, "max_depth": 1, "limit": 1},
+            )
+        )
+        assert [s["title"] for s in top["sections"]] == ["Introduction"]
+        assert top["sections"][0]["child_count"] == 2
+        assert top["next_offset"] is None
+
+        sub = _parse_tool_result(
+            await mcp_client.call_tool(
+                "get_document_outline",
+                {"document_id": doc_id, "subtree": "Background", "limit": 1},
+            )
+        )
+        assert [s["title"] for s in sub["sections"]] == ["Background"]
+        assert sub["total_sections"] == 2
+        assert sub["next_offset"] == 1
+
+    async def test_unknown_subtree(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "get_document_outline", {"document_id": doc_id, "subtree": "Nope"}
+        )
+        assert "not found" in _parse_tool_result(result)["error"]
+
     async def test_not_found(self, mcp_client: Client):
         with pytest.raises(ToolError, match="not found"):
             await mcp_client.call_tool(
@@ -342,3 +411,68 @@ class TestGetDocumentOutline:
         else:
             # Background task already completed
             assert "sections" in data
+
+
+class TestReadSection:
+    async def test_by_heading_path(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "read_section", {"document_id": doc_id, "heading_path": "Methods"}
+        )
+        assert result.content[0].text == "## Methods\nMethods text."
+
+    async def test_by_index(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "read_section", {"document_id": doc_id, "index": 0, "mode": "flat"}
+        )
+        assert result.content[0].text == "# Introduction\nIntro text.\n"
+
+    async def test_truncated_has_next_offset_footer(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "read_section",
+            {"document_id": doc_id, "heading_path": "Introduction", "max_tokens": 5},
+        )
+        text = result.content[0].text
+        assert text.startswith("# Introduction")
+        assert "next_offset=" in text
+
+    async def test_unknown_section_points_to_outline(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "read_section", {"document_id": doc_id, "heading_path": "Nope"}
+        )
+        assert "get_document_outline" in result.content[0].text
+
+    async def test_needs_one_selector(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool("read_section", {"document_id": doc_id})
+        assert "exactly one" in result.content[0].text
+
+
+class TestGrepDocuments:
+    async def test_match_feeds_read_section(self, mcp_client: Client, service):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await mcp_client.call_tool(
+            "grep_documents", {"pattern": "Detail text", "document_id": doc_id}
+        )
+        data = _parse_tool_result(result)
+        (match,) = data["matches"]
+        assert match["offset"] == _OUTLINE_MD.index("Detail text")
+
+        section = await mcp_client.call_tool(
+            "read_section",
+            {"document_id": doc_id, "heading_path": match["heading_path"]},
+        )
+        assert section.content[0].text == "### Details\nDetail text.\n"
+
+    async def test_empty_pattern(self, mcp_client: Client):
+        with pytest.raises(ToolError, match="must not be empty"):
+            await mcp_client.call_tool("grep_documents", {"pattern": ""})
+
+    async def test_invalid_pattern(self, mcp_client: Client):
+        result = await mcp_client.call_tool(
+            "grep_documents", {"pattern": "(", "regex": True}
+        )
+        assert "Invalid pattern" in _parse_tool_result(result)["error"]
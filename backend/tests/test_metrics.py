@@ -0,0 +1,158 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from docfabric.metrics import (
+    CONVERSIONS,
+    DB_QUERY_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsMiddleware,
+    content_type_label,
+    timed,
+)
+
+
+@pytest.fixture
+def registry_state():
+    metrics = list(REGISTRY._metrics)
+    yield
+    REGISTRY._metrics[:] = metrics
+    REGISTRY.enabled = True
+
+
+class TestMetrics:
+    def test_counter_renders_total(self, registry_state):
+        counter = Counter("test_events", "Events.", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        assert 'test_events_total{kind="a"} 3' in counter.render()
+        assert "# TYPE test_events counter" in counter.render()
+
+    def test_histogram_buckets_are_cumulative(self, registry_state):
+        histogram = Histogram("test_latency", "Latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        text = histogram.render()
+        assert 'test_latency_bucket{le="0.1"} 1' in text
+        assert 'test_latency_bucket{le="1"} 2' in text
+        assert 'test_latency_bucket{le="+Inf"} 2' in text
+        assert "test_latency_sum 0.55" in text
+        assert "test_latency_count 2" in text
+
+    def test_gauge_function(self, registry_state):
+        gauge = Gauge("test_depth", "Depth.")
+        gauge.set_function(lambda: 7)
+        assert "test_depth 7" in gauge.render()
+
+    def test_label_values_are_escaped(self, registry_state):
+        counter = Counter("test_escape", "Escape.", ("path",))
+        counter.inc(path='a"b\\c')
+        assert 'test_escape_total{path="a\\"b\\\\c"} 1' in counter.render()
+
+    def test_disabled_registry_skips_observations(self, registry_state):
+        counter = Counter("test_disabled", "Disabled.")
+        REGISTRY.enabled = False
+        counter.inc()
+        assert counter.value() == 0
+
+    async def test_timed_async_function(self, registry_state):
+        histogram = Histogram("test_timed", "Timed.", ("op",))
+
+        @timed(histogram, op="work")
+        async def work(x):
+            return x * 2
+
+        assert await work(2) == 4
+        assert histogram.count(op="work") == 1
+
+    def test_timed_records_failures(self, registry_state):
+        histogram = Histogram("test_timed_fail", "Timed.")
+
+        @timed(histogram)
+        def fail():
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            fail()
+        assert histogram.count() == 1
+
+    def test_content_type_label_is_bounded(self):
+        assert content_type_label("application/pdf") == "application/pdf"
+        assert content_type_label("Text/HTML; charset=utf-8") == "text/html"
+        assert content_type_label("application/x-anything") == "other"
+
+
+class TestMetricsMiddleware:
+    async def test_observes_route_template(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            return {"id": item_id}
+
+        before = HTTP_REQUEST_SECONDS.count(
+            method="GET", route="/items/{item_id}", status="200"
+        )
+        async with httpx.AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            await client.get("/items/1")
+            await client.get("/items/2")
+        after = HTTP_REQUEST_SECONDS.count(
+            method="GET", route="/items/{item_id}", status="200"
+        )
+        assert after - before == 2
+
+
+class TestMetricsEndpoint:
+    async def test_exposes_registry(self):
+        from docfabric.main import create_app
+
+        app = create_app()
+        async with httpx.AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            resp = await client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        assert "# TYPE docfabric_conversion_seconds histogram" in resp.text
+
+
+class TestInstrumentation:
+    async def test_service_records_conversion_and_queries(self, engine, tmp_path):
+        from unittest.mock import MagicMock, patch
+
+        from docfabric.conversion.converter import MarkdownConverter
+        from docfabric.db.repository import DocumentRepository
+        from docfabric.service.document import DocumentService
+        from docfabric.storage import FileStorage
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            mock_result = MagicMock()
+            mock_result.document.export_to_markdown.return_value = "# Converted"
+            mock_dc_class.return_value.convert.return_value = mock_result
+            converter = MarkdownConverter()
+
+        service = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=FileStorage(tmp_path),
+            converter=converter,
+        )
+        # Unknown client-supplied types share one label value.
+        labels = {"content_type": "other", "status": "ready"}
+        ready_before = CONVERSIONS.value(**labels)
+        inserts_before = DB_QUERY_SECONDS.count(operation="insert")
+
+        await service.create(
+            filename="a.bin", content_type="application/x-test", data=b"data"
+        )
+        await service._wait_pending()
+
+        assert CONVERSIONS.value(**labels) - ready_before == 1
+        assert DB_QUERY_SECONDS.count(operation="insert") - inserts_before == 1
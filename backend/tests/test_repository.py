@@ -1,7 +1,10 @@
+from datetime import UTC, datetime, timedelta
 from uuid import uuid4
 
+import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncEngine
 
+from docfabric.db.engine import create_engine, init_db
 from docfabric.db.repository import DocumentRepository
 
 
@@ -96,3 +99,325 @@ class TestDocumentRepository:
     async def test_delete_nonexistent(self, engine: AsyncEngine):
         repo = DocumentRepository(engine)
         assert await repo.delete(uuid4()) is False
+
+
+class TestPatch:
+    async def _insert(self, repo, metadata):
+        doc_id = uuid4()
+        await repo.insert(
+            id=doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+            metadata=metadata,
+        )
+        return doc_id
+
+    async def test_merge_in_sql(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id = await self._insert(repo, {"a": "1", "b": "2"})
+        rows = await repo.patch([doc_id], metadata={"b": None, "c": "3"})
+        assert rows[0]["metadata"] == {"a": "1", "c": "3"}
+        assert (await repo.get(doc_id))["metadata"] == {"a": "1", "c": "3"}
+
+    async def test_replace_and_rename(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id = await self._insert(repo, {"a": "1"})
+        rows = await repo.patch(
+            [doc_id], filename="b.pdf", metadata={"x": "y"}, replace_metadata=True
+        )
+        assert rows[0]["filename"] == "b.pdf"
+        assert rows[0]["metadata"] == {"x": "y"}
+
+    async def test_bulk_spans_chunks(self, engine: AsyncEngine, monkeypatch):
+        monkeypatch.setattr("docfabric.db.repository._PATCH_CHUNK", 2)
+        repo = DocumentRepository(engine)
+        ids = [await self._insert(repo, {}) for _ in range(5)]
+        rows = await repo.patch([*ids, uuid4()], metadata={"k": "v"})
+        assert len(rows) == 5
+        for doc_id in ids:
+            assert (await repo.get(doc_id))["metadata"] == {"k": "v"}
+
+
+class TestTombstone:
+    async def _insert(self, repo, metadata=None):
+        doc_id = uuid4()
+        await repo.insert(
+            id=doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+            metadata=metadata or {},
+        )
+        return doc_id
+
+    async def test_hides_from_reads_and_writes(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id = await self._insert(repo, {"k": "v"})
+        assert await repo.tombstone([doc_id, uuid4()]) == [str(doc_id)]
+
+        assert await repo.get(doc_id) is None
+        assert await repo.list() == ([], 0)
+        assert await repo.list(metadata={"k": "v"}) == ([], 0)
+        assert await repo.facets() == {}
+        assert await repo.scan() == []
+        assert not await repo.claim_status(doc_id, expected="ready", status="error")
+        assert await repo.patch([doc_id], metadata={"k": "w"}) == []
+        assert not await repo.delete(doc_id)
+        assert await repo.tombstone([doc_id]) == []
+
+    async def test_purge(self, engine: AsyncEngine, monkeypatch):
+        monkeypatch.setattr("docfabric.db.repository._PATCH_CHUNK", 2)
+        repo = DocumentRepository(engine)
+        ids = [await self._insert(repo, {"k": "v"}) for _ in range(5)]
+        kept = await self._insert(repo, {"k": "v"})
+
+        assert len(await repo.tombstone(ids)) == 5
+        assert await repo.facets() == {"k": {"v": 1}}
+        tombstoned = await repo.list_tombstoned(limit=10)
+        assert sorted(tombstoned) == sorted(map(str, ids))
+        assert await repo.known_ids(tombstoned) == set(tombstoned)
+
+        await repo.purge([*tombstoned, str(kept)])
+        assert await repo.list_tombstoned() == []
+        assert await repo.known_ids(tombstoned) == set()
+        assert await repo.get(kept) is not None
+
+    async def test_by_metadata(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        matching = await self._insert(repo, {"a": "1", "b": "2"})
+        await self._insert(repo, {"a": "1"})
+        deleted = await repo.tombstone(metadata={"a": "1", "b": "2"})
+        assert deleted == [str(matching)]
+        assert await repo.facets() == {"a": {"1": 1}}
+
+
+class TestMetadataIndex:
+    async def _insert(self, repo, metadata):
+        doc_id = uuid4()
+        await repo.insert(
+            id=doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+            metadata=metadata,
+        )
+        return str(doc_id)
+
+    async def test_filters_on_all_pairs(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        first = await self._insert(repo, {"project": "alpha", "lang": "en"})
+        second = await self._insert(repo, {"project": "alpha", "lang": "en"})
+        await self._insert(repo, {"project": "alpha", "lang": "de"})
+        await self._insert(repo, {"project": "beta", "lang": "en"})
+
+        items, total = await repo.list(metadata={"project": "alpha"})
+        assert total == 3
+
+        items, total = await repo.list(
+            metadata={"project": "alpha", "lang": "en"}, limit=1
+        )
+        assert total == 2
+        assert [i["id"] for i in items] == [second]
+        items, _ = await repo.list(
+            metadata={"project": "alpha", "lang": "en"}, offset=1
+        )
+        assert [i["id"] for i in items] == [first]
+
+        assert await repo.list(metadata={"project": "gamma"}) == ([], 0)
+
+    async def test_facets(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        await self._insert(repo, {"project": "alpha", "lang": "en"})
+        await self._insert(repo, {"project": "alpha"})
+        await self._insert(repo, {"project": "beta"})
+
+        assert await repo.facets() == {
+            "lang": {"en": 1},
+            "project": {"alpha": 2, "beta": 1},
+        }
+        facets = await repo.facets(["project"])
+        assert list(facets) == ["project"]
+        assert list(facets["project"]) == ["alpha", "beta"]
+
+    async def test_patch_and_delete_keep_index_in_sync(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id = await self._insert(repo, {"project": "alpha", "lang": "en"})
+
+        await repo.patch([doc_id], metadata={"project": "beta", "lang": None})
+        assert await repo.list(metadata={"project": "alpha"}) == ([], 0)
+        assert (await repo.list(metadata={"project": "beta"}))[1] == 1
+        assert await repo.facets() == {"project": {"beta": 1}}
+
+        await repo.patch([doc_id], metadata={"x": "y"}, replace_metadata=True)
+        assert await repo.facets() == {"x": {"y": 1}}
+
+        await repo.delete(doc_id)
+        assert await repo.facets() == {}
+
+
+class TestUploadRepository:
+    async def test_insert_get_delete(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        upload_id = uuid4()
+        await repo.insert_upload(
+            id=upload_id,
+            filename="big.pdf",
+            content_type="application/pdf",
+            size_bytes=None,
+            metadata={"source": "scanner"},
+        )
+        row = await repo.get_upload(upload_id)
+        assert row["filename"] == "big.pdf"
+        assert row["size_bytes"] is None
+        assert row["metadata"] == {"source": "scanner"}
+
+        assert await repo.delete_upload(upload_id) is True
+        assert await repo.get_upload(upload_id) is None
+        assert await repo.delete_upload(upload_id) is False
+
+
+class TestInitDb:
+    async def test_adds_missing_columns(self, tmp_path):
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        doc_id = uuid4()
+        async with engine.begin() as conn:
+            await conn.execute(
+                sa.text(
+                    "CREATE TABLE documents (id TEXT PRIMARY KEY, filename TEXT, "
+                    "content_type TEXT, size_bytes INTEGER, "
+                    "metadata JSON DEFAULT '{}', status TEXT DEFAULT 'ready', "
+                    "error TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+                    "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+                )
+            )
+            await conn.execute(
+                sa.text(
+                    "INSERT INTO documents (id, filename, content_type, size_bytes) "
+                    "VALUES (:id, 'a.pdf', 'application/pdf', 1)"
+                ),
+                {"id": str(doc_id)},
+            )
+
+        await init_db(engine)
+        row = await DocumentRepository(engine).get(doc_id)
+        await engine.dispose()
+        assert row["conversion_profile"] is None
+
+    async def test_indexes_existing_metadata(self, tmp_path):
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(
+                sa.text(
+                    "CREATE TABLE documents (id TEXT PRIMARY KEY, filename TEXT, "
+                    "content_type TEXT, size_bytes INTEGER, metadata JSON, "
+                    "status TEXT, error TEXT, created_at DATETIME, "
+                    "updated_at DATETIME)"
+                )
+            )
+            await conn.execute(
+                sa.text(
+                    "INSERT INTO documents VALUES ('a', 'a.pdf', 'application/pdf', "
+                    "1, '{\"project\": \"alpha\"}', 'ready', NULL, "
+                    "'2024-01-01 00:00:00', '2024-01-01 00:00:00')"
+                )
+            )
+
+        await init_db(engine)
+        await init_db(engine)
+        repo = DocumentRepository(engine)
+        items, total = await repo.list(metadata={"project": "alpha"})
+        async with engine.connect() as conn:
+            indexes = await conn.run_sync(
+                lambda sync_conn: sa.inspect(sync_conn).get_indexes("documents")
+            )
+        await engine.dispose()
+        assert total == 1
+        assert items[0]["id"] == "a"
+        assert await repo.facets() == {"project": {"alpha": 1}}
+        assert sorted(i["name"] for i in indexes) == [
+            "ix_documents_created_at",
+            "ix_documents_deleted_at",
+        ]
+
+
+class TestClaimStatus:
+    async def test_only_first_claim_wins(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id = uuid4()
+        await repo.insert(
+            id=doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+            metadata={},
+            status="pending",
+        )
+        pending = await repo.list_by_status("pending")
+        assert [row["id"] for row in pending] == [str(doc_id)]
+        assert await repo.claim_status(doc_id, expected="pending", status="processing")
+        assert not await repo.claim_status(
+            doc_id, expected="pending", status="processing"
+        )
+        assert (await repo.get(doc_id))["status"] == "processing"
+        assert await repo.list_by_status("pending") == []
+
+
+class TestChanges:
+    async def test_every_write_is_logged_in_order(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        doc_id, other = uuid4(), uuid4()
+        for id in (doc_id, other):
+            await repo.insert(
+                id=id,
+                filename="a.pdf",
+                content_type="application/pdf",
+                size_bytes=1,
+                metadata={},
+                status="pending",
+            )
+        await repo.claim_status(doc_id, expected="pending", status="processing")
+        await repo.update_status(doc_id, status="ready")
+        await repo.update(
+            doc_id, filename="b.pdf", content_type="application/pdf", size_bytes=2
+        )
+        await repo.patch([doc_id], metadata={"k": "v"})
+        await repo.delete(doc_id)
+        await repo.tombstone([other])
+        # Misses are not logged.
+        await repo.update_status(doc_id, status="ready")
+        assert not await repo.claim_status(
+            other, expected="pending", status="processing"
+        )
+
+        rows, oldest, newest = await repo.list_changes()
+        assert [(r["document_id"], r["operation"], r["status"]) for r in rows] == [
+            (str(doc_id), "created", "pending"),
+            (str(other), "created", "pending"),
+            (str(doc_id), "status", "processing"),
+            (str(doc_id), "status", "ready"),
+            (str(doc_id), "updated", "ready"),
+            (str(doc_id), "updated", "ready"),
+            (str(doc_id), "deleted", None),
+            (str(other), "deleted", None),
+        ]
+        assert [r["seq"] for r in rows] == list(range(1, 9))
+        assert (oldest, newest) == (1, 8)
+
+        rows, _, _ = await repo.list_changes(since=6, limit=1)
+        assert [r["seq"] for r in rows] == [7]
+
+    async def test_prune_keeps_newest(self, engine: AsyncEngine):
+        repo = DocumentRepository(engine)
+        for _ in range(3):
+            await repo.insert(
+                id=uuid4(),
+                filename="a.pdf",
+                content_type="application/pdf",
+                size_bytes=1,
+                metadata={},
+            )
+        assert await repo.prune_changes(datetime.now(UTC) + timedelta(1)) == 2
+        rows, oldest, newest = await repo.list_changes()
+        assert [r["seq"] for r in rows] == [3]
+        assert (oldest, newest) == (3, 3)
@@ -0,0 +1,155 @@
+import asyncio
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+
+from docfabric.service.scheduler import ConversionScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("docfabric.service.scheduler.time.time", lambda: now[0])
+    return now
+
+
+def _granted(*jobs):
+    return [job.granted.done() for job in jobs]
+
+
+class TestConversionScheduler:
+    async def test_short_jobs_overtake_long_ones(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        clock[0] += 1
+        large = scheduler.submit(uuid4(), profile="auto", pages=900)
+        clock[0] += 1
+        small = scheduler.submit(uuid4(), profile="auto", pages=2)
+
+        assert _granted(running, large, small) == [True, False, False]
+        scheduler.release(running)
+        assert _granted(large, small) == [False, True]
+        scheduler.release(small)
+        assert _granted(large) == [True]
+
+    async def test_waiting_jobs_age(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        large = scheduler.submit(uuid4(), profile="auto", pages=100)
+        clock[0] += 99
+        small = scheduler.submit(uuid4(), profile="auto", pages=2)
+
+        scheduler.release(running)
+        assert _granted(large, small) == [True, False]
+
+    async def test_zero_size_weight_is_fifo(self, clock):
+        scheduler = ConversionScheduler(slots=1, size_weight=0)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        large = scheduler.submit(uuid4(), profile="auto", pages=900)
+        small = scheduler.submit(uuid4(), profile="auto", pages=2)
+
+        scheduler.release(running)
+        assert _granted(large, small) == [True, False]
+
+    async def test_cancelled_job_frees_its_place(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        cancelled = scheduler.submit(uuid4(), profile="auto", pages=1)
+        queued = scheduler.submit(uuid4(), profile="auto", pages=5)
+
+        cancelled.granted.cancel()
+        scheduler.release(running)
+        assert _granted(queued) == [True]
+        scheduler.release(cancelled)
+        assert scheduler.queued() == 0
+
+    async def test_release_is_idempotent(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        job = scheduler.submit(uuid4(), profile="auto", pages=1)
+        scheduler.release(job)
+        scheduler.release(job)
+        assert scheduler.queued() == 0
+
+    def test_estimates_follow_observed_throughput(self):
+        scheduler = ConversionScheduler()
+        assert scheduler.estimate("fast", 10) == 10.0
+        scheduler.record("fast", 100, 10.0)
+        assert scheduler.estimate("fast", 10) == 1.0
+        scheduler.record("fast", 20, 10.0)
+        assert scheduler.estimate("fast", 10) == pytest.approx(10 / 8.4)
+        assert scheduler.estimate("accurate", 10) == 10.0
+
+    async def test_estimated_completion(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        first, second, third = uuid4(), uuid4(), uuid4()
+        scheduler.submit(first, profile="auto", pages=10)
+        scheduler.submit(second, profile="auto", pages=30)
+        scheduler.submit(third, profile="auto", pages=5)
+
+        def eta(doc_id):
+            return scheduler.estimated_completion(doc_id).timestamp() - clock[0]
+
+        assert eta(first) == 10
+        assert eta(third) == 15
+        assert eta(second) == 45
+        assert scheduler.estimated_completion(uuid4()) is None
+        assert scheduler.estimated_completion(first).tzinfo is UTC
+
+    async def test_overrunning_job_completes_now_at_the_earliest(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        doc_id = uuid4()
+        scheduler.submit(doc_id, profile="auto", pages=1)
+        clock[0] += 60
+        eta = scheduler.estimated_completion(doc_id)
+        assert eta == datetime.fromtimestamp(clock[0], UTC)
+
+    async def test_grant_wakes_waiter(self):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        queued = scheduler.submit(uuid4(), profile="auto", pages=1)
+        waiter = asyncio.ensure_future(queued.granted)
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        scheduler.release(running)
+        await asyncio.wait_for(waiter, 1)
+
+    async def test_urgent_job_goes_first(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        small = scheduler.submit(uuid4(), profile="auto", pages=1)
+        urgent = scheduler.submit(uuid4(), profile="auto", pages=500, urgent=True)
+
+        scheduler.release(running)
+        assert _granted(small, urgent) == [False, True]
+
+    async def test_promote_moves_job_to_head(self, clock):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        small = scheduler.submit(uuid4(), profile="auto", pages=1)
+        large = scheduler.submit(uuid4(), profile="auto", pages=500)
+
+        scheduler.promote(large.document_id)
+        scheduler.release(running)
+        assert _granted(small, large) == [False, True]
+
+    async def test_wait_idle(self):
+        scheduler = ConversionScheduler(slots=1)
+        await asyncio.wait_for(scheduler.wait_idle(), 1)
+        job = scheduler.submit(uuid4(), profile="auto", pages=1)
+        waiter = asyncio.ensure_future(scheduler.wait_idle())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        scheduler.release(job)
+        await asyncio.wait_for(waiter, 1)
+
+    async def test_cancel_queued(self):
+        scheduler = ConversionScheduler(slots=1)
+        running = scheduler.submit(uuid4(), profile="auto", pages=1)
+        queued = scheduler.submit(uuid4(), profile="auto", pages=1)
+
+        scheduler.cancel_queued()
+        assert queued.granted.cancelled()
+        assert scheduler.queued() == 0
+        scheduler.release(running)
+        await asyncio.wait_for(scheduler.wait_idle(), 1)
@@ -1,3 +1,4 @@
+import asyncio
 from uuid import UUID, uuid4
 
 import pytest
@@ -5,11 +6,15 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 
 from docfabric.conversion.converter import MarkdownConverter
 from docfabric.db.repository import DocumentRepository
-from docfabric.models.document import OutlineMode
+from docfabric.models.document import ConversionProfile, OutlineMode
 from docfabric.service.document import (
+    ChangesExpiredError,
     DocumentNotFoundError,
     DocumentNotReadyError,
     DocumentService,
+    SectionNotFoundError,
+    UploadConflictError,
+    UploadNotFoundError,
 )
 from docfabric.storage import FileStorage
 
@@ -35,12 +40,16 @@ def converter() -> MarkdownConverter:
 
 
 @pytest.fixture
-def service(engine: AsyncEngine, storage: FileStorage, converter: MarkdownConverter):
-    return DocumentService(
+async def service(
+    engine: AsyncEngine, storage: FileStorage, converter: MarkdownConverter
+):
+    svc = DocumentService(
         repository=DocumentRepository(engine),
         storage=storage,
         converter=converter,
     )
+    yield svc
+    await svc._wait_pending()
 
 
 class TestDocumentService:
@@ -198,6 +207,81 @@ class TestDocumentService:
         assert content.length == 5
         assert content.total_length == 20
 
+    async def test_get_content_max_tokens(self, service: DocumentService):
+        md = "# Title\nFirst paragraph.\n\nSecond paragraph.\n\nThird one."
+        created = await service.create(
+            filename="notes.md",
+            content_type="text/markdown",
+            data=md.encode(),
+        )
+        first = await service.get_content(created.id, max_tokens=10)
+        assert first.content == "# Title\nFirst paragraph.\n\n"
+        assert first.tokens == 9
+        assert first.next_offset == first.length
+
+        rest = await service.get_content(
+            created.id, offset=first.next_offset, max_tokens=100
+        )
+        assert first.content + rest.content == md
+        assert rest.next_offset is None
+
+    async def test_get_content_max_tokens_capped_by_limit(
+        self, service: DocumentService
+    ):
+        created = await service.create(
+            filename="notes.md",
+            content_type="text/markdown",
+            data=b"# Title\nSome paragraph text.",
+        )
+        content = await service.get_content(created.id, max_tokens=100, limit=7)
+        assert content.content == "# Title"
+        assert content.tokens == 3
+
+    async def test_get_content_max_tokens_rebuilds_stale_index(
+        self, service: DocumentService
+    ):
+        created = await service.create(
+            filename="notes.md",
+            content_type="text/markdown",
+            data=b"# Old",
+        )
+        service._storage.save_markdown(created.id, "# New\nLonger body text.")
+        content = await service.get_content(created.id, max_tokens=100)
+        assert content.content == "# New\nLonger body text."
+        assert service._storage.read_index(created.id) is not None
+
+    async def test_get_content_next_offset(self, service: DocumentService):
+        created = await service.create(
+            filename="notes.md",
+            content_type="text/markdown",
+            data=b"# Hello",
+        )
+        partial = await service.get_content(created.id, limit=3)
+        assert partial.next_offset == 3
+        assert partial.tokens is None
+        full = await service.get_content(created.id)
+        assert full.next_offset is None
+
+    async def test_stream_content(self, service: DocumentService):
+        created = await service.create(
+            filename="notes.md",
+            content_type="text/markdown",
+            data=b"# Hello world",
+        )
+        chunks = await service.stream_content(created.id, offset=2, limit=5)
+        assert "".join(chunks) == "Hello"
+
+    async def test_stream_content_while_processing_raises(
+        self, service: DocumentService
+    ):
+        created = await service.create(
+            filename="content.pdf",
+            content_type="application/pdf",
+            data=b"pdf",
+        )
+        with pytest.raises(DocumentNotReadyError):
+            await service.stream_content(created.id)
+
     async def test_get_content_while_processing_raises(self, service: DocumentService):
         created = await service.create(
             filename="content.pdf",
@@ -281,6 +365,101 @@ class TestDocumentService:
         assert exc_info.value.status == "error"
 
 
+@pytest.fixture
+def gate():
+    import threading
+
+    return threading.Event()
+
+
+@pytest.fixture
+async def gated_service(engine: AsyncEngine, storage: FileStorage, gate):
+    """Service whose conversions block until ``gate`` is set."""
+    from unittest.mock import MagicMock, patch
+
+    def convert(path):
+        gate.wait(timeout=5)
+        result = MagicMock()
+        result.document.export_to_markdown.return_value = "# Converted markdown"
+        return result
+
+    with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+        mock_dc_class.return_value.convert.side_effect = convert
+        converter = MarkdownConverter()
+
+    svc = DocumentService(
+        repository=DocumentRepository(engine),
+        storage=storage,
+        converter=converter,
+    )
+    yield svc
+    gate.set()
+    await svc._wait_pending()
+
+
+class TestWaitForStatus:
+    async def test_returns_immediately_when_ready(self, service: DocumentService):
+        doc = await service.create(
+            filename="notes.md", content_type="text/markdown", data=b"# Hi"
+        )
+        fetched = await service.wait_for_status(doc.id, timeout=5)
+        assert fetched.status.value == "ready"
+
+    async def test_wakes_on_conversion(self, gated_service: DocumentService, gate):
+        import asyncio
+        from unittest.mock import patch
+
+        doc = await gated_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        repo = gated_service._repo
+        with patch.object(repo, "get", wraps=repo.get) as get:
+            waiter = asyncio.create_task(
+                gated_service.wait_for_status(doc.id, timeout=5)
+            )
+            await asyncio.sleep(0.05)
+            assert not waiter.done()
+            gate.set()
+            fetched = await waiter
+        assert fetched.status.value == "ready"
+        # One read before waiting and one after the event; none while waiting.
+        assert get.call_count == 2
+
+    async def test_times_out_while_processing(self, gated_service: DocumentService):
+        doc = await gated_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        fetched = await gated_service.wait_for_status(doc.id, timeout=0.05)
+        assert fetched.status.value == "processing"
+        assert gated_service._events._waiters == {}
+
+    async def test_wakes_with_error_status(
+        self, engine: AsyncEngine, storage: FileStorage
+    ):
+        from unittest.mock import MagicMock, patch
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc_class:
+            mock_instance = MagicMock()
+            mock_instance.convert.side_effect = RuntimeError("bad")
+            mock_dc_class.return_value = mock_instance
+            bad_converter = MarkdownConverter()
+
+        svc = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=bad_converter,
+        )
+        doc = await svc.create(
+            filename="fail.pdf", content_type="application/pdf", data=b"bad"
+        )
+        fetched = await svc.wait_for_status(doc.id, timeout=5)
+        assert fetched.status.value == "error"
+
+    async def test_not_found(self, service: DocumentService):
+        with pytest.raises(DocumentNotFoundError):
+            await service.wait_for_status(uuid4(), timeout=1)
+
+
 async def _create_doc_with_markdown(
     service: DocumentService, markdown: str
 ) -> UUID:
@@ -427,3 +606,1064 @@ class TestGetOutline:
         assert outline.sections[1].heading_path == "Introduction > Background"
         assert outline.sections[2].heading_path == "Introduction > Background > Details"
         assert outline.sections[3].heading_path == "Introduction > Methods"
+
+    async def test_child_counts_and_subtree_lengths(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        outline = await service.get_outline(doc_id)
+        assert [s.child_count for s in outline.sections] == [2, 1, 0, 0]
+        nested = await service.get_outline(doc_id, mode=OutlineMode.nested)
+        assert [s.subtree_length for s in outline.sections] == [
+            s.length for s in nested.sections
+        ]
+
+    async def test_max_depth(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        outline = await service.get_outline(doc_id, max_depth=2)
+        assert [s.title for s in outline.sections] == [
+            "Introduction",
+            "Background",
+            "Methods",
+        ]
+        assert outline.total_sections == 3
+
+    async def test_subtree(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        outline = await service.get_outline(doc_id, subtree="Introduction", max_depth=1)
+        # The root, then its direct children.
+        assert [s.title for s in outline.sections] == [
+            "Introduction",
+            "Background",
+            "Methods",
+        ]
+        outline = await service.get_outline(doc_id, subtree="Background")
+        assert [s.heading_path for s in outline.sections] == [
+            "Introduction > Background",
+            "Introduction > Background > Details",
+        ]
+
+    async def test_unknown_subtree(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        with pytest.raises(SectionNotFoundError):
+            await service.get_outline(doc_id, subtree="Nope")
+
+    async def test_pagination(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        first = await service.get_outline(doc_id, limit=3)
+        assert len(first.sections) == 3
+        assert first.total_sections == 4
+        assert first.next_offset == 3
+        rest = await service.get_outline(doc_id, limit=3, offset=first.next_offset)
+        assert [s.title for s in rest.sections] == ["Methods"]
+        assert rest.next_offset is None
+
+    async def test_uses_heading_index(self, service: DocumentService):
+        from unittest.mock import patch
+
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        await service.get_outline(doc_id)
+        with patch.object(
+            service._storage, "read_markdown", side_effect=AssertionError("read")
+        ):
+            outline = await service.get_outline(doc_id)
+        assert len(outline.sections) == 4
+
+
+class TestReadSection:
+    async def test_by_heading_path(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        section = await service.read_section(
+            doc_id, heading_path="Introduction > Background"
+        )
+        assert section.index == 1
+        assert section.level == 2
+        assert section.title == "Background"
+        assert section.content == (
+            "## Background\nBackground text.\n### Details\nDetail text.\n"
+        )
+        assert section.offset == _OUTLINE_MD.index("## Background")
+        assert section.length == section.section_length == len(section.content)
+        assert section.next_offset is None
+
+    async def test_by_trailing_heading(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        section = await service.read_section(doc_id, heading_path="Details")
+        assert section.heading_path == "Introduction > Background > Details"
+        assert section.content == "### Details\nDetail text.\n"
+
+    async def test_by_index_matches_outline(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        outline = await service.get_outline(doc_id, mode=OutlineMode.flat)
+        for i, entry in enumerate(outline.sections):
+            section = await service.read_section(doc_id, index=i, mode=OutlineMode.flat)
+            assert section.offset == entry.offset
+            assert section.length == entry.length
+
+    async def test_max_tokens_stops_inside_section(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        section = await service.read_section(
+            doc_id, heading_path="Introduction", max_tokens=5
+        )
+        assert section.content.startswith("# Introduction")
+        assert section.length < section.section_length
+        assert section.next_offset == section.offset + section.length
+        rest = await service.get_content(doc_id, offset=section.next_offset)
+        assert section.content + rest.content == _OUTLINE_MD
+
+    async def test_max_tokens_capped_at_section_end(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        section = await service.read_section(
+            doc_id, heading_path="Details", max_tokens=1000
+        )
+        assert section.content == "### Details\nDetail text.\n"
+        assert section.tokens == service._tokenizer.count(section.content)
+        assert section.next_offset is None
+
+    @pytest.mark.parametrize("where", [{"heading_path": "Nope"}, {"index": 9}])
+    async def test_unknown_section(self, service: DocumentService, where):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        with pytest.raises(SectionNotFoundError):
+            await service.read_section(doc_id, **where)
+
+    async def test_not_found(self, service: DocumentService):
+        with pytest.raises(DocumentNotFoundError):
+            await service.read_section(uuid4(), index=0)
+
+
+class TestGrep:
+    async def test_one_document(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await service.grep("Detail text", document_id=doc_id)
+        (match,) = result.matches
+        assert match.document_id == doc_id
+        assert match.offset == _OUTLINE_MD.index("Detail text")
+        assert match.line == 6
+        assert match.heading_path == "Introduction > Background > Details"
+        assert result.documents_scanned == 1
+        assert not result.truncated
+
+        content = await service.get_content(
+            doc_id, offset=match.offset, limit=match.length
+        )
+        assert content.content == "Detail text"
+
+    async def test_before_first_heading(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, "Preface\n# Title")
+        result = await service.grep("Preface", document_id=doc_id)
+        assert result.matches[0].heading_path is None
+
+    async def test_across_documents_by_metadata(self, service: DocumentService):
+        ids = []
+        for project in ("a", "b", "a"):
+            doc = await service.create(
+                filename="test.pdf",
+                content_type="application/pdf",
+                data=b"pdf bytes",
+                metadata={"project": project},
+            )
+            ids.append(doc.id)
+        await service._wait_pending()
+
+        result = await service.grep("converted", ignore_case=True)
+        assert result.documents_scanned == 3
+        result = await service.grep(
+            "converted", ignore_case=True, metadata={"project": "a"}
+        )
+        # Newest first.
+        assert [m.document_id for m in result.matches] == [ids[2], ids[0]]
+
+    async def test_limit_truncates(self, service: DocumentService):
+        doc_id = await _create_doc_with_markdown(service, _OUTLINE_MD)
+        result = await service.grep("text", document_id=doc_id, limit=2)
+        assert len(result.matches) == 2
+        assert result.truncated
+
+    async def test_skips_documents_not_ready(self, service: DocumentService):
+        await service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        result = await service.grep("Converted")
+        assert result.documents_scanned <= 1
+
+    async def test_document_not_ready(self, service: DocumentService):
+        doc = await service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        with pytest.raises(DocumentNotReadyError):
+            await service.grep("x", document_id=doc.id)
+
+
+class TestChanges:
+    async def test_feed_follows_conversion(self, service: DocumentService):
+        doc = await service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        await service._wait_pending()
+        await service.delete(doc.id)
+
+        page = await service.list_changes()
+        assert [(c.operation.value, c.status) for c in page.changes] == [
+            ("created", "processing"),
+            ("status", "ready"),
+            ("deleted", None),
+        ]
+        assert {c.document_id for c in page.changes} == {doc.id}
+        assert page.next_since == page.last_seq == page.changes[-1].seq
+
+        empty = await service.list_changes(since=page.next_since)
+        assert empty.changes == []
+        assert empty.next_since == page.next_since
+
+    async def test_stream_reads_every_batch(self, service: DocumentService):
+        for _ in range(3):
+            await service.create(
+                filename="a.md", content_type="text/markdown", data=b"# A"
+            )
+        changes = await service.stream_changes(since=1, batch_size=2)
+        assert [c.seq async for c in changes] == [2, 3]
+
+    async def test_expired_cursor(self, service: DocumentService):
+        from datetime import UTC, datetime, timedelta
+
+        for _ in range(3):
+            await service.create(
+                filename="a.md", content_type="text/markdown", data=b"# A"
+            )
+        await service._repo.prune_changes(datetime.now(UTC) + timedelta(1))
+        with pytest.raises(ChangesExpiredError) as exc_info:
+            await service.list_changes(since=1)
+        assert exc_info.value.last_seq == 3
+        assert (await service.list_changes(since=2)).changes[0].seq == 3
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+class TestUploads:
+    async def test_chunked_upload_becomes_document(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="big.pdf",
+            content_type="application/pdf",
+            size_bytes=6,
+            metadata={"source": "scanner"},
+        )
+        assert upload.offset == 0
+
+        upload = await service.append_upload(upload.id, 0, _chunks(b"ab", b"c"))
+        assert upload.offset == 3
+        upload = await service.append_upload(upload.id, 3, _chunks(b"def"))
+        assert (await service.get_upload(upload.id)).offset == 6
+
+        doc = await service.complete_upload(upload.id)
+        assert doc.id == upload.id
+        assert doc.size_bytes == 6
+        assert doc.status.value == "processing"
+        assert doc.metadata == {"source": "scanner"}
+        assert service.get_original(doc.id, "big.pdf") == b"abcdef"
+        with pytest.raises(UploadNotFoundError):
+            await service.get_upload(upload.id)
+
+        await service._wait_pending()
+        content = await service.get_content(doc.id)
+        assert content.content == "# Converted markdown"
+
+    async def test_markdown_upload_is_ready(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="notes.md", content_type="text/markdown"
+        )
+        await service.append_upload(upload.id, 0, _chunks(b"# Notes\n"))
+        doc = await service.complete_upload(upload.id)
+        assert doc.status.value == "ready"
+        assert (await service.get_content(doc.id)).content == "# Notes\n"
+
+    async def test_offset_mismatch(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf"
+        )
+        await service.append_upload(upload.id, 0, _chunks(b"abc"))
+        with pytest.raises(UploadConflictError) as exc_info:
+            await service.append_upload(upload.id, 0, _chunks(b"abc"))
+        assert exc_info.value.offset == 3
+
+    async def test_rejects_bytes_past_declared_size(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf", size_bytes=4
+        )
+        with pytest.raises(UploadConflictError) as exc_info:
+            await service.append_upload(upload.id, 0, _chunks(b"abc", b"de"))
+        assert exc_info.value.offset == 3
+        assert (await service.get_upload(upload.id)).offset == 3
+
+    async def test_complete_requires_declared_size(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf", size_bytes=4
+        )
+        await service.append_upload(upload.id, 0, _chunks(b"ab"))
+        with pytest.raises(UploadConflictError):
+            await service.complete_upload(upload.id)
+
+    async def test_interrupted_chunk_keeps_received_bytes(
+        self, service: DocumentService
+    ):
+        upload = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf"
+        )
+
+        async def dropped():
+            yield b"abc"
+            raise ConnectionError
+
+        with pytest.raises(ConnectionError):
+            await service.append_upload(upload.id, 0, dropped())
+        assert (await service.get_upload(upload.id)).offset == 3
+
+    async def test_abort(self, service: DocumentService, storage: FileStorage):
+        upload = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf"
+        )
+        await service.abort_upload(upload.id)
+        with pytest.raises(UploadNotFoundError):
+            await service.get_upload(upload.id)
+        with pytest.raises(UploadNotFoundError):
+            await service.abort_upload(upload.id)
+
+    async def test_idle_sessions_expire(
+        self, service: DocumentService, storage: FileStorage, engine: AsyncEngine
+    ):
+        import os
+        from datetime import UTC, datetime, timedelta
+
+        from docfabric.db.tables import uploads
+
+        idle = await service.create_upload(
+            filename="idle.pdf", content_type="application/pdf"
+        )
+        active = await service.create_upload(
+            filename="active.pdf", content_type="application/pdf"
+        )
+        started = datetime.now(UTC) - timedelta(hours=2)
+        async with engine.begin() as conn:
+            await conn.execute(uploads.update().values(created_at=started))
+        os.utime(storage._upload_path(idle.id), (started.timestamp(),) * 2)
+        await service.append_upload(active.id, 0, _chunks(b"abc"))
+
+        assert await service.expire_uploads(3600) == 1
+        with pytest.raises(UploadNotFoundError):
+            await service.get_upload(idle.id)
+        assert (await service.get_upload(active.id)).offset == 3
+
+
+class TestIncrementalReconversion:
+    async def test_update_reconverts_only_changed_pages(
+        self, engine: AsyncEngine, storage: FileStorage, make_pdf
+    ):
+        from unittest.mock import MagicMock, patch
+
+        calls = []
+
+        def convert(source, page_range=None):
+            calls.append(page_range)
+            result = MagicMock()
+            result.document.export_to_markdown.side_effect = lambda page_no=None: (
+                f"## Page {page_no} v{len(calls)}"
+            )
+            return result
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc:
+            mock_dc.return_value.convert.side_effect = convert
+            converter = MarkdownConverter()
+
+        svc = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+        )
+        doc = await svc.create(
+            filename="doc.pdf",
+            content_type="application/pdf",
+            data=make_pdf(["one", "two", "three"]),
+        )
+        await svc._wait_pending()
+        assert calls == [(1, 3)]
+
+        await svc.update(
+            doc.id,
+            filename="doc.pdf",
+            content_type="application/pdf",
+            data=make_pdf(["one", "TWO", "three"]),
+        )
+        await svc._wait_pending()
+        assert calls == [(1, 3), (2, 2)]
+
+        content = await svc.get_content(doc.id)
+        assert content.content == "## Page 1 v1\n\n## Page 2 v2\n\n## Page 3 v1"
+        outline = await svc.get_outline(doc.id)
+        assert [s.title for s in outline.sections] == [
+            "Page 1 v1",
+            "Page 2 v2",
+            "Page 3 v1",
+        ]
+        assert outline.sections[2].offset == content.content.index("## Page 3")
+        tokens = await svc.get_content(doc.id, max_tokens=10_000)
+        assert tokens.tokens == svc._tokenizer.count(content.content)
+
+    async def test_rewritten_markdown_disables_reuse(
+        self, engine: AsyncEngine, storage: FileStorage, make_pdf
+    ):
+        from unittest.mock import MagicMock, patch
+
+        calls = []
+
+        def convert(source, page_range=None):
+            calls.append(page_range)
+            result = MagicMock()
+            result.document.export_to_markdown.return_value = "text"
+            return result
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc:
+            mock_dc.return_value.convert.side_effect = convert
+            converter = MarkdownConverter()
+
+        svc = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+        )
+        data = make_pdf(["one", "two"])
+        doc = await svc.create(
+            filename="doc.pdf", content_type="application/pdf", data=data
+        )
+        await svc._wait_pending()
+        storage.save_markdown(doc.id, "edited by hand")
+
+        await svc.update(
+            doc.id, filename="doc.pdf", content_type="application/pdf", data=data
+        )
+        await svc._wait_pending()
+        assert calls == [(1, 2), (1, 2)]
+
+
+class TestConversionProfiles:
+    async def test_resolved_profile_is_recorded(self, service: DocumentService):
+        doc = await service.create(
+            filename="scan.pdf", content_type="application/pdf", data=b"not a pdf"
+        )
+        assert doc.conversion_profile is None
+        await service._wait_pending()
+        fetched = await service.get(doc.id)
+        assert fetched.conversion_profile == ConversionProfile.balanced
+
+    async def test_explicit_profile(self, service: DocumentService):
+        doc = await service.create(
+            filename="scan.pdf",
+            content_type="application/pdf",
+            data=b"not a pdf",
+            profile=ConversionProfile.accurate,
+        )
+        assert doc.conversion_profile == ConversionProfile.accurate
+        await service._wait_pending()
+        await service.update(
+            doc.id,
+            filename="scan.pdf",
+            content_type="application/pdf",
+            data=b"still not a pdf",
+            profile=ConversionProfile.fast,
+        )
+        await service._wait_pending()
+        fetched = await service.get(doc.id)
+        assert fetched.conversion_profile == ConversionProfile.fast
+
+    async def test_upload_profile(self, service: DocumentService):
+        upload = await service.create_upload(
+            filename="scan.pdf",
+            content_type="application/pdf",
+            profile=ConversionProfile.accurate,
+        )
+        assert upload.profile == ConversionProfile.accurate
+        await service.append_upload(upload.id, 0, _chunks(b"pdf bytes"))
+        await service.complete_upload(upload.id)
+        await service._wait_pending()
+        fetched = await service.get(upload.id)
+        assert fetched.conversion_profile == ConversionProfile.accurate
+
+    async def test_markdown_has_no_profile(self, service: DocumentService):
+        doc = await service.create(
+            filename="notes.md", content_type="text/markdown", data=b"# Notes"
+        )
+        assert doc.conversion_profile is None
+
+
+class TestScheduling:
+    async def test_processing_document_has_estimated_completion(
+        self, gated_service: DocumentService, gate, make_pdf
+    ):
+        doc = await gated_service.create(
+            filename="test.pdf",
+            content_type="application/pdf",
+            data=make_pdf(["one", "two"]),
+        )
+        assert doc.estimated_completion_at is not None
+        assert doc.estimated_completion_at > doc.created_at
+        gate.set()
+        await gated_service._wait_pending()
+        fetched = await gated_service.get(doc.id)
+        assert fetched.estimated_completion_at is None
+
+    async def test_small_document_converts_before_large_one(
+        self, engine: AsyncEngine, storage: FileStorage, make_pdf
+    ):
+        import threading
+        from unittest.mock import MagicMock, patch
+
+        from docfabric.service.scheduler import ConversionScheduler
+
+        gate = threading.Event()
+        order = []
+
+        def convert(source, page_range=None):
+            gate.wait(timeout=5)
+            order.append(source.rsplit("/", 1)[-1])
+            result = MagicMock()
+            result.document.export_to_markdown.return_value = "text"
+            return result
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc:
+            mock_dc.return_value.convert.side_effect = convert
+            converter = MarkdownConverter()
+
+        svc = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+            scheduler=ConversionScheduler(slots=1),
+        )
+        for name, pages in [("first.pdf", 1), ("large.pdf", 50), ("small.pdf", 2)]:
+            await svc.create(
+                filename=name,
+                content_type="application/pdf",
+                data=make_pdf([f"page {i}" for i in range(pages)]),
+            )
+        gate.set()
+        await svc._wait_pending()
+        assert order == ["first.pdf", "small.pdf", "large.pdf"]
+
+
+@pytest.fixture
+async def deferred_service(
+    engine: AsyncEngine, storage: FileStorage, converter: MarkdownConverter
+):
+    svc = DocumentService(
+        repository=DocumentRepository(engine),
+        storage=storage,
+        converter=converter,
+        defer_conversion=True,
+    )
+    yield svc
+    await svc._wait_pending()
+
+
+class TestDeferredConversion:
+    async def test_upload_is_pending(self, deferred_service: DocumentService):
+        doc = await deferred_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        assert doc.status.value == "pending"
+        assert deferred_service._tasks == {}
+
+    async def test_markdown_is_ready(self, deferred_service: DocumentService):
+        doc = await deferred_service.create(
+            filename="notes.md", content_type="text/markdown", data=b"# Notes"
+        )
+        assert doc.status.value == "ready"
+
+    async def test_first_read_starts_conversion(
+        self, deferred_service: DocumentService
+    ):
+        doc = await deferred_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        with pytest.raises(DocumentNotReadyError) as exc_info:
+            await deferred_service.get_outline(doc.id)
+        assert exc_info.value.status == "processing"
+        await deferred_service._wait_pending()
+
+        content = await deferred_service.get_content(doc.id)
+        assert content.content == "# Converted markdown"
+
+    async def test_read_with_missing_original_is_not_ready(
+        self, deferred_service: DocumentService
+    ):
+        doc = await deferred_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        deferred_service._storage.original_path(doc.id, "test.pdf").unlink()
+        with pytest.raises(DocumentNotReadyError):
+            await deferred_service.get_content(doc.id)
+        assert doc.id in deferred_service._tasks
+
+    async def test_concurrent_first_reads_convert_once(
+        self, deferred_service: DocumentService
+    ):
+        import asyncio
+
+        doc = await deferred_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        results = await asyncio.gather(
+            *(deferred_service.get_content(doc.id) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, DocumentNotReadyError) for r in results)
+        await deferred_service._wait_pending()
+        docling = deferred_service._converter._converters[ConversionProfile.fast]
+        assert docling.convert.call_count == 1
+
+    async def test_update_keeps_pending(self, deferred_service: DocumentService):
+        doc = await deferred_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        updated = await deferred_service.update(
+            doc.id, filename="test.pdf", content_type="application/pdf", data=b"v2"
+        )
+        assert updated.status.value == "pending"
+
+    async def test_idle_capacity_converts_pending(
+        self, deferred_service: DocumentService
+    ):
+        import asyncio
+
+        first = await deferred_service.create(
+            filename="a.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        second = await deferred_service.create(
+            filename="b.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        idle = asyncio.create_task(deferred_service.convert_idle(0.01))
+        try:
+            for _ in range(100):
+                docs = [await deferred_service.get(d.id) for d in (first, second)]
+                if all(d.status.value == "ready" for d in docs):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            idle.cancel()
+        assert [d.status.value for d in docs] == ["ready", "ready"]
+
+    async def test_idle_conversion_survives_an_error(
+        self, deferred_service: DocumentService
+    ):
+        import asyncio
+        from unittest.mock import patch
+
+        doc = await deferred_service.create(
+            filename="a.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        list_by_status = deferred_service._repo.list_by_status
+        calls = 0
+
+        async def flaky(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise OSError("database is locked")
+            return await list_by_status(*args, **kwargs)
+
+        with patch.object(deferred_service._repo, "list_by_status", flaky):
+            idle = asyncio.create_task(deferred_service.convert_idle(0.01))
+            try:
+                for _ in range(100):
+                    fetched = await deferred_service.get(doc.id)
+                    if fetched.status.value == "ready":
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                idle.cancel()
+        assert calls > 1
+        assert fetched.status.value == "ready"
+
+
+class TestDrain:
+    async def test_running_conversion_finishes(
+        self, gated_service: DocumentService, gate
+    ):
+        import asyncio
+
+        doc = await gated_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        asyncio.get_running_loop().call_later(0.05, gate.set)
+        await gated_service.drain(timeout=5)
+        fetched = await gated_service.get(doc.id)
+        assert fetched.status.value == "ready"
+
+    async def test_unfinished_conversion_resumes_on_restart(
+        self,
+        gated_service: DocumentService,
+        engine: AsyncEngine,
+        storage: FileStorage,
+        converter: MarkdownConverter,
+    ):
+        doc = await gated_service.create(
+            filename="test.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        await gated_service.drain(timeout=0.05)
+        assert gated_service._tasks == {}
+        with pytest.raises(DocumentNotReadyError):
+            await gated_service.get_content(doc.id)
+
+        # Accepted while draining, converted after the restart.
+        late = await gated_service.create(
+            filename="late.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        assert late.status.value == "processing"
+        assert gated_service._tasks == {}
+
+        restarted = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+        )
+        assert await restarted.resume() == 2
+        await restarted._wait_pending()
+        content = await restarted.get_content(doc.id)
+        assert content.content == "# Converted markdown"
+        assert (await restarted.get(late.id)).status.value == "ready"
+
+    async def test_resume_skips_rows_that_cannot_restart(
+        self,
+        gated_service: DocumentService,
+        engine: AsyncEngine,
+        storage: FileStorage,
+        converter: MarkdownConverter,
+    ):
+        from unittest.mock import patch
+
+        docs = [
+            await gated_service.create(
+                filename=f"{n}.pdf", content_type="application/pdf", data=b"pdf"
+            )
+            for n in range(3)
+        ]
+        await gated_service.drain(timeout=0.05)
+        storage.original_path(docs[0].id, "0.pdf").unlink()
+
+        restarted = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+        )
+        start = restarted._start_processing
+
+        async def flaky(doc_id, *args, **kwargs):
+            if doc_id == docs[1].id:
+                raise RuntimeError("boom")
+            await start(doc_id, *args, **kwargs)
+
+        with patch.object(restarted, "_start_processing", flaky):
+            assert await restarted.resume() == 1
+        await restarted._wait_pending()
+        missing = await restarted.get(docs[0].id)
+        assert (missing.status.value, missing.error) == (
+            "error",
+            "Original file is missing",
+        )
+        assert (await restarted.get(docs[1].id)).status.value == "processing"
+        assert (await restarted.get(docs[2].id)).status.value == "ready"
+
+    async def test_queued_conversions_are_dropped(
+        self, engine: AsyncEngine, storage: FileStorage, gate
+    ):
+        from unittest.mock import MagicMock, patch
+
+        from docfabric.service.scheduler import ConversionScheduler
+
+        def convert(path):
+            gate.wait(timeout=5)
+            return MagicMock()
+
+        with patch("docfabric.conversion.converter.DocumentConverter") as mock_dc:
+            mock_dc.return_value.convert.side_effect = convert
+            converter = MarkdownConverter()
+
+        svc = DocumentService(
+            repository=DocumentRepository(engine),
+            storage=storage,
+            converter=converter,
+            scheduler=ConversionScheduler(slots=1),
+        )
+        for name in ("a.pdf", "b.pdf"):
+            await svc.create(filename=name, content_type="application/pdf", data=b"pdf")
+        await svc.drain(timeout=0.05)
+        gate.set()
+        assert mock_dc.return_value.convert.call_count == 1
+        assert [d.status.value for d in (await svc.list()).items] == [
+            "processing",
+            "processing",
+        ]
+
+
+class TestVerifyStorage:
+    async def _ready(self, service, filename="a.pdf", content_type="application/pdf"):
+        doc = await service.create(
+            filename=filename, content_type=content_type, data=b"# Doc\n\nBody"
+        )
+        await service._wait_pending()
+        return doc.id
+
+    async def test_records_content_hash(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        doc = await service.get(doc_id)
+        assert doc.content_sha256 == service._storage.markdown_sha256(doc_id)
+
+        report = await service.verify_storage()
+        assert report.checked == 1
+        assert report.torn == []
+
+    async def test_torn_conversion_goes_back_to_pending(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        path = service._storage._markdown_path(doc_id)
+        path.write_bytes(path.read_bytes()[:5])
+
+        report = await service.verify_storage()
+        assert report.torn == [doc_id]
+        assert (await service.get(doc_id)).status == "ready"
+
+        report = await service.verify_storage(repair=True)
+        assert report.repaired == 1
+        assert (await service.get(doc_id)).status == "pending"
+
+        # Reading a pending document starts its reconversion.
+        with pytest.raises(DocumentNotReadyError):
+            await service.get_content(doc_id)
+        await service._wait_pending()
+        doc = await service.get(doc_id)
+        assert doc.status == "ready"
+        assert (await service.verify_storage()).torn == []
+
+    async def test_torn_markdown_upload_is_rewritten(self, service: DocumentService):
+        doc_id = await self._ready(service, "a.md", "text/markdown")
+        service._storage._markdown_path(doc_id).unlink()
+
+        report = await service.verify_storage(repair=True)
+        assert report.torn == [doc_id]
+        assert (await service.get_content(doc_id)).content == "# Doc\n\nBody"
+        assert (await service.verify_storage()).torn == []
+
+    async def test_hashes_older_files(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        await service._repo.update(
+            doc_id,
+            filename="a.pdf",
+            content_type="application/pdf",
+            size_bytes=1,
+        )
+
+        report = await service.verify_storage(repair=True)
+        assert report.torn == []
+        assert report.hashed == 1
+        doc = await service.get(doc_id)
+        assert doc.content_sha256 == service._storage.markdown_sha256(doc_id)
+
+
+class TestReconcile:
+    async def _ready(self, service, filename="a.pdf", content_type="application/pdf"):
+        doc = await service.create(
+            filename=filename, content_type=content_type, data=b"# Doc\n\nBody"
+        )
+        await service._wait_pending()
+        return doc.id
+
+    async def test_consistent_store(self, service: DocumentService):
+        await self._ready(service)
+        await self._ready(service, "b.md", "text/markdown")
+
+        report = await service.reconcile(grace=0)
+        assert report.rows_checked == 2
+        assert report.entries_checked >= 4
+        assert (report.orphans, report.missing, report.stuck) == ([], [], [])
+
+    async def test_removes_orphans(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        orphan = uuid4()
+        service._storage.save_original(orphan, "x.pdf", b"pdf")
+        service._storage.save_markdown(orphan, "# Orphan")
+
+        report = await service.reconcile(grace=0)
+        assert report.orphans == [orphan]
+        assert service._storage.has_markdown(orphan)
+
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.orphans == [orphan]
+        assert report.repaired == 1
+        assert not service._storage.has_markdown(orphan)
+        assert not service._storage.has_original(orphan, "x.pdf")
+        assert service._storage.has_markdown(doc_id)
+        assert (await service.reconcile(grace=0)).orphans == []
+
+    async def test_keeps_upload_sessions(self, service: DocumentService):
+        session = await service.create_upload(
+            filename="big.pdf", content_type="application/pdf", size_bytes=None
+        )
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.orphans == []
+        assert (await service.get_upload(session.id)).offset == 0
+
+    async def test_grace_skips_recent_changes(self, service: DocumentService):
+        await self._ready(service)
+        service._storage.save_original(uuid4(), "x.pdf", b"pdf")
+
+        report = await service.reconcile()
+        assert report.rows_checked == 0
+        assert report.orphans == []
+
+    async def test_missing_markdown_is_reconverted(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        service._storage._markdown_path(doc_id).unlink()
+
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.missing == [doc_id]
+        assert (await service.get(doc_id)).status == "pending"
+
+    async def test_missing_original_fails_pending_document(
+        self, service: DocumentService
+    ):
+        doc_id = await self._ready(service)
+        await service._repo.update_status(doc_id, status="pending")
+        service._storage.delete(doc_id)
+
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.missing == [doc_id]
+        doc = await service.get(doc_id)
+        assert doc.status == "error"
+        assert doc.error == "Original file is missing"
+
+    async def test_missing_original_of_ready_document_is_reported(
+        self, service: DocumentService
+    ):
+        doc_id = await self._ready(service)
+        original = service._storage.original_path(doc_id, "a.pdf")
+        original.unlink()
+
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.missing == [doc_id]
+        assert report.repaired == 0
+        assert (await service.get(doc_id)).status == "ready"
+
+    async def test_stuck_processing_is_converted_again(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        await service._repo.update_status(doc_id, status="processing")
+
+        report = await service.reconcile(repair=True, grace=0)
+        assert report.stuck == [doc_id]
+        assert report.repaired == 1
+        await service._wait_pending()
+        assert (await service.get(doc_id)).status == "ready"
+
+    async def test_stuck_processing_is_only_reported_when_asked(
+        self, service: DocumentService
+    ):
+        doc_id = await self._ready(service)
+        await service._repo.update_status(doc_id, status="processing")
+
+        report = await service.reconcile(repair=True, grace=0, restart_stuck=False)
+        assert report.stuck == [doc_id]
+        assert report.repaired == 0
+        assert service._tasks == {}
+        assert (await service.get(doc_id)).status == "processing"
+
+    async def test_running_conversion_is_not_stuck(
+        self, gated_service: DocumentService, gate
+    ):
+        await gated_service.create(
+            filename="a.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        report = await gated_service.reconcile(grace=0)
+        assert report.stuck == []
+        gate.set()
+
+    async def test_rate_limit(self, service: DocumentService):
+        import time
+
+        for _ in range(3):
+            await self._ready(service)
+
+        start = time.monotonic()
+        report = await service.reconcile(grace=0, rate=100, batch_size=1)
+        elapsed = time.monotonic() - start
+        checked = report.rows_checked + report.entries_checked
+        assert elapsed >= checked / 100 * 0.9
+
+
+class TestBulkDelete:
+    async def _ready(self, service, metadata=None):
+        doc = await service.create(
+            filename="a.md",
+            content_type="text/markdown",
+            data=b"# Doc",
+            metadata=metadata or {},
+        )
+        return doc.id
+
+    async def test_tombstoned_until_swept(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        kept = await self._ready(service)
+
+        result = await service.delete_many([doc_id])
+        assert (result.deleted, result.not_found) == (1, [])
+        with pytest.raises(DocumentNotFoundError):
+            await service.get(doc_id)
+        with pytest.raises(DocumentNotFoundError):
+            await service.get_content(doc_id)
+        assert [d.id for d in (await service.list()).items] == [kept]
+        # Files stay until the sweeper gets to them.
+        assert service._storage.has_markdown(doc_id)
+
+        assert await service.sweep() == 1
+        assert not service._storage.has_markdown(doc_id)
+        assert service._storage.has_markdown(kept)
+        assert await service.sweep() == 0
+
+    async def test_deleting_twice(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        await service.delete_many([doc_id])
+        result = await service.delete_many([doc_id])
+        assert (result.deleted, result.not_found) == (0, [doc_id])
+        with pytest.raises(DocumentNotFoundError):
+            await service.delete(doc_id)
+
+    async def test_by_metadata(self, service: DocumentService):
+        for n in range(5):
+            await self._ready(service, {"project": "a" if n % 2 else "b"})
+
+        result = await service.delete_many(metadata={"project": "a"})
+        assert result.deleted == 2
+        assert (await service.list(metadata={"project": "a"})).total == 0
+        assert (await service.list()).total == 3
+        assert (await service.facets()).facets == {"project": {"b": 3}}
+
+    async def test_cancels_running_conversion(
+        self, gated_service: DocumentService, gate
+    ):
+        doc = await gated_service.create(
+            filename="a.pdf", content_type="application/pdf", data=b"pdf"
+        )
+        task = gated_service._tasks[doc.id]
+        await gated_service.delete_many([doc.id])
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert doc.id not in gated_service._tasks
+
+    async def test_sweeper_wakes_on_delete(self, service: DocumentService):
+        doc_id = await self._ready(service)
+        sweeper = asyncio.create_task(service.run_sweeper(3600))
+        try:
+            await service.delete_many([doc_id])
+            for _ in range(100):
+                if not service._storage.has_markdown(doc_id):
+                    break
+                await asyncio.sleep(0.01)
+            assert not service._storage.has_markdown(doc_id)
+        finally:
+            sweeper.cancel()
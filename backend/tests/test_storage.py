@@ -1,6 +1,11 @@
+import os
+import threading
+import time
 from uuid import uuid4
 
-from docfabric.storage import FileStorage
+import pytest
+
+from docfabric.storage import FileStorage, shard_prefix
 
 
 class TestFileStorage:
@@ -32,11 +37,296 @@ class TestFileStorage:
 
         storage.delete(doc_id)
 
-        original_dir = tmp_path / "originals" / str(doc_id)
-        md_path = tmp_path / "markdown" / f"{doc_id}.md"
-        assert not original_dir.exists()
-        assert not md_path.exists()
+        assert not [p for p in tmp_path.rglob("*") if p.is_file()]
 
     def test_delete_nonexistent_is_safe(self, tmp_path):
         storage = FileStorage(tmp_path)
         storage.delete(uuid4())
+
+    def test_save_and_read_index(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Title")
+        storage.save_index(doc_id, {"version": 1})
+        assert storage.read_index(doc_id) == {"version": 1}
+
+    def test_read_index_missing(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        assert storage.read_index(uuid4()) is None
+
+    def test_read_index_stale_after_markdown_rewrite(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Title")
+        storage.save_index(doc_id, {"version": 1})
+        storage.save_markdown(doc_id, "# A different title")
+        assert storage.read_index(doc_id) is None
+
+    def test_delete_removes_index(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Title")
+        storage.save_index(doc_id, {"version": 1})
+        storage.delete(doc_id)
+        assert not list(tmp_path.rglob(f"{doc_id}.json"))
+
+    def test_map_markdown(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Überblick")
+        with storage.map_markdown(doc_id) as data:
+            assert data[:] == "# Überblick".encode()
+        storage.save_markdown(doc_id, "")
+        with storage.map_markdown(doc_id) as data:
+            assert data == b""
+
+    def test_iter_markdown_chunks(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "abcdefghij")
+        chunks = list(storage.iter_markdown(doc_id, chunk_size=4))
+        assert chunks == ["abcd", "efgh", "ij"]
+
+    def test_iter_markdown_offset_and_limit(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "äbcdéfghij")
+        chunks = list(storage.iter_markdown(doc_id, offset=3, limit=5, chunk_size=2))
+        assert "".join(chunks) == "défgh"
+        assert all(len(c) <= 2 for c in chunks)
+
+    def test_iter_markdown_offset_past_end(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "abc")
+        assert list(storage.iter_markdown(doc_id, offset=10)) == []
+
+    def test_upload_appends_and_finishes_in_place(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        upload_id = uuid4()
+        storage.create_upload(upload_id)
+        assert storage.upload_size(upload_id) == 0
+        with storage.open_upload(upload_id) as f:
+            f.write(b"abc")
+        with storage.open_upload(upload_id) as f:
+            f.write(b"def")
+        assert storage.upload_size(upload_id) == 6
+
+        path = storage.finish_upload(upload_id, "big.pdf")
+        assert path == storage.original_path(upload_id, "big.pdf")
+        assert storage.read_original(upload_id, "big.pdf") == b"abcdef"
+        with pytest.raises(FileNotFoundError):
+            storage.upload_size(upload_id)
+
+    def test_page_fragments_roundtrip(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "first\n\nsecond")
+        storage.save_pages(
+            doc_id,
+            [
+                {"hash": "a", "offset": 0, "length": 5},
+                {"hash": "b", "offset": 7, "length": 6},
+            ],
+        )
+        assert storage.read_page_fragments(doc_id) == {"a": "first", "b": "second"}
+
+        storage.delete(doc_id)
+        assert storage.read_page_fragments(doc_id) is None
+
+
+def _save_all(storage, doc_id):
+    storage.save_original(doc_id, "a.pdf", b"pdf")
+    storage.save_markdown(doc_id, "# Title")
+    storage.save_index(doc_id, {"version": 1})
+    storage.save_pages(doc_id, [{"hash": "h", "offset": 0, "length": 7}])
+
+
+def _assert_readable(storage, doc_id):
+    assert storage.read_original(doc_id, "a.pdf") == b"pdf"
+    assert storage.read_markdown(doc_id) == "# Title"
+    assert storage.read_index(doc_id) == {"version": 1}
+    assert storage.read_page_fragments(doc_id) == {"h": "# Title"}
+
+
+class TestShardedLayout:
+    def test_entries_are_sharded(self, tmp_path):
+        storage = FileStorage(tmp_path, shard_depth=2)
+        doc_id = uuid4()
+        _save_all(storage, doc_id)
+
+        prefix = shard_prefix(doc_id, 2)
+        assert len(prefix.parts) == 2
+        assert all(len(part) == 2 for part in prefix.parts)
+        assert (tmp_path / "originals" / prefix / str(doc_id) / "a.pdf").exists()
+        assert (tmp_path / "markdown" / prefix / f"{doc_id}.md").exists()
+        assert (tmp_path / "index" / prefix / f"{doc_id}.json").exists()
+        assert (tmp_path / "pages" / prefix / f"{doc_id}.json").exists()
+
+    def test_depth_zero_is_flat(self, tmp_path):
+        storage = FileStorage(tmp_path, shard_depth=0)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Title")
+        assert (tmp_path / "markdown" / f"{doc_id}.md").exists()
+
+    def test_reads_flat_layout_until_migrated(self, tmp_path):
+        doc_id = uuid4()
+        _save_all(FileStorage(tmp_path, shard_depth=0), doc_id)
+
+        storage = FileStorage(tmp_path, shard_depth=2)
+        _assert_readable(storage, doc_id)
+
+        assert storage.migrate_layout() == 4
+        assert not (tmp_path / "markdown" / f"{doc_id}.md").exists()
+        _assert_readable(storage, doc_id)
+        assert storage.migrate_layout() == 0
+
+        storage.delete(doc_id)
+        assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+    def test_migrates_between_depths(self, tmp_path):
+        doc_ids = [uuid4() for _ in range(3)]
+        for doc_id in doc_ids:
+            _save_all(FileStorage(tmp_path, shard_depth=1), doc_id)
+
+        storage = FileStorage(tmp_path, shard_depth=3)
+        assert storage.migrate_layout() == 12
+        for doc_id in doc_ids:
+            prefix = shard_prefix(doc_id, 3)
+            assert (tmp_path / "markdown" / prefix / f"{doc_id}.md").exists()
+            _assert_readable(storage, doc_id)
+
+    @pytest.mark.parametrize(("before", "after"), [(1, 2), (2, 0), (3, 1)])
+    def test_reads_any_depth_until_migrated(self, tmp_path, before, after):
+        doc_id = uuid4()
+        _save_all(FileStorage(tmp_path, shard_depth=before), doc_id)
+
+        storage = FileStorage(tmp_path, shard_depth=after)
+        _assert_readable(storage, doc_id)
+        storage.delete(doc_id)
+        assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+    def test_migration_keeps_partial_uploads(self, tmp_path):
+        upload_id = uuid4()
+        legacy = FileStorage(tmp_path, shard_depth=0)
+        legacy.create_upload(upload_id)
+        with legacy.open_upload(upload_id) as f:
+            f.write(b"abc")
+
+        storage = FileStorage(tmp_path)
+        storage.migrate_layout()
+        assert storage.upload_size(upload_id) == 3
+
+
+class TestAtomicWrites:
+    @pytest.mark.parametrize("durability", ["none", "fsync", "group"])
+    def test_writes_leave_no_temp_files(self, tmp_path, durability):
+        storage = FileStorage(tmp_path, durability=durability)
+        doc_id = uuid4()
+        _save_all(storage, doc_id)
+        _assert_readable(storage, doc_id)
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_failed_write_keeps_previous_file(self, tmp_path, monkeypatch):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Old")
+
+        def fail(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr("docfabric.storage.os.replace", fail)
+        with pytest.raises(OSError):
+            storage.save_markdown(doc_id, "# New")
+        assert storage.read_markdown(doc_id) == "# Old"
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_group_commit_batches_concurrent_writes(self, tmp_path, monkeypatch):
+        storage = FileStorage(tmp_path, durability="group")
+        flushes = []
+        flush = storage._group._flush
+
+        def slow_flush(renames):
+            flushes.append(len(renames))
+            time.sleep(0.05)
+            flush(renames)
+
+        monkeypatch.setattr(storage._group, "_flush", slow_flush)
+        doc_ids = [uuid4() for _ in range(20)]
+        threads = [
+            threading.Thread(target=storage.save_markdown, args=(doc_id, "# Doc"))
+            for doc_id in doc_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(flushes) == 20
+        assert len(flushes) < 20
+        assert all(storage.read_markdown(doc_id) == "# Doc" for doc_id in doc_ids)
+
+    def test_group_commit_flushes_only_its_files(self, tmp_path, monkeypatch):
+        storage = FileStorage(tmp_path, durability="group")
+        synced = []
+        monkeypatch.setattr("docfabric.storage._fsync", synced.append)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Doc")
+        path = storage._markdown_path(doc_id)
+        assert len(synced) == 2
+        assert synced[0].name.startswith(f".{path.name}.")
+        assert synced[1] == path.parent
+
+    def test_group_commit_reports_errors_to_every_writer(self, tmp_path, monkeypatch):
+        storage = FileStorage(tmp_path, durability="group")
+
+        def fail(renames):
+            raise OSError("flush failed")
+
+        monkeypatch.setattr(storage._group, "_flush", fail)
+        with pytest.raises(OSError, match="flush failed"):
+            storage.save_markdown(uuid4(), "# Doc")
+
+    def test_remove_temp_files(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        storage.save_markdown(doc_id, "# Doc")
+        directory = storage._markdown_path(doc_id).parent
+        stale = directory / f".{doc_id}.md.0123456789ab.tmp"
+        fresh = directory / f".{doc_id}.md.ba9876543210.tmp"
+        stale.write_text("partial")
+        fresh.write_text("partial")
+        os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+        assert storage.remove_temp_files(older_than=3600) == 1
+        assert not stale.exists()
+        assert fresh.exists()
+        assert storage.read_markdown(doc_id) == "# Doc"
+
+    def test_markdown_sha256(self, tmp_path):
+        import hashlib
+
+        storage = FileStorage(tmp_path)
+        doc_id = uuid4()
+        assert storage.markdown_sha256(doc_id) is None
+        storage.save_markdown(doc_id, "# Doc")
+        expected = hashlib.sha256(b"# Doc").hexdigest()
+        assert storage.markdown_sha256(doc_id) == expected
+
+
+class TestScan:
+    def test_batches_every_entry(self, tmp_path):
+        storage = FileStorage(tmp_path)
+        doc_ids = [uuid4() for _ in range(5)]
+        for doc_id in doc_ids:
+            storage.save_original(doc_id, "a.pdf", b"pdf")
+            storage.save_markdown(doc_id, "# Doc")
+        (tmp_path / "markdown" / "notes.txt").write_text("not a document")
+
+        batches = list(storage.scan(batch_size=3))
+        assert [len(b) for b in batches] == [3, 3, 3, 1]
+        found = [doc_id for batch in batches for doc_id, _ in batch]
+        assert sorted(found) == sorted(doc_ids * 2)
+
+    def test_empty_store(self, tmp_path):
+        assert list(FileStorage(tmp_path).scan()) == []
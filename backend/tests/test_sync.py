@@ -0,0 +1,191 @@
+import os
+from unittest.mock import patch
+from uuid import UUID
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from docfabric.conversion.converter import MarkdownConverter
+from docfabric.db.repository import DocumentRepository
+from docfabric.service.document import DocumentNotFoundError, DocumentService
+from docfabric.service.sync import FolderSync
+from docfabric.storage import FileStorage
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "source"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.md").write_text("# A")
+    (root / "sub" / "b.md").write_text("# B")
+    return root
+
+
+@pytest.fixture
+async def service(engine: AsyncEngine, tmp_path):
+    with patch("docfabric.conversion.converter.DocumentConverter"):
+        converter = MarkdownConverter()
+    svc = DocumentService(
+        repository=DocumentRepository(engine),
+        storage=FileStorage(tmp_path / "storage"),
+        converter=converter,
+    )
+    yield svc
+    await svc._wait_pending()
+
+
+@pytest.fixture
+def folder_sync(source, service: DocumentService, engine: AsyncEngine):
+    return FolderSync(source, service, DocumentRepository(engine))
+
+
+def _bump_mtime(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestFolderSync:
+    async def test_initial_sync_creates_documents(
+        self, folder_sync: FolderSync, service: DocumentService
+    ):
+        result = await folder_sync.sync()
+        assert (result.created, result.unchanged) == (2, 0)
+
+        docs = await service.list()
+        assert sorted(d.metadata["sync_path"] for d in docs.items) == [
+            "a.md",
+            "sub/b.md",
+        ]
+
+    async def test_unchanged_files_are_not_read(self, folder_sync: FolderSync):
+        await folder_sync.sync()
+        with patch("docfabric.service.sync._read") as read:
+            result = await folder_sync.sync()
+        read.assert_not_called()
+        assert (result.created, result.updated, result.unchanged) == (0, 0, 2)
+
+    async def test_changed_file_updates_document(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        await folder_sync.sync()
+        (source / "a.md").write_text("# A changed")
+        _bump_mtime(source / "a.md")
+
+        result = await folder_sync.sync()
+        assert (result.created, result.updated, result.unchanged) == (0, 1, 1)
+        docs = (await service.list()).items
+        doc = next(d for d in docs if d.metadata["sync_path"] == "a.md")
+        assert (await service.get_content(doc.id)).content == "# A changed"
+
+    async def test_touched_file_with_same_hash_is_not_uploaded(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        await folder_sync.sync()
+        _bump_mtime(source / "a.md")
+        with patch.object(service, "update") as update:
+            result = await folder_sync.sync()
+        update.assert_not_called()
+        assert result.unchanged == 2
+
+        with patch("docfabric.service.sync._read") as read:
+            await folder_sync.sync()
+        read.assert_not_called()
+
+    async def test_removed_file_deletes_document(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        await folder_sync.sync()
+        (source / "sub" / "b.md").unlink()
+
+        result = await folder_sync.sync()
+        assert result.deleted == 1
+        assert (await service.list()).total == 1
+        assert (await folder_sync.sync()).deleted == 0
+
+    async def test_empty_scan_keeps_documents(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        await folder_sync.sync()
+        (source / "a.md").unlink()
+        (source / "sub" / "b.md").unlink()
+
+        result = await folder_sync.sync()
+        assert result.deleted == 0
+        assert (await service.list()).total == 2
+
+    async def test_removals_are_deleted_in_bulk(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        await folder_sync.sync()
+        (source / "c.md").write_text("# C")
+        (source / "a.md").unlink()
+        (source / "sub" / "b.md").unlink()
+
+        with patch.object(
+            service, "delete_many", wraps=service.delete_many
+        ) as delete_many:
+            result = await folder_sync.sync()
+        assert result.deleted == 2
+        delete_many.assert_awaited_once()
+        assert (await service.list()).total == 1
+
+    async def test_recreates_document_deleted_through_api(
+        self, folder_sync: FolderSync, service: DocumentService, source, engine
+    ):
+        await folder_sync.sync()
+        entries = await DocumentRepository(engine).list_sync_entries()
+        await service.delete(UUID(entries["a.md"]["document_id"]))
+        (source / "a.md").write_text("# A again")
+        _bump_mtime(source / "a.md")
+
+        result = await folder_sync.sync()
+        assert result.created == 1
+        entries = await DocumentRepository(engine).list_sync_entries()
+        doc = await service.get(UUID(entries["a.md"]["document_id"]))
+        assert doc.metadata == {"sync_path": "a.md"}
+
+    async def test_skips_hidden_files(self, folder_sync: FolderSync, source):
+        (source / ".hidden.md").write_text("# Hidden")
+        (source / ".git").mkdir()
+        (source / ".git" / "config").write_text("x")
+        assert (await folder_sync.sync()).created == 2
+
+    async def test_manifest_is_written_in_batches(
+        self, folder_sync: FolderSync, source, engine
+    ):
+        for i in range(5):
+            (source / f"n{i}.md").write_text(f"# {i}")
+        repo = folder_sync._repo
+        with (
+            patch("docfabric.service.sync._BATCH_SIZE", 3),
+            patch.object(
+                repo, "write_sync_entries", wraps=repo.write_sync_entries
+            ) as write,
+        ):
+            await folder_sync.sync()
+        assert [len(c.args[0]) for c in write.call_args_list] == [3, 3, 1]
+        assert len(await DocumentRepository(engine).list_sync_entries()) == 7
+
+    async def test_undecodable_file_does_not_abort_the_pass(
+        self, folder_sync: FolderSync, service: DocumentService, source
+    ):
+        (source / "bad.md").write_bytes(b"# \xff\xfe")
+        result = await folder_sync.sync()
+        assert (result.created, result.failed) == (2, 1)
+
+        result = await folder_sync.sync()
+        assert (result.created, result.unchanged, result.failed) == (0, 2, 1)
+        assert (await service.list()).total == 2
+
+    async def test_missing_document_on_delete_is_ignored(
+        self, folder_sync: FolderSync, service: DocumentService, source, engine
+    ):
+        await folder_sync.sync()
+        entries = await DocumentRepository(engine).list_sync_entries()
+        await service.delete(UUID(entries["a.md"]["document_id"]))
+        (source / "a.md").unlink()
+
+        result = await folder_sync.sync()
+        assert result.deleted == 1
+        with pytest.raises(DocumentNotFoundError):
+            await service.get(UUID(entries["a.md"]["document_id"]))
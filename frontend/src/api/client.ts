@@ -23,8 +23,8 @@ export async function listDocuments(limit = 20, offset = 0): Promise<DocumentLis
   return request(`/documents?limit=${limit}&offset=${offset}`);
 }
 
-export async function getDocument(id: string): Promise<DocumentMetadata> {
-  return request(`/documents/${id}`);
+export async function getDocument(id: string, wait?: number): Promise<DocumentMetadata> {
+  return request(`/documents/${id}${wait !== undefined ? `?wait=${wait}` : ""}`);
 }
 
 export async function getDocumentContent(
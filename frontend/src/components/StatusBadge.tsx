@@ -1,6 +1,7 @@
 import type { DocumentStatus } from "../types/document";
 
 const LABELS: Record<DocumentStatus, string> = {
+  pending: "Pending",
   processing: "Processing",
   ready: "Ready",
   error: "Error",
@@ -4,6 +4,7 @@ import { Link, useNavigate, useParams } from "react-router-dom";
 import { deleteDocument, getDocument, getOriginalUrl, replaceDocument } from "../api/client";
 import { ConfirmDialog } from "../components/ConfirmDialog";
 import { StatusBadge } from "../components/StatusBadge";
+import type { DocumentMetadata } from "../types/document";
 
 export function DocumentDetailPage() {
   const { id } = useParams<{ id: string }>();
@@ -14,10 +15,14 @@ export function DocumentDetailPage() {
 
   const { data: doc, isLoading, error } = useQuery({
     queryKey: ["document", id],
-    queryFn: () => getDocument(id!),
+    queryFn: () => {
+      // While processing, long-poll: the server answers as soon as the status changes.
+      const current = queryClient.getQueryData<DocumentMetadata>(["document", id]);
+      return getDocument(id!, current?.status === "processing" ? 25 : undefined);
+    },
     enabled: !!id,
     refetchInterval: (query) => {
-      return query.state.data?.status === "processing" ? 2000 : false;
+      return query.state.data?.status === "processing" ? 100 : false;
     },
   });
 
@@ -86,7 +91,8 @@ export function DocumentDetailPage() {
       </dl>
 
       <div className="actions">
-        {doc.status === "ready" ? (
+        {/* Opening a pending document's content starts its conversion. */}
+        {doc.status === "ready" || doc.status === "pending" ? (
           <Link to={`/documents/${doc.id}/preview`} className="button">
             View Content
           </Link>
@@ -1,4 +1,6 @@
-export type DocumentStatus = "processing" | "ready" | "error";
+export type DocumentStatus = "pending" | "processing" | "ready" | "error";
+
+export type ConversionProfile = "auto" | "fast" | "balanced" | "accurate";
 
 export interface DocumentMetadata {
   id: string;
@@ -8,6 +10,9 @@ export interface DocumentMetadata {
   status: DocumentStatus;
   metadata: Record<string, string>;
   error: string | null;
+  conversion_profile: ConversionProfile | null;
+  content_sha256: string | null;
+  estimated_completion_at: string | null;
   created_at: string;
   updated_at: string;
 }
@@ -24,4 +29,6 @@ export interface DocumentContent {
   total_length: number;
   offset: number;
   length: number;
+  tokens: number | null;
+  next_offset: number | null;
 }
@@ -8,6 +8,10 @@
 Sends a local file to the DocFabric REST API for ingestion and
 AI-optimized access.
 
+Files larger than CHUNKED_THRESHOLD are sent in chunks through a resumable
+upload session. If the upload is interrupted, running the script again with
+the same file continues where it stopped.
+
 Environment:
     DOCFABRIC_URL   DocFabric server URL (default: http://localhost:8000)
 
@@ -16,12 +20,20 @@ Supported formats: PDF, DOCX, PPTX, HTML, CSV, images.
 
 import argparse
 import json
+import mimetypes
 import os
 import sys
+import time
 from pathlib import Path
 
 import requests
 
+WAIT_SECONDS = 30
+CHUNKED_THRESHOLD = 32 * 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_RETRIES = 5
+STATE_FILE = Path.home() / ".cache" / "docfabric" / "uploads.json"
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Upload a document to DocFabric")
@@ -32,6 +44,11 @@ def main() -> None:
         metavar="KEY=VALUE",
         help="metadata key=value pair (repeatable)",
     )
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="wait until conversion has finished and print the final status",
+    )
     args = parser.parse_args()
 
     base_url = os.environ.get("DOCFABRIC_URL")
@@ -56,23 +73,132 @@ def main() -> None:
             key, value = item.split("=", 1)
             metadata[key] = value
 
-    url = f"{base_url.rstrip('/')}/api/documents"
-    with open(file_path, "rb") as f:
-        files = {"file": (file_path.name, f)}
-        data = {}
-        if metadata:
-            data["metadata"] = json.dumps(metadata)
-        response = requests.post(url, files=files, data=data)
+    api_url = f"{base_url.rstrip('/')}/api"
+    url = f"{api_url}/documents"
+    if file_path.stat().st_size > CHUNKED_THRESHOLD:
+        result = upload_chunked(api_url, file_path, metadata)
+    else:
+        with open(file_path, "rb") as f:
+            files = {"file": (file_path.name, f)}
+            data = {}
+            if metadata:
+                data["metadata"] = json.dumps(metadata)
+            response = requests.post(url, files=files, data=data)
+        check(response, "upload failed")
+        result = response.json()
+    if args.wait:
+        result = wait_until_converted(url, result)
+        print(f"{result['filename']}: {result['id']} ({result['status']})")
+        if result["status"] == "error":
+            sys.exit(1)
+    else:
+        print(f"{result['filename']}: {result['id']}")
 
+
+def check(response: requests.Response, message: str) -> None:
     if not response.ok:
         print(
-            f"Error: upload failed ({response.status_code}): {response.text}",
+            f"Error: {message} ({response.status_code}): {response.text}",
             file=sys.stderr,
         )
         sys.exit(1)
 
-    result = response.json()
-    print(f"{result['filename']}: {result['id']}")
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(state: dict) -> None:
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STATE_FILE.write_text(json.dumps(state, indent=2))
+
+
+def upload_chunked(api_url: str, file_path: Path, metadata: dict) -> dict:
+    """Upload through a resumable session, continuing a previous attempt."""
+    stat = file_path.stat()
+    key = f"{api_url}|{file_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+    state = load_state()
+
+    session = None
+    if key in state:
+        response = requests.get(f"{api_url}/uploads/{state[key]}", timeout=60)
+        if response.ok:
+            session = response.json()
+            print(
+                f"Resuming upload at {session['offset']} of {stat.st_size} bytes",
+                file=sys.stderr,
+            )
+    if session is None:
+        mimetype = mimetypes.guess_type(file_path.name)[0]
+        response = requests.post(
+            f"{api_url}/uploads",
+            json={
+                "filename": file_path.name,
+                "content_type": mimetype or "application/octet-stream",
+                "size_bytes": stat.st_size,
+                "metadata": metadata,
+            },
+            timeout=60,
+        )
+        check(response, "could not start upload")
+        session = response.json()
+        state[key] = session["id"]
+        save_state(state)
+
+    upload_url = f"{api_url}/uploads/{session['id']}"
+    offset = session["offset"]
+    retries = 0
+    with open(file_path, "rb") as f:
+        while offset < stat.st_size:
+            f.seek(offset)
+            chunk = f.read(CHUNK_SIZE)
+            try:
+                response = requests.put(
+                    upload_url, params={"offset": offset}, data=chunk, timeout=300
+                )
+            except requests.RequestException as exc:
+                retries += 1
+                if retries > MAX_RETRIES:
+                    print(f"Error: upload interrupted: {exc}", file=sys.stderr)
+                    print("Run the command again to resume.", file=sys.stderr)
+                    sys.exit(1)
+                time.sleep(2**retries)
+                response = requests.get(upload_url, timeout=60)
+                check(response, "could not query upload offset")
+                offset = response.json()["offset"]
+                continue
+            if response.status_code == 409:
+                offset = response.json()["offset"]
+                continue
+            check(response, "chunk upload failed")
+            offset = response.json()["offset"]
+            retries = 0
+
+    response = requests.post(f"{upload_url}/complete", timeout=300)
+    check(response, "could not complete upload")
+    del state[key]
+    save_state(state)
+    return response.json()
+
+
+def wait_until_converted(url: str, document: dict) -> dict:
+    """Long-poll the document until it leaves the processing state."""
+    while document["status"] == "processing":
+        response = requests.get(
+            f"{url}/{document['id']}", params={"wait": WAIT_SECONDS}, timeout=60
+        )
+        if not response.ok:
+            print(
+                f"Error: status check failed ({response.status_code}): "
+                f"{response.text}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        document = response.json()
+    return document
 
 
 if __name__ == "__main__":